@@ -0,0 +1,200 @@
+import re
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from unidecode import unidecode
+
+from env import env
+
+AGENTS = ("ProductAgent", "PoliciAgent", "MySelf", "TransactionAgent")
+
+# Từ khóa viết không dấu, so khớp trên câu hỏi đã bỏ dấu + chữ thường
+KEYWORD_RULES: Dict[str, Tuple[str, ...]] = {
+    "PoliciAgent": (
+        "chinh sach", "doi tra", "hoan tien", "bao hanh", "bao mat", "quy dinh", "quy che",
+        "phuong thuc thanh toan", "phi van chuyen", "phi giao hang", "huy don", "khieu nai",
+        "tiki xu", "tikicard", "tra gop", "kiem hang", "hang gia",
+    ),
+    "ProductAgent": (
+        "san pham", "tim giup", "tim kiem", "goi y", "tu van", "muon mua", "can mua", "gia bao nhieu",
+        "gia re", "loai nao", "dien thoai", "laptop", "tai nghe", "mua sach", "quyen sach", "my pham",
+        "xem them", "san pham khac",
+    ),
+    "MySelf": (
+        "xin chao", "chao ban", "ban la ai", "cam on", "hello", "hi", "tam biet",
+    ),
+    "TransactionAgent": (
+        "don hang cua toi", "giao dich", "lich su mua", "trang thai don", "ma don hang", "da thanh toan",
+    ),
+}
+
+# Nhiệt độ softmax cho độ tương đồng cosine tới các centroid
+CENTROID_TEMPERATURE = 20.0
+
+
+@dataclass
+class RouteDecision:
+    agent: str
+    confidence: float
+    source: str
+    scores: Dict[str, float] = field(default_factory=dict)
+    latency_ms: float = 0.0
+
+
+def normalize_query(text: str) -> str:
+    return re.sub(r"\s+", " ", unidecode(text or "").lower()).strip()
+
+
+class IntentRouter:
+    """
+    Router cục bộ chọn agent cho câu hỏi, kết hợp luật từ khóa và
+    bộ phân loại nearest-centroid trên embedding câu hỏi.
+
+    Centroid được học từ nhãn của Manager (LLM) lưu trong chat_message và được
+    cập nhật trực tuyến mỗi khi Manager định tuyến một câu hỏi.
+    """
+
+    def __init__(self, threshold: float = 0.75):
+        self.threshold = threshold
+        self._patterns = {
+            agent: [re.compile(rf"\b{re.escape(keyword)}\b") for keyword in keywords]
+            for agent, keywords in KEYWORD_RULES.items()
+        }
+        self._sums: Dict[str, np.ndarray] = {}
+        self._counts: Dict[str, int] = defaultdict(int)
+        self._centroids: Optional[Tuple[List[str], np.ndarray]] = None
+        self._lock = threading.Lock()
+        self._stats = {
+            "local": 0,
+            "llm": 0,
+            "local_latency_ms": 0.0,
+            "llm_latency_ms": 0.0,
+            "compared": 0,
+            "agreed": 0,
+        }
+        # Tỷ lệ đồng thuận với LLM theo mức confidence (bucket 0.1)
+        self._buckets: Dict[float, List[int]] = defaultdict(lambda: [0, 0])
+
+    def _rule_scores(self, text: str) -> Dict[str, float]:
+        normalized = normalize_query(text)
+        hits = {
+            agent: sum(1 for pattern in patterns if pattern.search(normalized))
+            for agent, patterns in self._patterns.items()
+        }
+        total = sum(hits.values())
+        if not total:
+            return {}
+        return {agent: count / total for agent, count in hits.items()}
+
+    def _centroid_scores(self, vector) -> Dict[str, float]:
+        if vector is None:
+            return {}
+        with self._lock:
+            if self._centroids is None and self._sums:
+                labels = list(self._sums)
+                matrix = np.stack([self._sums[label] / np.linalg.norm(self._sums[label]) for label in labels])
+                self._centroids = (labels, matrix)
+            centroids = self._centroids
+        if centroids is None:
+            return {}
+        labels, matrix = centroids
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return {}
+        similarities = matrix @ (query / norm)
+        weights = np.exp((similarities - similarities.max()) * CENTROID_TEMPERATURE)
+        probabilities = weights / weights.sum()
+        return {label: float(p) for label, p in zip(labels, probabilities)}
+
+    def route(self, text: str, vector=None) -> RouteDecision:
+        start_time = time.perf_counter()
+        rule_scores = self._rule_scores(text)
+        centroid_scores = self._centroid_scores(vector)
+
+        sources = [scores for scores in (rule_scores, centroid_scores) if scores]
+        if not sources:
+            decision = RouteDecision(agent="MySelf", confidence=0.0, source="none")
+        else:
+            combined = {
+                agent: sum(scores.get(agent, 0.0) for scores in sources) / len(sources)
+                for agent in AGENTS
+            }
+            agent = max(combined, key=combined.get)
+            source = "+".join(name for name, scores in (("rules", rule_scores), ("centroid", centroid_scores)) if scores)
+            decision = RouteDecision(agent=agent, confidence=combined[agent], source=source, scores=combined)
+
+        decision.latency_ms = (time.perf_counter() - start_time) * 1000
+        return decision
+
+    def is_confident(self, decision: RouteDecision) -> bool:
+        return decision.confidence >= self.threshold
+
+    def observe(self, vector, label: str):
+        """
+        Cập nhật centroid của nhãn với embedding câu hỏi (nhãn do LLM gán).
+        """
+        if vector is None or label not in AGENTS:
+            return
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return
+        with self._lock:
+            if label in self._sums:
+                self._sums[label] = self._sums[label] + query / norm
+            else:
+                self._sums[label] = query / norm
+            self._counts[label] += 1
+            self._centroids = None
+
+    def reset_centroids(self):
+        """
+        Xóa centroid đã học (trước khi học lại toàn bộ từ nhãn đã lưu).
+        """
+        with self._lock:
+            self._sums.clear()
+            self._counts.clear()
+            self._centroids = None
+
+    def record_local(self, decision: RouteDecision):
+        with self._lock:
+            self._stats["local"] += 1
+            self._stats["local_latency_ms"] += decision.latency_ms
+
+    def record_llm(self, decision: RouteDecision, llm_agent: str, llm_latency_ms: float, counted: bool = True):
+        with self._lock:
+            if counted:
+                self._stats["llm"] += 1
+                self._stats["llm_latency_ms"] += llm_latency_ms
+            self._stats["compared"] += 1
+            agreed = decision.agent == llm_agent
+            self._stats["agreed"] += int(agreed)
+            bucket = self._buckets[min(round(decision.confidence, 1), 1.0)]
+            bucket[0] += 1
+            bucket[1] += int(agreed)
+
+    def stats(self) -> dict:
+        with self._lock:
+            local, llm, compared = self._stats["local"], self._stats["llm"], self._stats["compared"]
+            return {
+                "threshold": self.threshold,
+                "local_routed": local,
+                "llm_routed": llm,
+                "local_ratio": round(local / (local + llm), 4) if local + llm else 0.0,
+                "avg_local_latency_ms": round(self._stats["local_latency_ms"] / local, 3) if local else None,
+                "avg_llm_latency_ms": round(self._stats["llm_latency_ms"] / llm, 1) if llm else None,
+                "agreement_rate": round(self._stats["agreed"] / compared, 4) if compared else None,
+                "agreement_by_confidence": {
+                    f"{bucket:.1f}": {"total": total, "agreement_rate": round(agreed / total, 4)}
+                    for bucket, (total, agreed) in sorted(self._buckets.items())
+                },
+                "centroid_samples": dict(self._counts),
+            }
+
+
+intent_router = IntentRouter(threshold=env.ROUTER_CONFIDENCE_THRESHOLD)
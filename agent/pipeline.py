@@ -0,0 +1,111 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterable
+
+from loguru import logger
+
+StageFunc = Callable[["StagePipeline"], Awaitable[Any]]
+
+
+class StagePipeline:
+    """
+    Bộ thực thi đồ thị phụ thuộc nhỏ cho pipeline của agent.
+
+    Mỗi stage là một coroutine nhận pipeline làm tham số và lấy kết quả của
+    stage khác qua `await pipeline.get(name)`. Khi chạy, mọi stage được khởi động
+    cùng lúc và chỉ chờ các stage phụ thuộc, nên các bước độc lập chạy song song.
+    Stage speculative chưa được dùng tới khi pipeline kết thúc sẽ bị hủy.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start_time = time.perf_counter()
+        self._stages: Dict[str, tuple] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._timings: Dict[str, list] = {}
+
+    def add(self, name: str, func: StageFunc, deps: Iterable[str] = (), speculative: bool = False):
+        self._stages[name] = (func, tuple(deps), speculative)
+        return self
+
+    def _elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.start_time) * 1000
+
+    async def _run_stage(self, name: str):
+        func, deps, _ = self._stages[name]
+        for dep in deps:
+            await self.get(dep)
+        self._timings[name] = [self._elapsed_ms(), None, "running"]
+        try:
+            result = await func(self)
+        except asyncio.CancelledError:
+            self._timings[name][1:] = [self._elapsed_ms(), "cancelled"]
+            raise
+        except Exception:
+            self._timings[name][1:] = [self._elapsed_ms(), "error"]
+            raise
+        self._timings[name][1:] = [self._elapsed_ms(), "ok"]
+        return result
+
+    def start(self, name: str) -> asyncio.Task:
+        task = self._tasks.get(name)
+        if task is None:
+            task = asyncio.create_task(self._run_stage(name), name=f"{self.name}:{name}")
+            # Đánh dấu lỗi của stage speculative không ai chờ là đã được xử lý
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._tasks[name] = task
+        return task
+
+    async def get(self, name: str) -> Any:
+        # shield: hủy stage đang chờ không được kéo theo hủy stage phụ thuộc dùng chung
+        return await asyncio.shield(self.start(name))
+
+    def cancel(self, name: str):
+        task = self._tasks.get(name)
+        if task is not None and not task.done():
+            task.cancel()
+            if name not in self._timings:
+                self._timings[name] = [self._elapsed_ms(), self._elapsed_ms(), "cancelled"]
+
+    async def run(self, *targets: str) -> Dict[str, Any]:
+        for name in self._stages:
+            self.start(name)
+        try:
+            results = await asyncio.gather(*(self.get(target) for target in targets))
+        except BaseException:
+            for name in self._stages:
+                self.cancel(name)
+            raise
+        # Các stage chưa cần tới (speculative) không được chạy tiếp sau khi có kết quả
+        for name, (_, _, speculative) in self._stages.items():
+            if speculative:
+                self.cancel(name)
+        return dict(zip(targets, results))
+
+    @asynccontextmanager
+    async def timed(self, name: str):
+        """
+        Ghi thời gian cho một bước chạy ngoài đồ thị (vd: sinh câu trả lời streaming).
+        """
+        self._timings[name] = [self._elapsed_ms(), None, "running"]
+        try:
+            yield
+        except BaseException:
+            self._timings[name][1:] = [self._elapsed_ms(), "error"]
+            raise
+        self._timings[name][1:] = [self._elapsed_ms(), "ok"]
+
+    def waterfall(self, width: int = 40) -> str:
+        total = max([end or start for start, end, _ in self._timings.values()] + [self._elapsed_ms(), 1e-6])
+        lines = [f"[{self.name}] tổng {total:.0f} ms"]
+        for name, (start, end, status) in sorted(self._timings.items(), key=lambda item: item[1][0]):
+            end = end if end is not None else self._elapsed_ms()
+            offset = int(start / total * width)
+            length = max(1, int((end - start) / total * width))
+            bar = " " * offset + "█" * length
+            lines.append(f"  {name:<22}{bar:<{width + 1}} {start:7.0f} → {end:7.0f} ms ({end - start:6.0f} ms) {status}")
+        return "\n".join(lines)
+
+    def log_waterfall(self):
+        logger.info("\n" + self.waterfall())
@@ -0,0 +1,105 @@
+import asyncio
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from loguru import logger
+
+
+class AgentRegistry:
+    """
+    Quản lý vòng đời các agent dùng chung trong process.
+
+    Mỗi agent được đăng ký bằng một factory, được khởi tạo một lần (lúc startup
+    hoặc lần đầu được dùng) và tái sử dụng cho mọi request.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._built_at: Dict[str, float] = {}
+        self._build_time: Dict[str, float] = {}
+        self._errors: Dict[str, str] = {}
+        # Khóa riêng cho từng agent có trạng thái hội thoại (vd: cặp assistant/user_proxy)
+        self._agent_locks: Dict[str, threading.Lock] = {}
+        # Bản asyncio của khóa trên: request async xếp hàng trên event loop thay vì giữ thread
+        self._agent_alocks: Dict[str, asyncio.Lock] = {}
+        self._lock = threading.RLock()
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        with self._lock:
+            self._factories[name] = factory
+            self._agent_locks.setdefault(name, threading.Lock())
+
+    def _build(self, name: str) -> Any:
+        factory = self._factories.get(name)
+        if factory is None:
+            raise KeyError(f"Agent '{name}' chưa được đăng ký")
+        start_time = time.perf_counter()
+        try:
+            instance = factory()
+        except Exception as e:
+            self._errors[name] = str(e)
+            logger.error(f"Lỗi khởi tạo agent '{name}': {e}")
+            raise
+        self._instances[name] = instance
+        self._built_at[name] = time.time()
+        self._build_time[name] = time.perf_counter() - start_time
+        self._errors.pop(name, None)
+        logger.info(f"Đã khởi tạo agent '{name}' trong {self._build_time[name] * 1000:.1f} ms")
+        return instance
+
+    def get(self, name: str) -> Any:
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            instance = self._instances.get(name)
+            if instance is None:
+                instance = self._build(name)
+            return instance
+
+    def lock(self, name: str) -> threading.Lock:
+        """
+        Khóa dùng khi agent giữ trạng thái hội thoại và không thể chạy song song.
+        """
+        with self._lock:
+            return self._agent_locks.setdefault(name, threading.Lock())
+
+    def alock(self, name: str) -> asyncio.Lock:
+        """
+        Như lock nhưng cho code async: lấy khóa này trước khi run_blocking agent để các
+        request chờ không chiếm thread của blocking_executor.
+        """
+        with self._lock:
+            return self._agent_alocks.setdefault(name, asyncio.Lock())
+
+    def build_all(self):
+        with self._lock:
+            for name in self._factories:
+                if name not in self._instances:
+                    self._build(name)
+
+    def reload(self, name: Optional[str] = None):
+        with self._lock:
+            names = [name] if name else list(self._factories)
+            for agent_name in names:
+                # Request đang chạy vẫn giữ tham chiếu tới instance cũ cho tới khi xong
+                self._build(agent_name)
+
+    def health(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                name: {
+                    "loaded": name in self._instances,
+                    "built_at": self._built_at.get(name),
+                    "build_time_ms": round(self._build_time[name] * 1000, 2) if name in self._build_time else None,
+                    "busy": self._agent_locks[name].locked()
+                    or (name in self._agent_alocks and self._agent_alocks[name].locked()),
+                    "error": self._errors.get(name),
+                }
+                for name in self._factories
+            }
+
+
+registry = AgentRegistry()
@@ -0,0 +1,83 @@
+import json
+import threading
+import time
+from typing import AsyncIterator, Optional
+
+from loguru import logger
+
+
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    """
+    Đóng gói một sự kiện Server-Sent Events.
+    """
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {payload}\n\n"
+
+
+class StreamMetrics:
+    """
+    Thống kê time-to-first-token và tổng thời gian của các response streaming.
+    """
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._ttft_ms: list = []
+        self._total_ms: list = []
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, ttft_ms: Optional[float], total_ms: float):
+        logger.info(f"[stream] {endpoint} ttft={ttft_ms if ttft_ms is None else round(ttft_ms)} ms total={round(total_ms)} ms")
+        with self._lock:
+            if ttft_ms is not None:
+                self._ttft_ms = (self._ttft_ms + [ttft_ms])[-self.window:]
+            self._total_ms = (self._total_ms + [total_ms])[-self.window:]
+
+    @staticmethod
+    def _percentile(values: list, q: float) -> Optional[float]:
+        if not values:
+            return None
+        ordered = sorted(values)
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * q))], 1)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "count": len(self._total_ms),
+                "ttft_p50_ms": self._percentile(self._ttft_ms, 0.5),
+                "ttft_p95_ms": self._percentile(self._ttft_ms, 0.95),
+                "total_p50_ms": self._percentile(self._total_ms, 0.5),
+                "total_p95_ms": self._percentile(self._total_ms, 0.95),
+            }
+
+
+class TimedStream:
+    """
+    Bọc một async iterator các đoạn text: gom nội dung đầy đủ và đo TTFT.
+    """
+
+    def __init__(self, chunks: AsyncIterator[str], start_time: Optional[float] = None):
+        self._chunks = chunks
+        self.start_time = start_time or time.perf_counter()
+        self.ttft_ms: Optional[float] = None
+        self.parts: list = []
+
+    @property
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    @property
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.start_time) * 1000
+
+    async def __aiter__(self):
+        async for chunk in self._chunks:
+            if not chunk:
+                continue
+            if self.ttft_ms is None:
+                self.ttft_ms = self.elapsed_ms
+            self.parts.append(chunk)
+            yield chunk
+
+
+stream_metrics = StreamMetrics()
@@ -0,0 +1,29 @@
+"""chat_message agent label
+
+Revision ID: 5b7d2c9e1f3a
+Revises: e84432525514
+Create Date: 2025-05-20 09:12:44.118302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b7d2c9e1f3a'
+down_revision: Union[str, None] = 'e84432525514'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Agent đã xử lý tin nhắn (ProductAgent, PoliciAgent, ...), dùng làm nhãn cho router cục bộ
+    op.add_column('chat_message', sa.Column('agent', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('chat_message', 'agent')
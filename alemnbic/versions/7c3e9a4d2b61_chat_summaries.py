@@ -0,0 +1,40 @@
+"""chat summaries and chat_message history index
+
+Revision ID: 7c3e9a4d2b61
+Revises: 5b7d2c9e1f3a
+Create Date: 2025-05-22 14:03:51.640217
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c3e9a4d2b61'
+down_revision: Union[str, None] = '5b7d2c9e1f3a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Lấy N lượt chat gần nhất theo (chat_id, created_at) không cần quét cả bảng
+    op.create_index('ix_chat_message_chat_id_created_at', 'chat_message', ['chat_id', 'created_at'], unique=False)
+
+    op.create_table(
+        'chat_summaries',
+        sa.Column('chat_id', sa.Integer(), sa.ForeignKey('chat.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('summary', sa.Text(), nullable=False),
+        sa.Column('summarized_until_id', sa.Integer(), nullable=False),
+        sa.Column('token_estimate', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), onupdate=sa.func.now(), nullable=False),
+        sa.PrimaryKeyConstraint('chat_id'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('chat_summaries')
+    op.drop_index('ix_chat_message_chat_id_created_at', 'chat_message')
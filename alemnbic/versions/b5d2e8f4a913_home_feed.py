@@ -0,0 +1,46 @@
+"""keyset index and home_feed materialized view for home products
+
+Revision ID: b5d2e8f4a913
+Revises: 9e4b6f1a3c27
+Create Date: 2025-05-27 14:06:38.552170
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5d2e8f4a913'
+down_revision: Union[str, None] = '9e4b6f1a3c27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_products_created_at_product_id', 'products',
+        [sa.text('created_at DESC'), sa.text('product_id DESC')], unique=False,
+    )
+    op.execute(
+        """
+        CREATE MATERIALIZED VIEW home_feed AS
+        SELECT
+            p.product_id,
+            p.created_at,
+            (SELECT min(pi.id) FROM product_images pi WHERE pi.product_id = p.product_id) AS image_id,
+            (SELECT min(pd.discount_id) FROM product_discounts pd WHERE pd.product_id = p.product_id) AS discount_id
+        FROM products p
+        """
+    )
+    # REFRESH ... CONCURRENTLY cần unique index
+    op.execute("CREATE UNIQUE INDEX ux_home_feed_product_id ON home_feed (product_id)")
+    op.execute("CREATE INDEX ix_home_feed_created_at_product_id ON home_feed (created_at DESC, product_id DESC)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP MATERIALIZED VIEW IF EXISTS home_feed")
+    op.drop_index('ix_products_created_at_product_id', 'products')
@@ -0,0 +1,30 @@
+"""chat_message agent_source
+
+Revision ID: c8f1a2d7e305
+Revises: b5d2e8f4a913
+Create Date: 2025-05-28 10:21:07.904512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8f1a2d7e305'
+down_revision: Union[str, None] = 'b5d2e8f4a913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Nguồn của nhãn agent: llm (Manager), router (router cục bộ), cache, forced ("xem thêm").
+    # Chỉ nhãn llm được dùng để học lại centroid của router.
+    op.add_column('chat_message', sa.Column('agent_source', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('chat_message', 'agent_source')
@@ -0,0 +1,29 @@
+"""index_outbox claimed_at lease
+
+Revision ID: d3a7b9c1e482
+Revises: c8f1a2d7e305
+Create Date: 2025-05-28 15:02:51.617230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3a7b9c1e482'
+down_revision: Union[str, None] = 'c8f1a2d7e305'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Thời điểm worker nhận job; job nhận quá hạn (worker chết giữa chừng) được nhận lại
+    op.add_column('index_outbox', sa.Column('claimed_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('index_outbox', 'claimed_at')
@@ -0,0 +1,29 @@
+"""keyset index on products (updated_at, product_id) for incremental sync
+
+Revision ID: f2c4e6a8b013
+Revises: d3a7b9c1e482
+Create Date: 2025-05-29 10:21:07.304518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c4e6a8b013'
+down_revision: Union[str, None] = 'd3a7b9c1e482'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # embedding/main.py iter_changed_products (--sync/--watch) duyệt theo (updated_at, product_id)
+    op.create_index('ix_products_updated_at_product_id', 'products', ['updated_at', 'product_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_products_updated_at_product_id', 'products')
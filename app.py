@@ -20,7 +20,11 @@ from controllers import (discounts,
                         reviews,
                         shopping_carts,
                         cart_items,
+                        agents,
 )
+from agent.registry import registry
+from services.index_outbox import index_outbox_worker
+from services.home_feed import home_feed_refresher
 
 from starlette.middleware.base import BaseHTTPMiddleware
 
@@ -36,6 +40,36 @@ alembic.config.main(argv=["--raiseerr", "upgrade", "head"])
 
 app = FastAPI(debug=env.DEBUG)
 
+
+@app.on_event("startup")
+def build_agents():
+    # Khởi tạo các agent một lần cho cả process thay vì mỗi request
+    registry.build_all()
+
+
+@app.on_event("startup")
+async def start_index_outbox_worker():
+    # Đồng bộ thay đổi sản phẩm sang Qdrant ở nền
+    if env.INDEX_OUTBOX_WORKER:
+        index_outbox_worker.start()
+
+
+@app.on_event("shutdown")
+async def stop_index_outbox_worker():
+    await index_outbox_worker.stop()
+
+
+@app.on_event("startup")
+async def start_home_feed_refresher():
+    # Làm mới view home_feed định kỳ (0 = tắt, refresh bằng tay/cron)
+    if env.HOME_FEED_MATERIALIZED and env.HOME_FEED_REFRESH_INTERVAL > 0:
+        home_feed_refresher.start()
+
+
+@app.on_event("shutdown")
+async def stop_home_feed_refresher():
+    await home_feed_refresher.stop()
+
 if AppEnvironment.is_local_env(env.APP_ENV):
     app.add_middleware(
         CORSMiddleware,
@@ -60,6 +94,7 @@ app.include_router(manager.router, prefix="/api")
 app.include_router(reviews.router, prefix="/api")
 app.include_router(shopping_carts.router, prefix="/api")
 app.include_router(cart_items.router, prefix="/api")
+app.include_router(agents.router, prefix="/api")
 
 
 class StaticFileMiddleware(BaseHTTPMiddleware):
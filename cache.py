@@ -0,0 +1,178 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+class TTLCache:
+    """
+    Cache LRU trong process, mỗi entry hết hạn sau ttl giây. Thread-safe.
+    """
+
+    def __init__(self, max_size: int = 1000, ttl: float = 3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at <= now:
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SingleFlight:
+    """
+    Gộp các lần load đồng thời cùng một key: chỉ thread đầu tiên gọi loader, các
+    thread khác chờ và dùng chung kết quả (hoặc exception) của lần gọi đó.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, loader) -> tuple:
+        """
+        Trả về (value, shared): shared=True nếu kết quả lấy từ lần load của thread khác.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {"event": threading.Event(), "value": None, "error": None}
+        if not leader:
+            call["event"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["value"], True
+        try:
+            call["value"] = loader()
+            return call["value"], False
+        except BaseException as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call["event"].set()
+
+    def do_many(self, keys, loader) -> tuple:
+        """
+        Bản hàng loạt: các key chưa có ai load được nạp bằng một lần loader(keys) -> {key: value}
+        (key thiếu trong kết quả nhận None), các key đang được thread khác load thì chờ
+        kết quả đó. Trả về ({key: value}, tập key dùng chung kết quả của thread khác).
+        """
+        owned, waiting = {}, {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                call = self._calls.get(key)
+                if call is None:
+                    owned[key] = self._calls[key] = {"event": threading.Event(), "value": None, "error": None}
+                else:
+                    waiting[key] = call
+        results = {}
+        if owned:
+            try:
+                loaded = loader(list(owned))
+                for key, call in owned.items():
+                    call["value"] = results[key] = loaded.get(key)
+            except BaseException as e:
+                for call in owned.values():
+                    call["error"] = e
+                raise
+            finally:
+                with self._lock:
+                    for key in owned:
+                        self._calls.pop(key, None)
+                for call in owned.values():
+                    call["event"].set()
+        # Chỉ chờ sau khi đã xong phần của mình nên hai thread không thể chờ lẫn nhau
+        for key, call in waiting.items():
+            call["event"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            results[key] = call["value"]
+        return results, set(waiting)
+
+
+class LocalSharedBackend:
+    """
+    Bản thay thế Redis trong process (cùng giao diện get/set/delete với bytes),
+    dùng khi chạy local/test không có Redis.
+    """
+
+    def __init__(self, max_size: int = 100_000):
+        self._cache = TTLCache(max_size=max_size, ttl=float("inf"))
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._cache.get(key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None):
+        self._cache.set(key, value, ttl=ttl if ttl else float("inf"))
+
+    def delete(self, *keys: str):
+        for key in keys:
+            self._cache.delete(key)
+
+
+class RedisBackend:
+    """
+    Backend dùng chung giữa các process/instance, tương thích mọi server nói giao thức Redis.
+    Cần cài gói redis (poetry install -E redis).
+    """
+
+    def __init__(self, url: str, prefix: str = "iuh:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("Shared cache backend requires the 'redis' package (poetry install -E redis)") from e
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None):
+        self._client.set(self.prefix + key, value, ex=int(ttl) if ttl else None)
+
+    def delete(self, *keys: str):
+        if keys:
+            self._client.delete(*(self.prefix + key for key in keys))
+
+
+def make_shared_backend(url: str):
+    """
+    "" -> không dùng backend chung; "local://" -> LocalSharedBackend; còn lại là URL Redis.
+    """
+    if not url:
+        return None
+    if url.startswith("local://"):
+        return LocalSharedBackend()
+    return RedisBackend(url)
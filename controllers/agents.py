@@ -0,0 +1,22 @@
+from fastapi import APIRouter, HTTPException
+from agent.registry import registry
+
+router = APIRouter(prefix="/agents", tags=["Agents"])
+
+@router.get("/health")
+def health():
+    """
+    Trạng thái các agent dùng chung trong process.
+    """
+    return registry.health()
+
+@router.post("/reload")
+def reload(name: str = None):
+    """
+    Khởi tạo lại một agent (hoặc tất cả) khi thay đổi cấu hình/prompt.
+    """
+    try:
+        registry.reload(name)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return registry.health()
@@ -1,18 +1,38 @@
+import asyncio
+import random
 import re
+import time
 from fastapi import APIRouter, HTTPException
+from loguru import logger
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from typing import Optional
 import json
 import traceback
 from autogen import ConversableAgent
+from agent.registry import registry
 from env import env
-from controllers.qdrant_agent import chatbot_endpoint as product_agent
+from controllers.qdrant_agent import AgentResponse, ChatbotRequest as ProductAgentRequest, chatbot_endpoint as product_agent, is_more_request
 from controllers.polici_agent import ask_chatbot as policy_agent
 from controllers.search import search
 from repositories.message import MessageRepository
+from executor import run_blocking
+from embedding.generate_embeddings import aquery_embedding
+from services.semantic_cache import semantic_cache
+from services.search_cursor import search_cursors
+from services.chat_context import ChatContextService
+from agent.intent_router import intent_router
+from agent.streaming import TimedStream, sse_event, stream_metrics
+from google import genai
 from models.message import CreateMessagePayload
 
 router = APIRouter(prefix="/manager", tags=["Chatbot"])
 
+client = genai.Client(api_key=env.GEMINI_API_KEY)
+
+# Giữ tham chiếu tới các task chạy nền để không bị GC giữa chừng
+_background_tasks = set()
+
 # Cấu hình model từ môi trường
 config_list = [{
     "model": "gemini-2.5-flash-preview-04-17",
@@ -34,9 +54,10 @@ def extract_qdrant_query(response: str):
     except json.JSONDecodeError as e:
         return {'agent': 'MySelf', 'query': str(response)}
 
-Manager = ConversableAgent(
-    name="manager",
-    system_message="""Bạn là một trợ lý AI thông minh làm việc cho một sàn thương mại điện tử IUH-Ecomerce
+def create_manager_agent() -> ConversableAgent:
+    return ConversableAgent(
+        name="manager",
+        system_message="""Bạn là một trợ lý AI thông minh làm việc cho một sàn thương mại điện tử IUH-Ecomerce
     Bạn sẽ nhận đầu vào câu hỏi của người dùng về sàn thương mại điện tử IUH-Ecomerce
     Nhiệm vụ của bạn là trả lời câu hỏi của người dùng một cách chính xác và đầy đủ nhất có thể
     Nếu bạn chưa đủ thông tin trả lời, bạn hãy sử dụng các trợ lý khác để tìm kiếm thông tin
@@ -50,54 +71,172 @@ Manager = ConversableAgent(
         Trong đó TransactionAgent là trợ lý tìm kiếm thông tin giao dịch
 
 
-        """,    
-    llm_config={"config_list": config_list},
-    human_input_mode= "NEVER"
-)
+        """,
+        llm_config={"config_list": config_list},
+        human_input_mode="NEVER"
+    )
 
-Iuh = ConversableAgent(
-    name="myself",
-    system_message=(
-        "Bạn là một trợ lý AI thông minh làm việc cho một sàn thương mại điện tử IUH-Ecomerce. "
-        "Bạn sẽ nhận đầu vào câu hỏi của người dùng về sàn thương mại điện tử IUH-Ecomerce. "
-        "Nhiệm vụ của bạn là trả lời câu hỏi của người dùng một cách chính xác và đầy đủ nhất có thể. "
-        "Nếu bạn chưa đủ thông tin trả lời, bạn hãy sử dụng các trợ lý khác để tìm kiếm thông tin. "
-        "Hãy trả về mô tả truy vấn Qdrant dưới dạng string duy nhất, KHÔNG kèm giải thích: "
-    ),
-    llm_config={"config_list": config_list},
-    human_input_mode="NEVER"
+MYSELF_SYSTEM_MESSAGE = (
+    "Bạn là một trợ lý AI thông minh làm việc cho một sàn thương mại điện tử IUH-Ecomerce. "
+    "Bạn sẽ nhận đầu vào câu hỏi của người dùng về sàn thương mại điện tử IUH-Ecomerce. "
+    "Nhiệm vụ của bạn là trả lời câu hỏi của người dùng một cách chính xác và đầy đủ nhất có thể. "
+    "Nếu bạn chưa đủ thông tin trả lời, bạn hãy sử dụng các trợ lý khác để tìm kiếm thông tin. "
+    "Hãy trả về mô tả truy vấn Qdrant dưới dạng string duy nhất, KHÔNG kèm giải thích: "
 )
 
+def create_myself_agent() -> ConversableAgent:
+    return ConversableAgent(
+        name="myself",
+        system_message=MYSELF_SYSTEM_MESSAGE,
+        llm_config={"config_list": config_list},
+        human_input_mode="NEVER"
+    )
+
+registry.register("manager", create_manager_agent)
+registry.register("myself", create_myself_agent)
+
 async def extract_query_info(query: str):
-    chat = await Manager.a_generate_reply(
+    chat = await registry.get("manager").a_generate_reply(
         messages=[{"role": "user", "content": query}]
     )
-    print(f"Raw chat response: {chat["content"]} (type: {type(chat)})")
+    print(f"Raw chat response: {chat['content']} (type: {type(chat)})")
     chat = extract_qdrant_query(str(chat["content"]))
     print(f"❎❎❎❎❎Parsed JSON response: {chat} (type: {type(chat)})")
     return chat
 
 
-async def call_agent(agent: str, request: ChatbotRequest):
+def local_route(message: str, query_vector):
+    """
+    Quyết định của router cục bộ và agent gợi ý cho semantic cache (None nếu chưa đủ tin cậy).
+    """
+    decision = intent_router.route(message, query_vector)
+    return decision, decision.agent if intent_router.is_confident(decision) else None
+
+
+async def route_query(question: str, message: str, query_vector, decision=None) -> dict:
+    """
+    Chọn agent bằng router cục bộ, chỉ gọi Manager (LLM) khi độ tin cậy thấp.
+    decision: kết quả local_route đã tính trước đó (nếu có) để khỏi route lại.
+    """
+    if decision is None:
+        decision = intent_router.route(message, query_vector)
+    if intent_router.is_confident(decision):
+        intent_router.record_local(decision)
+        logger.info(f"Local router -> {decision.agent} ({decision.confidence:.2f}, {decision.source})")
+        if random.random() < env.ROUTER_SHADOW_RATE:
+            # So sánh ngầm với LLM để đo tỷ lệ đồng thuận, không làm chậm request
+            task = asyncio.create_task(shadow_route(question, decision, query_vector))
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+        return {"agent": decision.agent, "query": message, "source": "router"}
+
+    start_time = time.perf_counter()
+    response = await extract_query_info(question)
+    llm_latency_ms = (time.perf_counter() - start_time) * 1000
+    intent_router.record_llm(decision, response.get("agent"), llm_latency_ms)
+    intent_router.observe(query_vector, response.get("agent"))
+    response["source"] = "llm"
+    return response
+
+
+async def shadow_route(question: str, decision, query_vector):
+    try:
+        start_time = time.perf_counter()
+        response = await extract_query_info(question)
+        intent_router.record_llm(decision, response.get("agent"), (time.perf_counter() - start_time) * 1000, counted=False)
+        intent_router.observe(query_vector, response.get("agent"))
+    except Exception as e:
+        logger.warning(f"Shadow routing lỗi: {e}")
+
+
+async def with_history(request: ChatbotRequest, message_id: Optional[int] = None) -> str:
+    """
+    Câu hỏi kèm ngữ cảnh hội thoại (tóm tắt + các lượt gần nhất, giới hạn token).
+    message_id: tin nhắn hiện tại đã lưu, không lặp lại trong phần lịch sử.
+    """
+    history = await ChatContextService.abuild(request.chat_id, before_id=message_id)
+    if not history:
+        return request.message
+    return f"Lịch sử hội thoại:\n{history}\n\nCâu hỏi hiện tại: {request.message}"
+
+
+async def cache_scope(chat_id: int, message_id: int) -> Optional[int]:
+    """
+    Scope semantic cache: câu trả lời trong chat đã có lịch sử có thể phụ thuộc ngữ cảnh
+    ("cái thứ hai giá bao nhiêu") nên chỉ dùng lại trong chính chat đó.
+    """
+    return chat_id if await ChatContextService.ahas_history(chat_id, message_id) else None
+
+
+async def call_agent(agent: str, request: ChatbotRequest, message_id: Optional[int] = None):
     if agent == "ProductAgent":
-        result = await product_agent(request)
+        result = await product_agent(ProductAgentRequest(chat_id=request.chat_id, message=request.message, message_id=message_id))
         return result
     elif agent == "PoliciAgent":
-        result = policy_agent(request)
+        # autogen initiate_chat là sync -> offload sang thread pool giới hạn. Cặp agent policy
+        # chạy tuần tự: chờ khóa trên event loop trước, để request xếp hàng không giữ thread
+        async with registry.alock("policy"):
+            result = await run_blocking(policy_agent, request.message)
         # giả sử policy_agent trả về dict có key 'response'
         return result.get("response") if isinstance(result, dict) else result
     elif agent == "MySelf":
-        result = await Iuh.a_generate_reply(
-            messages=[{"role": "user", "content": request.message}]
+        result = await registry.get("myself").a_generate_reply(
+            messages=[{"role": "user", "content": await with_history(request, message_id)}]
         )
         return result
     elif agent == "TransactionAgent":
-        result = search(request.message)
+        result = await run_blocking(search, request.message)
         return result
     else:
         raise ValueError(f"Unknown agent: {agent}")
 
 
+def unpack_result(result) -> tuple[str, bool]:
+    """
+    (nội dung trả lời, thành công?) từ kết quả của call_agent. Chỉ câu trả lời
+    thành công mới được đưa vào semantic cache.
+    """
+    if isinstance(result, AgentResponse):
+        return result.content, result.status == "success"
+    if isinstance(result, dict):
+        return result["content"], True
+    return str(result), bool(result)
+
+
+async def stream_agent(agent: str, request: ChatbotRequest, outcome: dict, message_id: Optional[int] = None):
+    """
+    Trả về câu trả lời của agent theo từng đoạn. Agent không hỗ trợ streaming
+    (PoliciAgent, TransactionAgent) trả về cả câu trả lời trong một đoạn.
+    Trạng thái câu trả lời được ghi vào outcome["status"].
+    """
+    outcome["status"] = "success"
+    if agent == "ProductAgent":
+        question = f"Người dùng hỏi: {request.message}"
+        chunks = registry.get("product").stream_query(
+            user_query=question, chat_id=request.chat_id, raw_message=request.message, outcome=outcome, message_id=message_id
+        )
+        async for chunk in chunks:
+            yield chunk
+    elif agent == "MySelf":
+        stream = await client.aio.models.generate_content_stream(
+            model=config_list[0]["model"],
+            contents=await with_history(request, message_id),
+            config={"system_instruction": MYSELF_SYSTEM_MESSAGE},
+        )
+        async for chunk in stream:
+            if chunk.text:
+                yield chunk.text
+    else:
+        content, ok = unpack_result(await call_agent(agent, request, message_id))
+        if not ok:
+            outcome["status"] = "error"
+        yield content
+
+
+async def single_chunk(text: str):
+    yield text
+
+
 @router.post("/ask")
 async def ask_chatbot(request: ChatbotRequest):
     try:
@@ -110,53 +249,181 @@ async def ask_chatbot(request: ChatbotRequest):
             role="user",
             content=request.message
         )
-        new_mess = message_repository.create(message_payload)
+        new_mess, query_vector = await asyncio.gather(
+            message_repository.acreate(message_payload),
+            aquery_embedding(request.message),
+        )
+
+        # "Xem thêm" phụ thuộc trạng thái phân trang của chat, không dùng semantic cache
+        more = is_more_request(request.message) and search_cursors.chat_cursor(request.chat_id) is not None
+
+        # Câu hỏi gần giống (cùng agent nếu router đủ tin cậy, cùng ràng buộc số) đã được trả lời -> bỏ qua routing + agent
+        decision, agent_hint = local_route(request.message, query_vector)
+        scope = await cache_scope(request.chat_id, new_mess.id)
+        cached = None if more else semantic_cache.lookup(query_vector, request.message, agent=agent_hint, scope=scope)
+        if cached:
+            logger.info(f"Semantic cache hit ({cached.score:.3f}) cho agent {cached.agent}: {cached.query}")
+            await message_repository.acreate(CreateMessagePayload(
+                chat_id=request.chat_id,
+                role="assistant",
+                content=cached.answer,
+                agent=cached.agent,
+                agent_source="cache"
+            ))
+            return {
+                "message": cached.answer,
+                "agent": cached.agent,
+                "message_id": new_mess.id,
+                "cached": True,
+            }
 
         # Tạo câu hỏi
         question = f"Người dùng hỏi: {request.message}"
         print(f"Querying Manager with question: {question}")
 
-        # Gọi hàm lấy agent + query JSON
-        response = await extract_query_info(question)
+        # Lấy agent + query JSON (router cục bộ, fallback về Manager)
+        response = {"agent": "ProductAgent", "source": "forced"} if more else await route_query(question, request.message, query_vector, decision)
         print(f"Parsed JSON response from Manager: {response}")
 
         
-        result = await call_agent(response["agent"], request)
+        result = await call_agent(response["agent"], request, new_mess.id)
         print(f"Final result from agent {response['agent']}: {result}")
 
         ## lưu phản hồi vào DB
+        content, ok = unpack_result(result)
+        response_payload = CreateMessagePayload(
+            chat_id=request.chat_id,
+            role="assistant",
+            content=content,
+            agent=response["agent"],
+            agent_source=response.get("source")
+        )
+        await message_repository.acreate(response_payload)
+        # Câu trả lời lỗi / không có kết quả không được cache, lần hỏi sau chạy lại agent
+        if ok and not more:
+            semantic_cache.store(query_vector, request.message, content, response["agent"], scope)
+        ChatContextService.schedule_summary_update(request.chat_id)
 
-        if isinstance(result, dict):
-            response_payload = CreateMessagePayload(
-                chat_id=request.chat_id,
-                role="assistant",
-                content=result['content']
-            )
-            message_repository.create(response_payload)
+        return {
+            "message": content,
+            "agent": response["agent"],
+            "message_id": new_mess.id,
+        }
 
-            return {
-                "message": result['content'],
-                "agent": response["agent"],
-                "message_id": new_mess.id,
-            }
-        else:
-            response_payload = CreateMessagePayload(
-                chat_id=request.chat_id,
-                role="assistant",
-                content=result
-            )
-            message_repository.create(response_payload)
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e) or "Đã xảy ra lỗi khi xử lý yêu cầu.")
 
-            return {
-                "message": result,
-                "agent": response["agent"],
-                "message_id": new_mess.id,
-            }
 
+@router.post("/ask/stream")
+async def ask_chatbot_stream(request: ChatbotRequest):
+    """
+    Phiên bản streaming (SSE) của /ask. Các sự kiện: agent -> token... -> done.
+    """
+    start_time = time.perf_counter()
+    try:
+        message_repository = MessageRepository()
+        new_mess, query_vector = await asyncio.gather(
+            message_repository.acreate(CreateMessagePayload(
+                chat_id=request.chat_id,
+                role="user",
+                content=request.message
+            )),
+            aquery_embedding(request.message),
+        )
+
+        more = is_more_request(request.message) and search_cursors.chat_cursor(request.chat_id) is not None
+        decision, agent_hint = local_route(request.message, query_vector)
+        scope = await cache_scope(request.chat_id, new_mess.id)
+        cached = None if more else semantic_cache.lookup(query_vector, request.message, agent=agent_hint, scope=scope)
+        outcome = {}
+        if cached:
+            agent, agent_source = cached.agent, "cache"
+            chunks = single_chunk(cached.answer)
+        else:
+            response = {"agent": "ProductAgent", "source": "forced"} if more else await route_query(f"Người dùng hỏi: {request.message}", request.message, query_vector, decision)
+            agent, agent_source = response["agent"], response.get("source")
+            chunks = stream_agent(agent, request, outcome, new_mess.id)
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e) or "Đã xảy ra lỗi khi xử lý yêu cầu.")
 
+    async def event_stream():
+        yield sse_event({"type": "agent", "agent": agent, "message_id": new_mess.id, "cached": bool(cached)})
+        stream = TimedStream(chunks, start_time)
+        try:
+            async for chunk in stream:
+                yield sse_event({"type": "token", "content": chunk})
+        except Exception as e:
+            traceback.print_exc()
+            yield sse_event({"type": "error", "detail": str(e) or "Đã xảy ra lỗi khi xử lý yêu cầu."})
+            return
+
+        # Lưu câu trả lời đầy đủ sau khi stream xong
+        await message_repository.acreate(CreateMessagePayload(
+            chat_id=request.chat_id,
+            role="assistant",
+            content=stream.text,
+            agent=agent,
+            agent_source=agent_source
+        ))
+        if not cached and not more and outcome.get("status") == "success":
+            semantic_cache.store(query_vector, request.message, stream.text, agent, scope)
+        ChatContextService.schedule_summary_update(request.chat_id)
+        stream_metrics.record("manager", stream.ttft_ms, stream.elapsed_ms)
+        yield sse_event({
+            "type": "done",
+            "agent": agent,
+            "message_id": new_mess.id,
+            "ttft_ms": stream.ttft_ms,
+            "total_ms": stream.elapsed_ms,
+        })
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+@router.get("/stream/stats")
+def stream_stats():
+    return stream_metrics.stats()
+
+
+@router.get("/cache/stats")
+def cache_stats():
+    return semantic_cache.stats()
+
+
+@router.get("/router/stats")
+def router_stats():
+    return intent_router.stats()
+
+
+@router.post("/router/fit")
+async def router_fit(limit: int = 500):
+    """
+    Học lại centroid từ đầu, chỉ từ các nhãn Manager (LLM) đã lưu trong chat_message.
+    """
+    samples = await run_blocking(MessageRepository.get_labeled_queries, limit)
+    semaphore = asyncio.Semaphore(4)
+
+    async def embed(text: str):
+        async with semaphore:
+            return await aquery_embedding(text)
+
+    vectors = await asyncio.gather(*(embed(query) for query, _ in samples))
+    intent_router.reset_centroids()
+    for vector, (_, label) in zip(vectors, samples):
+        intent_router.observe(vector, label)
+    return intent_router.stats()
+
+
+@router.post("/cache/invalidate")
+def cache_invalidate(agent: str = None, collection_name: str = None):
+    if collection_name:
+        semantic_cache.invalidate_collection(collection_name)
+    else:
+        semantic_cache.invalidate(agent)
+    return semantic_cache.stats()
+
 # async def test():
 #     rs = await ask_chatbot(
 #         ChatbotRequest(
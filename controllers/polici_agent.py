@@ -11,6 +11,7 @@ from controllers.search import search
 import traceback
 from models.message import MessageModel, CreateMessagePayload
 from autogen import register_function
+from agent.registry import registry
 from env import env
 
 # Lấy cấu hình model từ môi trường
@@ -23,23 +24,34 @@ config_list = [
 
 
 
-assistant = ConversableAgent(
-    name="Assistant",
-    system_message="Bạn là một trợ lý AI thông minh làm việc cho một sàn thương mại điện tử IUH-Ecomerce"
-    "Bạn sẽ nhận đầu vào câu hỏi của người dùng về các chính sách của sàn thương mại điện tử IUH-Ecomerce"
-    "Nhiệm vụ của bạn là tìm kiếm thông tin trong cơ sở dữ liệu và trả lời câu hỏi của người dùng một cách chính xác và đầy đủ nhất có thể"
-    "Đầu ra dưới dạng string  là 1 đoạn văn duy nhất, không thêm ký tự đặc biệt, thêm dấu câu nếu cần",
-    llm_config={"config_list": config_list},
-    max_consecutive_auto_reply=2
-)
-
-user_proxy = ConversableAgent(
-    name="User",
-    llm_config=False,
-    is_termination_msg=lambda msg: msg.get("content") is not None and (
-        "TERMINATE" in msg["content"] or msg.get("reply_count", 0) >= 0
-    ),human_input_mode="NEVER",
-)
+def create_policy_agents():
+    assistant = ConversableAgent(
+        name="Assistant",
+        system_message="Bạn là một trợ lý AI thông minh làm việc cho một sàn thương mại điện tử IUH-Ecomerce"
+        "Bạn sẽ nhận đầu vào câu hỏi của người dùng về các chính sách của sàn thương mại điện tử IUH-Ecomerce"
+        "Nhiệm vụ của bạn là tìm kiếm thông tin trong cơ sở dữ liệu và trả lời câu hỏi của người dùng một cách chính xác và đầy đủ nhất có thể"
+        "Đầu ra dưới dạng string  là 1 đoạn văn duy nhất, không thêm ký tự đặc biệt, thêm dấu câu nếu cần",
+        llm_config={"config_list": config_list},
+        max_consecutive_auto_reply=2
+    )
+
+    user_proxy = ConversableAgent(
+        name="User",
+        llm_config=False,
+        is_termination_msg=lambda msg: msg.get("content") is not None and (
+            "TERMINATE" in msg["content"] or msg.get("reply_count", 0) >= 0
+        ),human_input_mode="NEVER",
+    )
+
+    # Đăng ký tool một lần khi khởi tạo thay vì mỗi request
+    register_function(
+        get_fqa,
+        caller=assistant,
+        executor=user_proxy,
+        name="search",
+        description="A simple search function",
+    )
+    return assistant, user_proxy
 
 
 router = APIRouter(prefix="/chatbot", tags=["Chatbot"])
@@ -61,6 +73,9 @@ def get_fqa(payload: str, collection_name: str = "poli_embeddings", limit: int =
     return fqa.answer
 
 
+registry.register("policy", create_policy_agents)
+
+
 @router.post("/ask")
 def ask_chatbot(request: str):
     try:
@@ -79,22 +94,17 @@ def ask_chatbot(request: str):
         # print(search(request))
         # get_fqa(request, collection_name="poli_embeddings", limit=1)
         question = f"Người dùng hỏi: {message}"
-
-        register_function(
-            get_fqa,
-            caller=assistant,  
-            executor=user_proxy,  
-            name="search",  
-            description="A simple search function", 
-        )
-        chat_result = user_proxy.initiate_chat(
-            assistant,
-            message=question,
-            function_call={"name": "search"},
-            function_args={"payload": message, "collection_name": "poli_embeddings", "limit": 1},
-            auto_reply=True,
-            silent=True  # Ẩn tin nhắn này trong lịch sử chat
-        )
+        assistant, user_proxy = registry.get("policy")
+        # Cặp agent giữ lịch sử hội thoại nên không chạy song song trên cùng instance
+        with registry.lock("policy"):
+            chat_result = user_proxy.initiate_chat(
+                assistant,
+                message=question,
+                function_call={"name": "search"},
+                function_args={"payload": message, "collection_name": "poli_embeddings", "limit": 1},
+                auto_reply=True,
+                silent=True  # Ẩn tin nhắn này trong lịch sử chat
+            )
         print(f"Response from assistant: {chat_result.summary}")
         # Lưu phản hồi vào cơ sở dữ liệu
         # response_payload = CreateMessagePayload(
@@ -1,6 +1,11 @@
-from fastapi import APIRouter
-from models.products import Product, ProductModel, ProductCreate
+from typing import Optional
+from fastapi import APIRouter, HTTPException
+from models.products import Product, ProductBatchRequest, ProductModel, ProductCreate
+from repositories.products import ProductNotFound
 from services.products import ProductServices
+from services.index_outbox import index_outbox_worker
+from services.product_cache import product_cache
+from services.home_feed import home_feed_refresher
 
 router = APIRouter(prefix="/products", tags=["products"])
 @router.post("/add", response_model=ProductModel)
@@ -30,12 +35,45 @@ def update(product_id: int, product: ProductCreate):
 @router.get("/get_info/{id}")
 def get_info(id: int):
     """
-    Get product information by ID.
+    Get product information by ID. 404 if the product does not exist.
     """
-    return ProductServices.get_info(id)
+    try:
+        return ProductServices.get_info(id)
+    except ProductNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+@router.post("/batch")
+def get_batch(request: ProductBatchRequest):
+    """
+    Get many products in one call, in request order. Unknown ids are listed in "missing".
+    """
+    products = ProductServices.get_batch(request.ids, request.projection)
+    found = {item["product"].product_id if request.projection == "full" else item["product_id"] for item in products}
+    return {"products": products, "missing": [pid for pid in dict.fromkeys(request.ids) if pid not in found]}
 @router.get("/get_home_products")
-def get_home_products(offset: int = 0, limit: int = 10):
+def get_home_products(offset: int = 0, limit: int = 10, cursor: Optional[str] = None):
+    """
+    Get home products, newest first. Pass the returned next_cursor to get the next page;
+    offset is only used when no cursor is given.
+    """
+    try:
+        return ProductServices.get_home_products(offset, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+@router.get("/index/stats")
+def index_stats():
+    """
+    Queue depth, lag and counters of the product vector-indexing outbox.
+    """
+    return index_outbox_worker.stats()
+@router.get("/cache/stats")
+def cache_stats():
+    """
+    Hit/miss, coalesced loads and invalidations of the product read-through cache.
+    """
+    return product_cache.stats()
+@router.get("/home/stats")
+def home_feed_stats():
     """
-    Get home products with pagination.
+    Refresh counters of the home_feed materialized view.
     """
-    return ProductServices.get_home_products(offset, limit)
\ No newline at end of file
+    return home_feed_refresher.stats()
@@ -1,28 +1,58 @@
 import json
 import re
 import time
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional
 
 import autogen
 from autogen import ConversableAgent
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from loguru import logger
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 
+from agent.intent_router import normalize_query
+from agent.pipeline import StagePipeline
+from agent.registry import registry
+from agent.streaming import TimedStream, sse_event, stream_metrics
+from embedding.generate_embeddings import aquery_embedding
 from env import env
+from executor import run_blocking
 from models.message import CreateMessagePayload
+from models.search_filters import ProductSearchFilter
 from repositories.message import MessageRepository
 from services.products import ProductServices
+from services.chat_context import ChatContextService
 from services.search import SearchServices
+from services.search_cursor import search_cursors
 from google import genai
 
 client = genai.Client(api_key=env.GEMINI_API_KEY)
 
 router = APIRouter(prefix="/chatbot", tags=["Chatbot"])
 
+NO_RESULT_MESSAGE = "Không tìm thấy kết quả phù hợp với yêu cầu của bạn."
+ERROR_MESSAGE = "Đã xảy ra lỗi khi thực hiện truy vấn."
+FILTERABLE_COLLECTIONS = {"product_name_embeddings"}
+# Số sản phẩm giới thiệu trong mỗi câu trả lời; "xem thêm" lấy tiếp trang kế tiếp
+EXPLANATION_TOP_K = 3
+# Câu hỏi đã bỏ dấu, chữ thường (normalize_query)
+MORE_RESULTS_PATTERN = re.compile(
+    r"\b(xem them|them nua|con nua|con gi nua|khac nua|san pham khac|trang sau|trang tiep|show more|more results)\b"
+)
+
+def is_more_request(message: Optional[str]) -> bool:
+    """
+    Câu ngắn kiểu "xem thêm", "còn nữa không" yêu cầu trang kết quả kế tiếp.
+    """
+    normalized = normalize_query(message)
+    return len(normalized.split()) <= 6 and bool(MORE_RESULTS_PATTERN.search(normalized))
+
+
 class ChatbotRequest(BaseModel):
     chat_id: int
     message: str
+    # Tin nhắn hiện tại nếu đã được lưu vào chat_message, bị loại khỏi lịch sử hội thoại
+    message_id: Optional[int] = None
 
 class AgentResponse(BaseModel):
     content: str = Field(..., description="Nội dung phản hồi từ agent")
@@ -55,6 +85,11 @@ class QdrantAgent:
                 "product_id": product_id,
                 "name": product.name,
                 "description": product.description,
+                "price": product.price,                  # có payload index, lọc được
+                "brand_id": product.brand_id,            # có payload index, lọc được
+                "category_path": [category_id, ...],     # có payload index, lọc được
+                "rating_average": product.rating_average,  # có payload index, lọc được
+                "availability": product.availability,    # có payload index, lọc được
             }
         )
 
@@ -86,9 +121,23 @@ class QdrantAgent:
             "collection_name": "tên collection cần truy vấn",
             "payload": "giá trị đầu vào dạng chuỗi để tìm kiếm embedding",
             "limit": 20,
-            "function": "search"
+            "function": "search",
+            "filters": {{
+                "min_price": null,
+                "max_price": null,
+                "brand_name": null,
+                "category_name": null,
+                "min_rating": null
+            }}
         }}
         ```
+
+        Quy tắc cho "filters" (chỉ điền khi người dùng nêu rõ, còn lại để null):
+        - Giá tính bằng VND: "dưới 500k" -> "max_price": 500000; "từ 1 đến 2 triệu" -> "min_price": 1000000, "max_price": 2000000
+        - "của Sony", "hãng Samsung" -> "brand_name": "Sony" / "Samsung"
+        - Loại sản phẩm chung (vd: "tai nghe", "sách") đưa vào "payload", chỉ điền "category_name" khi người dùng nói rõ danh mục
+        - "đánh giá từ 4 sao" -> "min_rating": 4
+        - Không đưa điều kiện giá/thương hiệu vào "payload"
         """
         return autogen.ConversableAgent(
             name="qdrant_expert",
@@ -99,7 +148,7 @@ class QdrantAgent:
 
     def _extract_qdrant_query(self, response: str) -> Dict[str, Any]:
         json_match = re.search(r'```json\s*(\{.*?\})\s*```', response, re.DOTALL) or \
-                     re.search(r'(\{.*?\})', response, re.DOTALL)
+                     re.search(r'(\{.*\})', response, re.DOTALL)
         if not json_match:
             logger.warning(f"Không tìm thấy truy vấn Qdrant: {response}")
             return {"collection_name": "products", "payload": "", "limit": 5}
@@ -109,53 +158,102 @@ class QdrantAgent:
             logger.error(f"Lỗi parse JSON: {e}")
             return {"collection_name": "products", "payload": "", "limit": 5}
 
-    def _execute_qdrant_query(self, query_info: Dict[str, Any]) -> List[Dict]:
+    @staticmethod
+    def _extract_filters(query_info: Dict[str, Any]) -> Optional[ProductSearchFilter]:
+        raw = query_info.get("filters")
+        if not isinstance(raw, dict):
+            return None
+        try:
+            filters = ProductSearchFilter.model_validate({k: v for k, v in raw.items() if v not in (None, "", [])})
+        except ValidationError as e:
+            logger.warning(f"Bỏ qua filters không hợp lệ {raw}: {e}")
+            return None
+        return None if filters.is_empty() else filters
+
+    async def _execute_qdrant_query(self, query_info: Dict[str, Any], vector=None) -> List[Dict]:
         function = query_info.get("function")
         collection = query_info.get("collection_name")
+        # Chỉ collection có payload index mới lọc được, collection khác sẽ trả về rỗng
+        filters = self._extract_filters(query_info) if collection in FILTERABLE_COLLECTIONS else None
 
-        if function in ("search", "recommend_for_user"):
-            collection = collection if function == "search" else "user_queries"
-            return SearchServices.search(
-                payload=query_info.get("payload", ""),
-                collection_name=collection,
-                limit=query_info.get("limit")
-            )
-
-        logger.debug("Chức năng không xác định, fallback về search.")
-        return SearchServices.search(
-            payload=query_info.get("payload", ""),
+        if function == "recommend_for_user":
+            collection = "user_queries"
+        elif function != "search":
+            logger.debug("Chức năng không xác định, fallback về search.")
+
+        # Lấy trang đầu qua cursor để "xem thêm" dùng lại vector và danh sách ứng viên
+        page = await SearchServices.asearch_page(
+            query=query_info.get("payload", ""),
+            limit=EXPLANATION_TOP_K,
             collection_name=collection,
-            limit=query_info.get("limit")
+            vector=vector,
+            filters=filters,
         )
+        search_cursors.remember_chat(query_info.get("chat_id"), page["next_cursor"])
+        return page["ids"]
 
-    def _generate_explanation(self, query_info: Dict[str, Any], query_result: List[Dict], user_query: str, chat_id: int) -> Dict[str, str]:
-        if not query_result:
-            return {"response": "Không tìm thấy kết quả phù hợp với yêu cầu của bạn."}
+    async def _next_page(self, chat_id: int) -> List[int]:
+        cursor = search_cursors.chat_cursor(chat_id)
+        try:
+            page = await SearchServices.asearch_page(cursor=cursor, limit=EXPLANATION_TOP_K)
+        except ValueError:
+            search_cursors.remember_chat(chat_id, None)
+            return []
+        search_cursors.remember_chat(chat_id, page["next_cursor"])
+        return page["ids"]
 
+    def _build_explanation_prompt(self, query_result: List[Dict], user_query: str, history: str = "") -> str:
         data_description = f"Đây là một số sản phẩm mà tôi tìm thấy cho bạn: "
         top_products = ", ".join(
-            f"{item.__dict__['name']} ({item.__dict__.get('price', 'N/A')} VND) {item.__dict__.get('product_short_url', 'N/A')}" for item in query_result[:3]
+            f"{item.__dict__['name']} ({item.__dict__.get('price', 'N/A')} VND) {item.__dict__.get('product_short_url', 'N/A')}" for item in query_result[:EXPLANATION_TOP_K]
         )
         data_description += f" {top_products}."
 
-        explanation_prompt = f"""
+        return f"""
         Bạn là 1 trợ lý AI thông minh, làm việc cho một sàn thương mại điện tử IUH-Ecomerce.
         Bạn sẽ nhận đầu vào là một câu hỏi của người dùng về sản phẩm và một mô tả dữ liệu trả về từ Qdrant.
+        Lịch sử hội thoại gần đây: {history or "Không có"}
         Câu hỏi của người dùng: {user_query}
         Mô tả dữ liệu trả về: {data_description}
         Hãy viết câu trả lời thân thiện bằng tiếng Việt để giới thiệu về sản phẩm.
         """
-        response = client.models.generate_content(
+
+    async def _generate_explanation(self, query_info: Dict[str, Any], query_result: List[Dict], user_query: str, chat_id: int, history: str = "") -> str:
+        response = await client.aio.models.generate_content(
             model="gemini-2.5-flash-preview-04-17",
-            contents=explanation_prompt,
+            contents=self._build_explanation_prompt(query_result, user_query, history),
         )
         return response.text
 
+    async def _stream_explanation(self, query_result: List[Dict], user_query: str, history: str = "") -> AsyncIterator[str]:
+        if not query_result:
+            yield NO_RESULT_MESSAGE
+            return
 
+        stream = await client.aio.models.generate_content_stream(
+            model="gemini-2.5-flash-preview-04-17",
+            contents=self._build_explanation_prompt(query_result, user_query, history),
+        )
+        async for chunk in stream:
+            if chunk.text:
+                yield chunk.text
 
-    async def process_query(self, user_query: str, chat_id: int) -> AgentResponse:
-        start_time = time.time()
-        try:
+    def _build_pipeline(self, user_query: str, chat_id: int, raw_message: Optional[str], message_id: Optional[int] = None) -> StagePipeline:
+        """
+        Đồ thị các bước lấy sản phẩm. Lịch sử chat và embedding speculative của câu hỏi
+        gốc chạy song song với bước agent viết lại truy vấn.
+        """
+        pipeline = StagePipeline(f"product_agent chat={chat_id}")
+        # "Xem thêm" khi chat còn cursor: lấy trang kế tiếp, bỏ qua viết lại truy vấn và embed
+        more = is_more_request(raw_message or user_query) and search_cursors.chat_cursor(chat_id) is not None
+
+        async def history(_):
+            return await ChatContextService.abuild(chat_id, before_id=message_id)
+
+        async def speculative_embedding(_):
+            return await aquery_embedding(raw_message)
+
+        async def rewrite(_):
             prompt = f"""
             Hãy phân tích và tạo truy vấn Qdrant cho câu hỏi sau:
             "{user_query}"
@@ -164,23 +262,94 @@ class QdrantAgent:
             agent_response = await self.agent.a_generate_reply(messages=[{"role": "user", "content": prompt}])
             query_info = self._extract_qdrant_query(agent_response)
             query_info["chat_id"] = chat_id
+            return query_info
+
+        async def embedding(p):
+            query_info = await p.get("rewrite")
+            payload = query_info.get("payload", "")
+            if raw_message and (not payload.strip() or normalize_query(payload) == normalize_query(raw_message)):
+                # Agent giữ nguyên câu hỏi -> dùng lại embedding đã tính speculative
+                return await p.get("speculative_embedding")
+            p.cancel("speculative_embedding")
+            return await aquery_embedding(payload)
 
-            raw_results = self._execute_qdrant_query(query_info)
+        async def search(p):
+            query_info = await p.get("rewrite")
+            return await self._execute_qdrant_query(query_info, vector=await p.get("embedding"))
 
-            # Trích product_id và gọi ProductServices.get
-            products = []
-            for pid in raw_results:
-                if pid:
-                    product = ProductServices.get(pid)
-                    if product:
-                        products.append(product)
-            explanation = self._generate_explanation(query_info, products, user_query, chat_id)
+        async def hydrate(p):
+            # Lấy dạng rút gọn (không có mô tả HTML) trong một truy vấn, giữ thứ hạng sau rerank
+            return await run_blocking(ProductServices.get_summaries, await p.get("search"))
+
+        async def next_page(_):
+            return await self._next_page(chat_id)
+
+        async def skip_rewrite(_):
+            return {"function": "more", "chat_id": chat_id}
+
+        pipeline.add("history", history)
+        if more:
+            pipeline.add("rewrite", skip_rewrite)
+            pipeline.add("search", next_page)
+            pipeline.add("hydrate", hydrate, deps=["search"])
+            return pipeline
+        if raw_message:
+            pipeline.add("speculative_embedding", speculative_embedding, speculative=True)
+        pipeline.add("rewrite", rewrite)
+        pipeline.add("embedding", embedding, deps=["rewrite"])
+        pipeline.add("search", search, deps=["embedding"])
+        pipeline.add("hydrate", hydrate, deps=["search"])
+        return pipeline
+
+    async def process_query(self, user_query: str, chat_id: int, raw_message: Optional[str] = None, message_id: Optional[int] = None) -> AgentResponse:
+        start_time = time.time()
+        pipeline = self._build_pipeline(user_query, chat_id, raw_message, message_id)
+        try:
+            results = await pipeline.run("rewrite", "hydrate", "history")
+            if not results["hydrate"]:
+                return AgentResponse(content=NO_RESULT_MESSAGE, status="no_result", execution_time=time.time() - start_time)
+            async with pipeline.timed("explanation"):
+                explanation = await self._generate_explanation(
+                    results["rewrite"], results["hydrate"], user_query, chat_id, results["history"]
+                )
             print(f"Explanation: {explanation}")
-            return explanation
+            return AgentResponse(content=explanation, execution_time=time.time() - start_time)
 
         except Exception as e:
             logger.error(f"Lỗi truy vấn Qdrant: {e}")
-            return "Đã xảy ra lỗi khi thực hiện truy vấn."
+            return AgentResponse(content=ERROR_MESSAGE, status="error", execution_time=time.time() - start_time)
+        finally:
+            pipeline.log_waterfall()
+
+    async def stream_query(
+        self,
+        user_query: str,
+        chat_id: int,
+        raw_message: Optional[str] = None,
+        outcome: Optional[Dict[str, str]] = None,
+        message_id: Optional[int] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Như process_query nhưng trả về từng đoạn câu trả lời ngay khi LLM sinh ra.
+        Trạng thái (success/no_result/error) được ghi vào outcome["status"] nếu truyền vào.
+        """
+        outcome = {} if outcome is None else outcome
+        pipeline = self._build_pipeline(user_query, chat_id, raw_message, message_id)
+        try:
+            results = await pipeline.run("hydrate", "history")
+            outcome["status"] = "success" if results["hydrate"] else "no_result"
+            async with pipeline.timed("explanation"):
+                async for chunk in self._stream_explanation(results["hydrate"], user_query, results["history"]):
+                    yield chunk
+        except Exception as e:
+            logger.error(f"Lỗi truy vấn Qdrant: {e}")
+            outcome["status"] = "error"
+            yield ERROR_MESSAGE
+        finally:
+            pipeline.log_waterfall()
+
+
+registry.register("product", QdrantAgent)
 
 @router.post("/chatbot", response_model=AgentResponse)
 async def chatbot_endpoint(request: ChatbotRequest):
@@ -197,8 +366,10 @@ async def chatbot_endpoint(request: ChatbotRequest):
         # message_repository.create(message_payload)
         # Tạo câu hỏi cho agent
         question = f"Người dùng hỏi: {message}"
-        agent = QdrantAgent()
-        response = await agent.process_query(user_query=question, chat_id=request.chat_id)
+        agent = registry.get("product")
+        response = await agent.process_query(
+            user_query=question, chat_id=request.chat_id, raw_message=message, message_id=request.message_id
+        )
         # Lưu phản hồi vào cơ sở dữ liệu
         # response_payload = CreateMessagePayload(
         #     chat_id=request.chat_id,
@@ -209,4 +380,48 @@ async def chatbot_endpoint(request: ChatbotRequest):
         return response
     except Exception as e:
         logger.error(f"Lỗi trong chatbot_endpoint: {e}")
-        return "Đã xảy ra lỗi khi xử lý yêu cầu."
+        return AgentResponse(content="Đã xảy ra lỗi khi xử lý yêu cầu.", status="error")
+
+
+@router.post("/chatbot/stream")
+async def chatbot_stream_endpoint(request: ChatbotRequest):
+    """
+    Phiên bản streaming (SSE) của /chatbot: gửi từng đoạn câu trả lời khi LLM sinh ra.
+    """
+    start_time = time.perf_counter()
+    user_message = await MessageRepository.acreate(CreateMessagePayload(
+        chat_id=request.chat_id,
+        role="user",
+        content=request.message
+    ))
+
+    async def event_stream():
+        agent = registry.get("product")
+        chunks = agent.stream_query(
+            user_query=f"Người dùng hỏi: {request.message}",
+            chat_id=request.chat_id,
+            raw_message=request.message,
+            message_id=user_message.id
+        )
+        stream = TimedStream(chunks, start_time)
+        async for chunk in stream:
+            yield sse_event({"type": "token", "content": chunk})
+
+        # Lưu câu trả lời đầy đủ sau khi stream xong
+        response_message = await MessageRepository.acreate(CreateMessagePayload(
+            chat_id=request.chat_id,
+            role="assistant",
+            content=stream.text,
+            agent="ProductAgent"
+        ))
+        ChatContextService.schedule_summary_update(request.chat_id)
+        stream_metrics.record("chatbot", stream.ttft_ms, stream.elapsed_ms)
+        yield sse_event({
+            "type": "done",
+            "message_id": user_message.id,
+            "response_id": response_message.id,
+            "ttft_ms": stream.ttft_ms,
+            "total_ms": stream.elapsed_ms,
+        })
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
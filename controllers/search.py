@@ -1,18 +1,94 @@
-from fastapi import APIRouter, HTTPException
-from models.products import Product, ProductModel, ProductCreate
-from embedding.generate_embeddings import query_embedding   
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query
+from models.products import Product, ProductModel, ProductCreate, ProductSummary
+from models.search_filters import ProductSearchFilter
+from embedding.generate_embeddings import query_embedding, embedding_pool, embedding_cache, query_cache
 from agent.parsing_agent import ParsingAgent
+from embedding.qdrant_config import SEARCH_MODES
 from services.search import SearchServices
 from services.products import ProductServices
 
 router = APIRouter(prefix="/search", tags=["search"])
 @router.get("/")
-def search(query: str, collection_name: str = "product_name_embeddings", limit: int = 5):
+def search(query: str, collection_name: str = "product_name_embeddings", limit: int = 5, mode: Optional[str] = None):
     # schema = ParsingAgent.initiate_parsing(query)
     # Schema = str(schema)
     # print("❤️❤️❤️❤️❤️Schema:", Schema)
-    results = SearchServices.search(query, collection_name=collection_name, limit=limit)
+    if mode is not None and mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {SEARCH_MODES}")
+    results = SearchServices.search(query, collection_name=collection_name, limit=limit, mode=mode)
 
 
     return results
 
+
+@router.get("/products", response_model=list[ProductSummary])
+def search_products(
+    query: str,
+    limit: int = 5,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    brand_id: List[int] = Query(default=[]),
+    category_id: List[str] = Query(default=[]),
+    min_rating: Optional[float] = None,
+    availability: Optional[int] = None,
+):
+    """
+    Tìm kiếm sản phẩm và trả về thông tin sản phẩm theo thứ hạng, có thể lọc theo
+    giá, thương hiệu, danh mục, đánh giá và tình trạng hàng.
+    """
+    filters = ProductSearchFilter(
+        min_price=min_price,
+        max_price=max_price,
+        brand_ids=brand_id,
+        category_ids=category_id,
+        min_rating=min_rating,
+        availability=availability,
+    )
+    return SearchServices.search_products(query, limit=limit, filters=filters)
+
+
+@router.get("/page")
+def search_page(
+    query: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 5,
+    collection_name: str = "product_name_embeddings",
+    mode: Optional[str] = None,
+):
+    """
+    Tìm kiếm có phân trang: gọi lần đầu với query, các trang sau chỉ cần next_cursor.
+    """
+    if cursor is None and not query:
+        raise HTTPException(status_code=400, detail="query or cursor is required")
+    if mode is not None and mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {SEARCH_MODES}")
+    try:
+        page = SearchServices.search_page(query, limit=limit, cursor=cursor, collection_name=collection_name, mode=mode)
+    except ValueError as e:
+        raise HTTPException(status_code=410, detail=str(e))
+    return {"products": ProductServices.get_summaries(page["ids"]), "next_cursor": page["next_cursor"]}
+
+
+@router.get("/embedding/stats")
+def embedding_stats():
+    """
+    Thống kê theo từng API key Gemini: thành công, lỗi, bị giới hạn, độ trễ.
+    """
+    return embedding_pool.stats()
+
+
+@router.get("/embedding/cache/stats")
+def embedding_cache_stats():
+    """
+    Thống kê cache embedding trên đĩa: số entry, dung lượng, tỉ lệ hit.
+    """
+    return embedding_cache.stats()
+
+
+@router.get("/embedding/query-cache/stats")
+def query_cache_stats():
+    """
+    Thống kê cache embedding câu truy vấn: tỉ lệ hit và thời gian tiết kiệm được.
+    """
+    return query_cache.stats()
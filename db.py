@@ -1,4 +1,5 @@
 from sqlalchemy import engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
 from app_environment import AppEnvironment
 from env import env
@@ -12,6 +13,14 @@ db = engine.create_engine(
     pool_recycle=1800,
 )
 
+# Engine async cho các đường xử lý chạy trên event loop (chatbot)
+async_db = create_async_engine(
+    f"postgresql+asyncpg://{env.DB_USER}:{env.DB_PASSWORD}@{env.DB_HOST}:{env.DB_PORT}/{env.DB_NAME}",
+    pool_pre_ping=True,
+    pool_recycle=1800,
+)
+
 vectordb_conn_str = f"postgresql+psycopg://{env.DB_USER}:{env.DB_PASSWORD}@{env.DB_HOST}:{env.DB_PORT}/{env.DB_NAME}"
 
-Session = sessionmaker(db)
\ No newline at end of file
+Session = sessionmaker(db)
+AsyncSession = async_sessionmaker(async_db, expire_on_commit=False)
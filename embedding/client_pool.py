@@ -0,0 +1,204 @@
+import asyncio
+import threading
+import time
+from typing import Callable, List, Optional
+
+from google import genai
+
+EMBEDDING_MODEL = "gemini-embedding-exp-03-07"
+
+# Thời gian nghỉ của key sau khi bị 429: BASE * 2^(số lần liên tiếp), tối đa MAX
+THROTTLE_COOLDOWN_BASE = 5.0
+THROTTLE_COOLDOWN_MAX = 120.0
+# Nghỉ ngắn sau lỗi khác (mạng, 5xx) để thử key khác trước
+ERROR_COOLDOWN = 1.0
+# Thời gian chờ tối đa khi tất cả key đều hết quota/đang nghỉ
+MAX_WAIT = 30.0
+# Số text tối đa trong một request batchEmbedContents của Gemini
+EMBED_BATCH_SIZE = 100
+
+
+def is_rate_limited(error: Exception) -> bool:
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    return code == 429 or "RESOURCE_EXHAUSTED" in str(error) or "429" in str(error)
+
+
+class KeyState:
+    def __init__(self, index: int, api_key: str, rpm: int):
+        self.index = index
+        self.client = genai.Client(api_key=api_key)
+        self.capacity = float(rpm)
+        self.tokens = float(rpm)
+        self.refill_rate = rpm / 60.0
+        self.updated_at = time.monotonic()
+        self.cooldown_until = 0.0
+        self.consecutive_throttles = 0
+        self.in_flight = 0
+        self.success = 0
+        self.errors = 0
+        self.throttled = 0
+        self.total_latency = 0.0
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_rate)
+        self.updated_at = now
+
+    def wait_time(self, now: float) -> float:
+        if now < self.cooldown_until:
+            return self.cooldown_until - now
+        if self.tokens < 1:
+            return (1 - self.tokens) / self.refill_rate
+        return 0.0
+
+
+class GeminiClientPool:
+    """
+    Pool client Gemini, mỗi API key một client dùng lại cho mọi lời gọi.
+
+    Mỗi key có token bucket theo quota RPM và thời gian nghỉ tăng dần sau khi bị
+    429. Mỗi lời gọi chọn key khỏe đang ít tải nhất.
+    """
+
+    def __init__(self, api_keys: List[str], rpm_per_key: int = 60):
+        self._keys = [KeyState(i, key, rpm_per_key) for i, key in enumerate(api_keys) if key]
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        """
+        Trả về (key, 0) nếu có key dùng được, ngược lại (None, thời gian cần chờ).
+        """
+        now = time.monotonic()
+        with self._lock:
+            for key in self._keys:
+                key.refill(now)
+            ready = [key for key in self._keys if key.wait_time(now) == 0]
+            if not ready:
+                return None, min((key.wait_time(now) for key in self._keys), default=MAX_WAIT)
+            key = min(ready, key=lambda k: (k.in_flight, -k.tokens))
+            key.tokens -= 1
+            key.in_flight += 1
+            return key, 0.0
+
+    def _release(self, key: KeyState, latency: float, error: Optional[Exception] = None):
+        now = time.monotonic()
+        with self._lock:
+            key.in_flight -= 1
+            key.total_latency += latency
+            if error is None:
+                key.success += 1
+                key.consecutive_throttles = 0
+            elif is_rate_limited(error):
+                key.throttled += 1
+                key.consecutive_throttles += 1
+                cooldown = min(THROTTLE_COOLDOWN_MAX, THROTTLE_COOLDOWN_BASE * 2 ** (key.consecutive_throttles - 1))
+                key.cooldown_until = now + cooldown
+            else:
+                key.errors += 1
+                key.cooldown_until = now + ERROR_COOLDOWN
+
+    def _attempts(self, retry_limit: int):
+        """
+        Sinh (key, 0) cho mỗi lần thử, hoặc (None, thời gian cần chờ) khi mọi key đang
+        nghỉ; bên gọi tự ngủ (sync/async). Dừng sau retry_limit lượt mỗi key hoặc khi
+        đã chờ tổng cộng MAX_WAIT.
+        """
+        attempts, waited = 0, 0.0
+        while self._keys and attempts < retry_limit * len(self._keys):
+            key, wait = self._acquire()
+            if key is None:
+                if waited >= MAX_WAIT:
+                    return
+                wait = min(wait, MAX_WAIT - waited)
+                waited += wait
+                yield None, wait
+                continue
+            attempts += 1
+            yield key, 0.0
+
+    def _failed(self, key: KeyState, start_time: float, error: Exception):
+        self._release(key, time.perf_counter() - start_time, error)
+        print(f"❌ Error with API key {key.index + 1}: {error}")
+
+    def _call(self, request: Callable, retry_limit: int):
+        """
+        Gọi request(client) với key khỏe nhất, lỗi thì xoay sang key khác. None nếu thất bại.
+        """
+        for key, wait in self._attempts(retry_limit):
+            if key is None:
+                time.sleep(wait)
+                continue
+            start_time = time.perf_counter()
+            try:
+                result = request(key.client)
+            except Exception as e:
+                self._failed(key, start_time, e)
+                continue
+            self._release(key, time.perf_counter() - start_time)
+            return result
+        return None
+
+    async def _acall(self, request: Callable, retry_limit: int):
+        for key, wait in self._attempts(retry_limit):
+            if key is None:
+                await asyncio.sleep(wait)
+                continue
+            start_time = time.perf_counter()
+            try:
+                result = await request(key.client)
+            except Exception as e:
+                self._failed(key, start_time, e)
+                continue
+            self._release(key, time.perf_counter() - start_time)
+            return result
+        return None
+
+    @staticmethod
+    def _values(result):
+        if result and result.embeddings:
+            return result.embeddings[0].values
+        return None
+
+    def embed(self, text: str, task_type: str, retry_limit: int = 3, model: str = EMBEDDING_MODEL):
+        result = self._call(
+            lambda client: client.models.embed_content(model=model, contents=text, config={"task_type": task_type}),
+            retry_limit,
+        )
+        return self._values(result)
+
+    async def aembed(self, text: str, task_type: str, retry_limit: int = 3, model: str = EMBEDDING_MODEL):
+        result = await self._acall(
+            lambda client: client.aio.models.embed_content(model=model, contents=text, config={"task_type": task_type}),
+            retry_limit,
+        )
+        return self._values(result)
+
+    def embed_batch(self, texts: List[str], task_type: str, retry_limit: int = 3, model: str = EMBEDDING_MODEL):
+        """
+        Embed nhiều đoạn text trong một request (tối đa EMBED_BATCH_SIZE).
+        Trả về danh sách vector theo thứ tự texts, hoặc None nếu thất bại.
+        """
+        result = self._call(
+            lambda client: client.models.embed_content(model=model, contents=texts, config={"task_type": task_type}),
+            retry_limit,
+        )
+        if result and result.embeddings and len(result.embeddings) == len(texts):
+            return [embedding.values for embedding in result.embeddings]
+        return None
+
+    def stats(self) -> list:
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "key": key.index + 1,
+                    "success": key.success,
+                    "errors": key.errors,
+                    "throttled": key.throttled,
+                    "in_flight": key.in_flight,
+                    "tokens": round(key.tokens, 2),
+                    "cooldown_remaining": round(max(0.0, key.cooldown_until - now), 2),
+                    "avg_latency_ms": round(key.total_latency / (key.success + key.errors + key.throttled) * 1000, 1)
+                    if key.success + key.errors + key.throttled else None,
+                }
+                for key in self._keys
+            ]
@@ -0,0 +1,265 @@
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import List, Optional
+
+import numpy as np
+
+# Số lần hit được gom lại trước khi ghi last_used xuống đĩa trong một transaction
+TOUCH_FLUSH_SIZE = 256
+# File cache dùng chung giữa các worker của app và script: đếm lại COUNT(*) định kỳ
+# để giới hạn max_entries không lệch theo số đếm riêng của từng process
+COUNT_RESYNC_INTERVAL = 60.0
+# Số tham số tối đa mỗi câu IN (...) của SQLite
+SQL_CHUNK_SIZE = 500
+
+
+def normalize_text(text: str) -> str:
+    """
+    Chuẩn hóa Unicode (NFC) và khoảng trắng; giữ nguyên dấu và chữ hoa/thường.
+    """
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text or "")).strip()
+
+
+def cache_key(model: str, task_type: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\x00{task_type}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Cache embedding trên đĩa (SQLite), khóa theo hash(model, task_type, text đã chuẩn hóa).
+
+    Vector lưu dạng float32. Khi vượt max_entries thì xóa các entry lâu không dùng nhất (LRU).
+    last_used của các lần hit được gom trong RAM và ghi theo lô (cùng lần ghi kế tiếp hoặc
+    khi đủ TOUCH_FLUSH_SIZE), nên đọc cache không phải là một lần ghi đĩa.
+    """
+
+    def __init__(self, path: str, max_entries: int = 200_000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                task_type TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_last_used ON embeddings (last_used)")
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        self._counted_at = time.monotonic()
+        # key -> thời điểm hit gần nhất, chưa ghi xuống đĩa
+        self._touched = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, model: str, task_type: str, text: str) -> Optional[list]:
+        key = cache_key(model, task_type, text)
+        with self._lock:
+            row = self._conn.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touch([key])
+        return np.frombuffer(row[0], dtype=np.float32).tolist()
+
+    def get_many(self, model: str, task_type: str, texts: List[str]) -> List[Optional[list]]:
+        """
+        Bản hàng loạt của get cho các script index: một truy vấn cho mỗi SQL_CHUNK_SIZE text.
+        Trả về danh sách cùng thứ tự texts, None với text chưa có trong cache.
+        """
+        keys = [cache_key(model, task_type, text) for text in texts]
+        unique = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock:
+            for start in range(0, len(unique), SQL_CHUNK_SIZE):
+                chunk = unique[start:start + SQL_CHUNK_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                found.update(self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall())
+            hits = sum(1 for key in keys if key in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+            self._touch(list(found))
+        return [np.frombuffer(found[key], dtype=np.float32).tolist() if key in found else None for key in keys]
+
+    def _touch(self, keys: list):
+        now = time.time()
+        for key in keys:
+            self._touched[key] = now
+        if len(self._touched) >= TOUCH_FLUSH_SIZE:
+            self._flush_touched()
+            self._conn.commit()
+
+    def _flush_touched(self):
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def flush(self):
+        """
+        Ghi ngay last_used đang gom trong RAM (vd: trước khi script kết thúc).
+        """
+        with self._lock:
+            self._flush_touched()
+            self._conn.commit()
+
+    def put(self, model: str, task_type: str, text: str, vector):
+        values = np.asarray(vector, dtype=np.float32)
+        if not values.size or not values.any():
+            # Không cache vector rỗng (lỗi API)
+            return
+        key = cache_key(model, task_type, text)
+        now = time.time()
+        with self._lock:
+            # Đếm tăng dần thay vì COUNT(*) (quét cả bảng) sau mỗi lần ghi
+            exists = self._conn.execute("SELECT 1 FROM embeddings WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embeddings (key, model, task_type, dim, vector, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, model, task_type, int(values.size), values.tobytes(), now, now),
+            )
+            if exists is None:
+                self._count += 1
+            self._evict()
+            self._conn.commit()
+
+    def put_many(self, model: str, task_type: str, items):
+        """
+        Ghi nhiều (text, vector) trong một transaction; dùng cho các script index.
+        """
+        now = time.time()
+        rows = {}
+        for text, vector in items:
+            values = np.asarray(vector, dtype=np.float32) if vector is not None else None
+            if values is None or not values.size or not values.any():
+                continue
+            key = cache_key(model, task_type, text)
+            rows[key] = (key, model, task_type, int(values.size), values.tobytes(), now, now)
+        if not rows:
+            return
+        with self._lock:
+            existing = self._count_existing(list(rows))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, task_type, dim, vector, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                list(rows.values()),
+            )
+            self._count += len(rows) - existing
+            self._evict()
+            self._conn.commit()
+
+    def _count_existing(self, keys: list, chunk_size: int = SQL_CHUNK_SIZE) -> int:
+        # Số key đã có trong bảng (theo lô để không vượt giới hạn tham số của SQLite)
+        existing = 0
+        for start in range(0, len(keys), chunk_size):
+            chunk = keys[start:start + chunk_size]
+            placeholders = ",".join("?" * len(chunk))
+            existing += self._conn.execute(
+                f"SELECT COUNT(*) FROM embeddings WHERE key IN ({placeholders})", chunk
+            ).fetchone()[0]
+        return existing
+
+    def _evict(self):
+        # Ghi last_used đang gom trước để thứ tự LRU đúng khi xóa
+        self._flush_touched()
+        if time.monotonic() - self._counted_at >= COUNT_RESYNC_INTERVAL:
+            self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            self._counted_at = time.monotonic()
+        excess = self._count - self.max_entries
+        if excess <= 0:
+            return
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+            (excess,),
+        )
+        self._count -= excess
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "path": self.path,
+                "entries": self._count,
+                "max_entries": self.max_entries,
+                "size_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+    def export_to(self, path: str):
+        """
+        Sao chép toàn bộ cache sang một file SQLite khác.
+        """
+        with self._lock:
+            self._flush_touched()
+            self._conn.commit()
+            target = sqlite3.connect(path)
+            try:
+                self._conn.backup(target)
+            finally:
+                target.close()
+
+    def import_from(self, path: str) -> int:
+        """
+        Gộp các entry từ một file cache khác; entry đã có thì giữ nguyên.
+        """
+        with self._lock:
+            before = self._count
+            self._conn.execute("ATTACH DATABASE ? AS other", (path,))
+            try:
+                cursor = self._conn.execute("INSERT OR IGNORE INTO embeddings SELECT * FROM other.embeddings")
+                self._conn.commit()
+            finally:
+                self._conn.execute("DETACH DATABASE other")
+            self._count += max(cursor.rowcount, 0)
+            self._evict()
+            self._conn.commit()
+            return self._count - before
+
+
+def main():
+    from embedding.generate_embeddings import embedding_cache
+
+    parser = argparse.ArgumentParser(description="Quản lý cache embedding")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("stats")
+    export_parser = subparsers.add_parser("export")
+    export_parser.add_argument("path")
+    import_parser = subparsers.add_parser("import")
+    import_parser.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        print(embedding_cache.stats())
+    elif args.command == "export":
+        embedding_cache.export_to(args.path)
+        print(f"✅ Đã xuất cache ra {args.path}")
+    elif args.command == "import":
+        added = embedding_cache.import_from(args.path)
+        print(f"✅ Đã nhập {added} embedding từ {args.path}")
+
+
+if __name__ == "__main__":
+    main()
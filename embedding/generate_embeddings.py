@@ -1,8 +1,13 @@
 import numpy as np
 from env import env
 import os
-from google.genai import types
-from google import genai
+from concurrent.futures import ThreadPoolExecutor
+from embedding.client_pool import EMBED_BATCH_SIZE, EMBEDDING_MODEL, GeminiClientPool
+from embedding.embedding_cache import EmbeddingCache
+from embedding.query_cache import QueryEmbeddingCache
+from cache import make_shared_backend
+from executor import run_blocking
+import time
 
 # List of API keys
 API_KEYS = [
@@ -13,73 +18,121 @@ API_KEYS = [
     env.GEMINI_API_KEY_5
 ]
 
+# Một client cho mỗi key, dùng chung cho app và các script embedding
+embedding_pool = GeminiClientPool(API_KEYS, rpm_per_key=env.EMBEDDING_RPM_PER_KEY)
+
+# Cache embedding trên đĩa, dùng chung giữa các lần chạy script và app
+EMBEDDING_CACHE_PATH = env.EMBEDDING_CACHE_PATH or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".embedding_cache.sqlite3"
+)
+embedding_cache = EmbeddingCache(EMBEDDING_CACHE_PATH, max_entries=env.EMBEDDING_CACHE_MAX_ENTRIES)
+
+# Cache nóng cho embedding câu truy vấn (trong RAM, có thể dùng chung qua Redis)
+query_cache = QueryEmbeddingCache(
+    EMBEDDING_MODEL,
+    max_size=env.QUERY_EMBEDDING_CACHE_SIZE,
+    ttl=env.QUERY_EMBEDDING_CACHE_TTL,
+    shared=make_shared_backend(env.QUERY_EMBEDDING_CACHE_URL),
+)
+
+
 def generate_embedding(text: str, retry_limit=3):
     if not text.strip():
         return np.zeros(3072).tolist()  # Return empty vector if text is empty
-    
-    retry_count = 0
-    while retry_count < retry_limit:
-        for api_index in range(len(API_KEYS)):
-            try:
-                # Initialize the API client
-                client = genai.Client(api_key=API_KEYS[api_index])
-                
-                # Call the API to generate embeddings
-                result = client.models.embed_content(
-                    model="gemini-embedding-exp-03-07",
-                    contents=text,
-                    config={"task_type": "RETRIEVAL_DOCUMENT"}
-                )
-                
-                # Check if embeddings are returned and return the first result
-                if result and result.embeddings:
-                    return result.embeddings[0].values
-                else:
-                    print(f"❌ No embeddings returned for API key {api_index + 1}")
-                    return np.zeros(3072).tolist()  # Return empty vector if no embeddings
-                
-            except Exception as e:
-                # Log the error and move to the next API key
-                print(f"❌  Error with API key {api_index + 1}: {e}")
+
+    cached = embedding_cache.get(EMBEDDING_MODEL, "RETRIEVAL_DOCUMENT", text)
+    if cached is not None:
+        return cached
+    values = embedding_pool.embed(text, "RETRIEVAL_DOCUMENT", retry_limit=retry_limit)
+    if values is None:
+        print("❌ All retry attempts failed.")
+        return np.zeros(3072).tolist()
+    embedding_cache.put(EMBEDDING_MODEL, "RETRIEVAL_DOCUMENT", text, values)
+    return values
+
+
+def generate_embeddings(texts: list, retry_limit=3, batch_size=EMBED_BATCH_SIZE, max_workers=None):
+    """
+    Bản hàng loạt của generate_embedding cho các script index.
+
+    Text đã có trong cache không gọi API; phần còn lại được chia thành các batch
+    gửi song song trên các key. Trả về danh sách cùng thứ tự texts, phần tử là
+    None nếu batch của nó thất bại (để script có thể thử lại sau).
+    """
+    results = [None] * len(texts)
+    candidates = []
+    for i, text in enumerate(texts):
+        if not (text or "").strip():
+            results[i] = np.zeros(3072).tolist()
+        else:
+            candidates.append(i)
+    pending = []
+    cached = embedding_cache.get_many(EMBEDDING_MODEL, "RETRIEVAL_DOCUMENT", [texts[i] for i in candidates])
+    for i, vector in zip(candidates, cached):
+        if vector is not None:
+            results[i] = vector
+        else:
+            pending.append(i)
+
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+    if not batches:
+        return results
+
+    def embed(batch):
+        return batch, embedding_pool.embed_batch([texts[i] for i in batch], "RETRIEVAL_DOCUMENT", retry_limit=retry_limit)
+
+    with ThreadPoolExecutor(max_workers=max_workers or max(1, len([k for k in API_KEYS if k]))) as executor:
+        for batch, values in executor.map(embed, batches):
+            if values is None:
+                print(f"❌ Batch of {len(batch)} texts failed.")
                 continue
-        
-        retry_count += 1
-        print(f"⚠️ Retrying... Attempt {retry_count}/{retry_limit}")
-    
-    # Return an empty vector if all retries fail
-    print("❌ All retry attempts failed.")
-    return np.zeros(3072).tolist()
+            for i, vector in zip(batch, values):
+                results[i] = vector
+            embedding_cache.put_many(EMBEDDING_MODEL, "RETRIEVAL_DOCUMENT", [(texts[i], v) for i, v in zip(batch, values)])
+    return results
 
 
 def query_embedding(text: str, retry_limit = 3):
     if not text.strip():
         return np.zeros(3072).tolist()  # Return empty vector if text is empty
-    
-    retry_count = 0
-    while retry_count < retry_limit:
-        for api_index in range(len(API_KEYS)):
-            try:
-                # Initialize the API client
-                client = genai.Client(api_key=API_KEYS[api_index])
-                
-                # Call the API to generate embeddings
-                result = client.models.embed_content(
-                    model="gemini-embedding-exp-03-07",
-                    contents=text,
-                    config={"task_type": "RETRIEVAL_QUERY"}
-                )
-                
-                # Check if embeddings are returned and return the first result
-                if result and result.embeddings:
-                    return result.embeddings[0].values
-                else:
-                    print(f"❌ No embeddings returned for API key {api_index + 1}")
-                    return np.zeros(3072).tolist()  # Return empty vector if no embeddings
-                
-            except Exception as e:
-                # Log the error and move to the next API key
-                print(f"❌ Error with API key {api_index + 1}: {e}")
-                continue
-        
-        retry_count += 1
-        print(f"⚠️ Retrying... Attempt {retry_count}/{retry_limit}")
\ No newline at end of file
+
+    cached = query_cache.get("RETRIEVAL_QUERY", text)
+    if cached is not None:
+        return cached
+    start_time = time.perf_counter()
+    cached = embedding_cache.get(EMBEDDING_MODEL, "RETRIEVAL_QUERY", text)
+    if cached is not None:
+        query_cache.put("RETRIEVAL_QUERY", text, cached)
+        return cached
+    values = embedding_pool.embed(text, "RETRIEVAL_QUERY", retry_limit=retry_limit)
+    if values is None:
+        print("❌ All retry attempts failed.")
+        return np.zeros(3072).tolist()
+    embedding_cache.put(EMBEDDING_MODEL, "RETRIEVAL_QUERY", text, values)
+    query_cache.put("RETRIEVAL_QUERY", text, values, miss_latency_ms=(time.perf_counter() - start_time) * 1000)
+    return values
+
+
+async def aquery_embedding(text: str, retry_limit = 3):
+    """
+    Bản async của query_embedding, dùng client.aio để không chặn event loop.
+    """
+    if not text.strip():
+        return np.zeros(3072).tolist()  # Return empty vector if text is empty
+
+    cached = await query_cache.aget("RETRIEVAL_QUERY", text)
+    if cached is not None:
+        return cached
+    start_time = time.perf_counter()
+    # Cache SQLite là I/O đĩa đồng bộ (có lock + commit) -> chạy trong thread pool
+    cached = await run_blocking(embedding_cache.get, EMBEDDING_MODEL, "RETRIEVAL_QUERY", text)
+    if cached is not None:
+        await query_cache.aput("RETRIEVAL_QUERY", text, cached)
+        return cached
+    values = await embedding_pool.aembed(text, "RETRIEVAL_QUERY", retry_limit=retry_limit)
+    if values is None:
+        print("❌ All retry attempts failed.")
+        return np.zeros(3072).tolist()
+    await run_blocking(embedding_cache.put, EMBEDDING_MODEL, "RETRIEVAL_QUERY", text, values)
+    await query_cache.aput("RETRIEVAL_QUERY", text, values, miss_latency_ms=(time.perf_counter() - start_time) * 1000)
+    return values
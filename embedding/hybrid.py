@@ -0,0 +1,104 @@
+import re
+import unicodedata
+import zlib
+from collections import Counter
+from typing import Hashable, Iterable, List, Optional, Sequence
+
+from qdrant_client.models import SparseVector
+from unidecode import unidecode
+
+SPARSE_VECTOR = "bm25"
+# Tham số BM25 cho phía tài liệu; IDF do Qdrant tính (Modifier.IDF)
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Độ dài trung bình (số token sau khi nhân đôi có dấu/không dấu) của text sản phẩm
+BM25_AVG_DOC_LEN = 40.0
+# Hằng số k của RRF: càng lớn thì thứ hạng đầu càng ít áp đảo
+RRF_K = 60
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+_ALNUM_PARTS = re.compile(r"\d+|[^\W\d_]+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Tách từ tiếng Việt cho tìm kiếm từ khóa: chữ thường, mỗi từ có dấu sinh thêm
+    bản không dấu (unidecode) để "điện thoại" khớp cả truy vấn gõ "dien thoai".
+    Từ lẫn chữ và số (vd: "256gb") sinh thêm từng phần ("256", "gb").
+    """
+    tokens = []
+    for word in _WORD.findall(unicodedata.normalize("NFC", (text or "").lower())):
+        variants = [word]
+        plain = unidecode(word)
+        if plain != word:
+            variants.append(plain)
+        parts = _ALNUM_PARTS.findall(plain)
+        if len(parts) > 1:
+            variants.extend(parts)
+        tokens.extend(variants)
+    return tokens
+
+
+def _token_index(token: str) -> int:
+    return zlib.crc32(token.encode("utf-8"))
+
+
+def document_sparse_vector(text: str) -> SparseVector:
+    """
+    Vector thưa của tài liệu: trọng số TF bão hòa theo BM25 (k1, b) theo từng token.
+    """
+    counts = Counter(tokenize(text))
+    length_norm = 1 - BM25_B + BM25_B * sum(counts.values()) / BM25_AVG_DOC_LEN
+    weights = {}
+    for token, tf in counts.items():
+        index = _token_index(token)
+        weights[index] = weights.get(index, 0.0) + tf * (BM25_K1 + 1) / (tf + BM25_K1 * length_norm)
+    return SparseVector(indices=list(weights), values=list(weights.values()))
+
+
+def query_sparse_vector(text: str) -> SparseVector:
+    indices = list(dict.fromkeys(_token_index(token) for token in tokenize(text)))
+    return SparseVector(indices=indices, values=[1.0] * len(indices))
+
+
+def product_lexical_text(product_info: dict) -> str:
+    """
+    Các trường cần khớp chính xác: tên, SKU, mô tả ngắn, thương hiệu.
+    """
+    product = product_info["product"]
+    brand = product_info.get("brand") or []
+    parts = [product.name, product.sku, product.short_description, brand[0].brand_name if brand else None]
+    return " ".join(part for part in parts if part)
+
+
+def reciprocal_rank_fusion(
+    ranked_lists: Sequence[Iterable[Hashable]],
+    k: int = RRF_K,
+    weights: Optional[Sequence[float]] = None,
+    limit: Optional[int] = None,
+    with_scores: bool = False,
+) -> list:
+    """
+    Gộp nhiều danh sách đã xếp hạng: score(d) = sum(w_i / (k + rank_i(d))), rank từ 1.
+    Phần tử trùng trong cùng một danh sách chỉ tính ở vị trí đầu tiên; điểm bằng nhau
+    giữ thứ tự xuất hiện đầu tiên. with_scores=True trả về [(item, score)].
+    """
+    weights = list(weights) if weights is not None else [1.0] * len(ranked_lists)
+    if len(weights) != len(ranked_lists):
+        raise ValueError("weights must have one entry per ranked list")
+
+    scores = {}
+    for ranked, weight in zip(ranked_lists, weights):
+        seen = set()
+        rank = 0
+        for item in ranked:
+            if item in seen:
+                continue
+            seen.add(item)
+            rank += 1
+            scores[item] = scores.get(item, 0.0) + weight / (k + rank)
+
+    fused = sorted(scores, key=scores.get, reverse=True)
+    if limit is not None:
+        fused = fused[:limit]
+    return [(item, scores[item]) for item in fused] if with_scores else fused
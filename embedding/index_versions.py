@@ -0,0 +1,71 @@
+import json
+import os
+import time
+from datetime import datetime
+
+# File đánh dấu phiên bản index của từng collection Qdrant.
+# Các script embedding cập nhật file này sau mỗi lần index lại để các process
+# của app biết dữ liệu đã thay đổi (vd: làm mất hiệu lực semantic cache).
+INDEX_VERSIONS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".index_versions.json")
+
+_cache = {"mtime": None, "versions": {}}
+
+
+def get_index_versions() -> dict:
+    try:
+        mtime = os.stat(INDEX_VERSIONS_FILE).st_mtime
+    except FileNotFoundError:
+        return {}
+    if mtime != _cache["mtime"]:
+        try:
+            with open(INDEX_VERSIONS_FILE, "r", encoding="utf-8") as f:
+                _cache["versions"] = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return _cache["versions"]
+        _cache["mtime"] = mtime
+    return _cache["versions"]
+
+
+def bump_index_version(collection_name: str):
+    versions = dict(get_index_versions())
+    versions[collection_name] = time.time()
+    tmp_path = f"{INDEX_VERSIONS_FILE}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(versions, f)
+    os.replace(tmp_path, INDEX_VERSIONS_FILE)
+
+
+# High-water mark updated_at của lần đồng bộ tăng dần gần nhất, theo collection
+INDEX_SYNC_FILE = os.path.join(os.path.dirname(INDEX_VERSIONS_FILE), ".index_sync_marks.json")
+
+
+def _load_sync_marks() -> dict:
+    try:
+        with open(INDEX_SYNC_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def get_sync_mark(collection_name: str):
+    mark = _load_sync_marks().get(collection_name)
+    return datetime.fromisoformat(mark) if mark else None
+
+
+def get_synced_recent(collection_name: str) -> dict:
+    """
+    {product_id (str): updated_at (iso)} đã đồng bộ trong khoảng overlap quanh mốc, để
+    lần quét lại khoảng overlap bỏ qua những dòng đã index.
+    """
+    return _load_sync_marks().get("_recent", {}).get(collection_name, {})
+
+
+def set_sync_mark(collection_name: str, mark: datetime, recent: dict = None):
+    marks = _load_sync_marks()
+    marks[collection_name] = mark.isoformat()
+    if recent is not None:
+        marks.setdefault("_recent", {})[collection_name] = recent
+    tmp_path = f"{INDEX_SYNC_FILE}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(marks, f)
+    os.replace(tmp_path, INDEX_SYNC_FILE)
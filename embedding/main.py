@@ -1,34 +1,67 @@
+import argparse
+import itertools
+import json
+import os
+import re
 import sys
+import time
 import uuid
+from datetime import datetime, timedelta
 from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import func, tuple_
 from qdrant_client import QdrantClient
-from qdrant_client.models import PointStruct, VectorParams, Distance
+from qdrant_client.models import PointStruct
 from env import env
-from embedding.generate_embeddings import generate_embedding
+from embedding.qdrant_config import ensure_collection, ensure_payload_indexes, point_vectors
+from embedding.generate_embeddings import generate_embedding, generate_embeddings
+from embedding.index_versions import bump_index_version, get_sync_mark, get_synced_recent, set_sync_mark
+from embedding.hybrid import product_lexical_text
 from embedding.process import preprocess_product
 from db import Session
 from models.products import Product
 from repositories.products import ProductRepositories
 
 QD_COLLECTION = "product_name_embeddings"
+# Số sản phẩm đọc từ Postgres mỗi trang và số point mỗi request upsert
+PAGE_SIZE = 500
+UPSERT_BATCH_SIZE = 256
+# Quét lùi lại một khoảng so với mốc để không bỏ sót transaction commit muộn
+# (updated_at = now() là thời điểm bắt đầu transaction, không phải lúc commit)
+SYNC_OVERLAP = timedelta(seconds=60)
+SCROLL_BATCH_SIZE = 1000
+CHECKPOINT_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), f".index_checkpoint_{QD_COLLECTION}.json"
+)
 
 # Kết nối Qdrant
 qdrant = QdrantClient(f"http://localhost:{env.QD_PORT}")
 
 def ensure_collection_exists():
-    collections = qdrant.get_collections().collections
-    collection_names = [col.name for col in collections]
+    # Lượng tử hóa, vector trên đĩa và HNSW cấu hình qua env (QDRANT_*), xem embedding/qdrant_config.py
+    ensure_collection(qdrant, QD_COLLECTION)
+    ensure_payload_indexes(qdrant, QD_COLLECTION)
 
-    if QD_COLLECTION not in collection_names:
-        qdrant.create_collection(
-            collection_name=QD_COLLECTION,
-            vectors_config={"default": VectorParams(size=3072, distance=Distance.COSINE)},
-            on_disk_payload=False  # Ensure vectors are stored
-        )
 
-        print(f"✅ Đã tạo collection '{QD_COLLECTION}'.")
-    else:
-        print(f"ℹ️ Collection '{QD_COLLECTION}' đã tồn tại.")
+def product_payload(product_info: dict) -> dict:
+    """
+    Payload của point sản phẩm, gồm các trường lọc có payload index
+    (giá, thương hiệu, đường dẫn danh mục, điểm đánh giá, tình trạng hàng).
+    """
+    product = product_info["product"]
+    category_path = [product.category_id]
+    for category in product_info.get("category") or []:
+        # path dạng "1/8322/1815": mọi danh mục cha đều lọc trúng sản phẩm này
+        category_path.extend(part.strip() for part in re.split(r"[/>|,]", category.path or "") if part.strip())
+    return {
+        "product_id": product.product_id,
+        "name": product.name,
+        "description": product.description,
+        "price": float(product.price) if product.price is not None else None,
+        "brand_id": product.brand_id,
+        "category_path": list(dict.fromkeys(category_path)),
+        "rating_average": float(product.rating_average) if product.rating_average is not None else None,
+        "availability": product.availability,
+    }
 
 def add_product_to_qdrant(product_id: str):
     try:
@@ -39,12 +72,8 @@ def add_product_to_qdrant(product_id: str):
         if embedding:
             point = PointStruct(
                 id=product_id,
-                vector={"default": embedding},
-                payload={
-                    "product_id": product_id,
-                    "name": product.name,
-                    "description": product.description,
-                }
+                vector=point_vectors(embedding, product_lexical_text(product_info)),
+                payload=product_payload(product_info),
             )
             qdrant.upsert(collection_name=QD_COLLECTION, points=[point])
             print(f"✅ Đã thêm embedding cho sản phẩm ID {product_id}.")
@@ -54,19 +83,265 @@ def add_product_to_qdrant(product_id: str):
     except Exception as e:
         print(f"⚠️ Lỗi khi xử lý sản phẩm ID {product_id}: {e}")
 
-def process_all_products():
+def load_checkpoint() -> dict:
+    try:
+        with open(CHECKPOINT_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {"last_product_id": None, "failed": [], "indexed": 0}
+
+
+def save_checkpoint(checkpoint: dict):
+    # Ghi file tạm rồi đổi tên để checkpoint không bị hỏng khi process bị kill giữa chừng
+    tmp_path = f"{CHECKPOINT_FILE}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, CHECKPOINT_FILE)
+
+
+def iter_product_pages(after_id=None, page_size: int = PAGE_SIZE):
+    """
+    Duyệt product_id theo keyset (product_id > after_id) thay vì load toàn bộ bảng.
+    """
+    while True:
+        with Session() as session:
+            query = session.query(Product.product_id).order_by(Product.product_id)
+            if after_id is not None:
+                query = query.filter(Product.product_id > after_id)
+            product_ids = [row[0] for row in query.limit(page_size).all()]
+        if not product_ids:
+            return
+        yield product_ids
+        after_id = product_ids[-1]
+
+
+def index_products(product_ids: list) -> list:
+    """
+    Lấy thông tin, embed và upsert một trang sản phẩm. Trả về các ID bị lỗi.
+    """
+    texts, infos, failed = [], [], []
+    for info in ProductRepositories.get_info_many(product_ids):
+        try:
+            texts.append(preprocess_product(info))
+            infos.append(info)
+        except Exception as e:
+            print(f"⚠️ Lỗi khi xử lý sản phẩm ID {info['product'].product_id}: {e}")
+            failed.append(info["product"].product_id)
+
+    points = []
+    for info, embedding in zip(infos, generate_embeddings(texts)):
+        product = info["product"]
+        if embedding is None:
+            failed.append(product.product_id)
+            continue
+        points.append(PointStruct(
+            id=product.product_id,
+            vector=point_vectors(embedding, product_lexical_text(info)),
+            payload=product_payload(info),
+        ))
+
+    for i in range(0, len(points), UPSERT_BATCH_SIZE):
+        # wait=False: Qdrant ghi vào WAL rồi trả về ngay, việc index chạy nền
+        qdrant.upsert(collection_name=QD_COLLECTION, points=points[i:i + UPSERT_BATCH_SIZE], wait=False)
+    return failed
+
+
+def process_all_products(page_size: int = PAGE_SIZE, restart: bool = False, limit: int = None):
+    """
+    Index toàn bộ sản phẩm theo trang, lưu checkpoint sau mỗi trang để chạy lại
+    thì tiếp tục từ chỗ dừng. Các ID lỗi được thử lại ở đầu lần chạy sau.
+    """
+    checkpoint = {"last_product_id": None, "failed": [], "indexed": 0} if restart else load_checkpoint()
+    if checkpoint["last_product_id"] is not None:
+        print(f"↪️ Tiếp tục từ product_id > {checkpoint['last_product_id']} ({checkpoint['indexed']} đã index).")
+
     with Session() as session:
-        products = session.query(Product).all()
+        # Mốc cho chế độ --sync: mọi thay đổi sau thời điểm này sẽ được đồng bộ tăng dần
+        sync_mark = session.query(func.max(Product.updated_at)).scalar()
+
+    start_time = time.perf_counter()
+    processed = 0
+
+    retry_ids, checkpoint["failed"] = checkpoint["failed"], []
+    pages = iter_product_pages(checkpoint["last_product_id"], page_size)
+    if retry_ids:
+        pages = itertools.chain([retry_ids[i:i + page_size] for i in range(0, len(retry_ids), page_size)], pages)
+
+    for product_ids in pages:
+        if limit is not None:
+            product_ids = product_ids[:limit - processed]
+            if not product_ids:
+                break
+        failed = index_products(product_ids)
+        processed += len(product_ids)
+        checkpoint["failed"].extend(failed)
+        checkpoint["indexed"] += len(product_ids) - len(failed)
+        if product_ids[-1] not in retry_ids:
+            checkpoint["last_product_id"] = max(product_ids[-1], checkpoint["last_product_id"] or product_ids[-1])
+        save_checkpoint(checkpoint)
 
-        # Use ThreadPoolExecutor for concurrent processing of products
-        with ThreadPoolExecutor(max_workers=4) as executor:
-            executor.map(lambda product: add_product_to_qdrant(product.product_id), products)
-    
+        elapsed = time.perf_counter() - start_time
+        print(f"✅ {processed} sản phẩm, {processed / elapsed:.1f} sản phẩm/giây, {len(checkpoint['failed'])} lỗi.")
+
+    elapsed = time.perf_counter() - start_time
+    report_throughput("batch", processed, elapsed)
+    if not checkpoint["failed"] and limit is None:
+        if os.path.exists(CHECKPOINT_FILE):
+            os.remove(CHECKPOINT_FILE)
+        if sync_mark is not None:
+            set_sync_mark(QD_COLLECTION, sync_mark)
+
+    # Báo cho app biết collection đã thay đổi (làm mất hiệu lực semantic cache)
+    bump_index_version(QD_COLLECTION)
     print("🎉 Đã hoàn tất việc thêm embeddings vào Qdrant.")
 
+
+def process_all_products_legacy(limit: int = None):
+    """
+    Cách index cũ (mỗi sản phẩm một lần embed và một lần upsert), giữ lại để so sánh throughput.
+    """
+    with Session() as session:
+        query = session.query(Product.product_id).order_by(Product.product_id)
+        if limit is not None:
+            query = query.limit(limit)
+        product_ids = [row[0] for row in query.all()]
+
+    start_time = time.perf_counter()
+    # Use ThreadPoolExecutor for concurrent processing of products
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(add_product_to_qdrant, product_ids))
+    report_throughput("legacy", len(product_ids), time.perf_counter() - start_time)
+
+    bump_index_version(QD_COLLECTION)
+
+
+def iter_changed_products(since=None, page_size: int = PAGE_SIZE):
+    """
+    Duyệt (product_id, updated_at) của các sản phẩm thay đổi sau since, theo keyset (updated_at, product_id).
+    """
+    last = None
+    while True:
+        with Session() as session:
+            query = session.query(Product.product_id, Product.updated_at).order_by(Product.updated_at, Product.product_id)
+            if last is not None:
+                # So sánh theo hàng để Postgres quét theo ix_products_updated_at_product_id
+                query = query.filter(tuple_(Product.updated_at, Product.product_id) > (last[1], last[0]))
+            elif since is not None:
+                query = query.filter(Product.updated_at > since)
+            rows = query.limit(page_size).all()
+        if not rows:
+            return
+        yield rows
+        last = tuple(rows[-1])
+
+
+def delete_removed_products() -> int:
+    """
+    Xóa các point trong Qdrant mà sản phẩm tương ứng không còn trong Postgres.
+    """
+    with Session() as session:
+        existing = {row[0] for row in session.query(Product.product_id).all()}
+
+    removed, offset = [], None
+    while True:
+        points, offset = qdrant.scroll(
+            collection_name=QD_COLLECTION,
+            limit=SCROLL_BATCH_SIZE,
+            offset=offset,
+            with_payload=False,
+            with_vectors=False,
+        )
+        removed.extend(point.id for point in points if point.id not in existing)
+        if offset is None:
+            break
+
+    for i in range(0, len(removed), UPSERT_BATCH_SIZE):
+        qdrant.delete(collection_name=QD_COLLECTION, points_selector=removed[i:i + UPSERT_BATCH_SIZE], wait=False)
+    return len(removed)
+
+
+def sync_products(page_size: int = PAGE_SIZE, delete_removed: bool = True) -> int:
+    """
+    Đồng bộ tăng dần: chỉ embed và upsert sản phẩm tạo mới/sửa sau high-water mark
+    của collection, rồi xóa point của sản phẩm đã bị xóa. Trả về số thay đổi.
+    """
+    mark = get_sync_mark(QD_COLLECTION)
+    since = mark - SYNC_OVERLAP if mark else None
+    # Khoảng overlap được quét lại mỗi lần (bắt transaction commit trễ); dòng nào đã
+    # index đúng phiên bản updated_at đó thì bỏ qua, không upsert và không tính là thay đổi
+    recent = get_synced_recent(QD_COLLECTION)
+    start_time = time.perf_counter()
+    changed = removed = 0
+
+    for rows in iter_changed_products(since, page_size):
+        new_rows = [row for row in rows if recent.get(str(row[0])) != row[1].isoformat()]
+        if new_rows:
+            product_ids = [row[0] for row in new_rows]
+            failed = index_products(product_ids)
+            changed += len(product_ids) - len(failed)
+            if failed:
+                # Không đẩy mốc qua trang có lỗi: lần sau làm lại cả trang (embedding đã có trong cache)
+                print(f"⚠️ {len(failed)} sản phẩm lỗi, dừng lần đồng bộ này.")
+                break
+            recent.update({str(pid): updated_at.isoformat() for pid, updated_at in new_rows})
+        mark = max(mark, rows[-1][1]) if mark else rows[-1][1]
+        cutoff = mark - SYNC_OVERLAP
+        recent = {pid: updated_at for pid, updated_at in recent.items() if datetime.fromisoformat(updated_at) > cutoff}
+        set_sync_mark(QD_COLLECTION, mark, recent)
+
+    if delete_removed:
+        removed = delete_removed_products()
+
+    if changed or removed:
+        bump_index_version(QD_COLLECTION)
+        elapsed = time.perf_counter() - start_time
+        print(f"🔄 Đồng bộ {changed} sản phẩm thay đổi, xóa {removed} point trong {elapsed:.1f}s.")
+    return changed + removed
+
+
+def watch_products(interval: float, reconcile_every: int = 10):
+    """
+    Chạy sync_products liên tục; việc đối chiếu sản phẩm bị xóa (quét toàn bộ ID)
+    chỉ chạy mỗi reconcile_every vòng.
+    """
+    print(f"👀 Theo dõi thay đổi sản phẩm mỗi {interval}s (Ctrl+C để dừng).")
+    cycle = 0
+    try:
+        while True:
+            try:
+                sync_products(delete_removed=cycle % reconcile_every == 0)
+            except Exception as e:
+                print(f"⚠️ Lỗi khi đồng bộ: {e}")
+            cycle += 1
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print("👋 Dừng theo dõi.")
+
+
+def report_throughput(mode: str, processed: int, elapsed: float):
+    rate = processed / elapsed if elapsed else 0.0
+    print(f"📊 [{mode}] {processed} sản phẩm trong {elapsed:.1f}s — {rate:.2f} sản phẩm/giây.")
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Index sản phẩm vào Qdrant")
+    parser.add_argument("--sync", action="store_true", help="Chỉ index sản phẩm thay đổi từ lần đồng bộ trước")
+    parser.add_argument("--watch", type=float, default=None, metavar="SECONDS", help="Đồng bộ tăng dần liên tục theo chu kỳ")
+    parser.add_argument("--legacy", action="store_true", help="Chạy cách index cũ từng sản phẩm để so sánh")
+    parser.add_argument("--restart", action="store_true", help="Bỏ qua checkpoint, index lại từ đầu")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    parser.add_argument("--limit", type=int, default=None, help="Chỉ index N sản phẩm (dùng để đo throughput)")
+    args = parser.parse_args()
+
     ensure_collection_exists()
-    process_all_products()
+    if args.watch:
+        watch_products(args.watch)
+    elif args.sync:
+        sync_products(args.page_size)
+    elif args.legacy:
+        process_all_products_legacy(args.limit)
+    else:
+        process_all_products(args.page_size, args.restart, args.limit)
 
 if __name__ == "__main__":
     main()
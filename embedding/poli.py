@@ -2,9 +2,11 @@ import sys
 import uuid
 from concurrent.futures import ThreadPoolExecutor
 from qdrant_client import QdrantClient
-from qdrant_client.models import PointStruct, VectorParams, Distance
+from qdrant_client.models import PointStruct
 from env import env
+from embedding.qdrant_config import ensure_collection, point_vectors
 from embedding.generate_embeddings import generate_embedding
+from embedding.index_versions import bump_index_version
 from db import Session
 from models.fqas import FQA, FQAModel
 from services.fqas import FQAsService
@@ -15,19 +17,8 @@ QD_COLLECTION = "poli_embeddings"
 qdrant = QdrantClient(f"http://localhost:{env.QD_PORT}")
 
 def ensure_collection_exists():
-    collections = qdrant.get_collections().collections
-    collection_names = [col.name for col in collections]
-
-    if QD_COLLECTION not in collection_names:
-        qdrant.create_collection(
-            collection_name=QD_COLLECTION,
-            vectors_config={"default": VectorParams(size=3072, distance=Distance.COSINE)},
-            on_disk_payload=False  # Ensure vectors are stored
-        )
-
-        print(f"✅ Đã tạo collection '{QD_COLLECTION}'.")
-    else:
-        print(f"ℹ️ Collection '{QD_COLLECTION}' đã tồn tại.")
+    # Lượng tử hóa, vector trên đĩa và HNSW cấu hình qua env (QDRANT_*), xem embedding/qdrant_config.py
+    ensure_collection(qdrant, QD_COLLECTION)
 
 def process_fqa(fqa: FQAModel):
     # Tạo vector embedding
@@ -43,7 +34,7 @@ def process_fqa(fqa: FQAModel):
     if embedding:
         point = PointStruct(
             id=point_id,
-            vector={"default": embedding},
+            vector=point_vectors(embedding),
             payload={
                 "fqa_id": point_id,
                 "question": fqa.question,
@@ -78,4 +69,6 @@ with Session() as session:
 with ThreadPoolExecutor(max_workers=10) as executor:
     for fqa in fqa_models:
         executor.submit(process_fqa, fqa)
+# Báo cho app biết collection đã thay đổi (làm mất hiệu lực semantic cache)
+bump_index_version(QD_COLLECTION)
 print("✅ Đã thêm tất cả các FQA vào Qdrant.")
\ No newline at end of file
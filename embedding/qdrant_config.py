@@ -0,0 +1,301 @@
+import argparse
+from typing import FrozenSet, Optional
+
+import numpy as np
+from loguru import logger
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.models import (
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    Distance,
+    HnswConfigDiff,
+    Modifier,
+    PayloadSchemaType,
+    Prefetch,
+    QueryRequest,
+    QuantizationSearchParams,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SearchParams,
+    SparseVectorParams,
+    VectorParams,
+    VectorParamsDiff,
+)
+
+from cache import TTLCache
+from embedding.hybrid import SPARSE_VECTOR, document_sparse_vector, query_sparse_vector
+from env import env
+
+EMBEDDING_DIM = 3072
+QUANTIZATION_MODES = ("none", "scalar", "binary")
+# full: chỉ vector đầy đủ; coarse: chỉ vector Matryoshka rút gọn;
+# two_stage: lấy ứng viên bằng vector rút gọn rồi chấm lại bằng vector đầy đủ;
+# hybrid: vector dense (theo SEARCH_MODE) + vector thưa BM25, gộp bằng RRF
+SEARCH_MODES = ("full", "coarse", "two_stage", "hybrid")
+# Payload index của collection sản phẩm cho các bộ lọc có cấu trúc
+PRODUCT_PAYLOAD_INDEXES = {
+    "price": PayloadSchemaType.FLOAT,
+    "brand_id": PayloadSchemaType.INTEGER,
+    "category_path": PayloadSchemaType.KEYWORD,
+    "rating_average": PayloadSchemaType.FLOAT,
+    "availability": PayloadSchemaType.INTEGER,
+}
+# Tên vector (dense + thưa) của từng collection, đọc từ get_collection và cache lại.
+# "" là vector dense không tên (collection tạo trước khi dùng named vector).
+COLLECTION_VECTORS_TTL = 300
+_collection_vectors = TTLCache(max_size=64, ttl=COLLECTION_VECTORS_TTL)
+
+
+def quantization_config(mode: str):
+    """
+    none: float32 đầy đủ; scalar: int8 (~4x nhỏ hơn); binary: 1 bit/chiều (~32x nhỏ hơn).
+    Vector lượng tử hóa luôn nằm trong RAM, vector gốc có thể để trên đĩa để rescore.
+    """
+    if mode == "scalar":
+        return ScalarQuantization(scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True))
+    if mode == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+    if mode == "none":
+        return None
+    raise ValueError(f"Unknown quantization mode '{mode}', expected one of {QUANTIZATION_MODES}")
+
+
+def vector_params(
+    size: int = EMBEDDING_DIM,
+    quantization: str = None,
+    on_disk: bool = None,
+    hnsw_m: int = None,
+    hnsw_ef_construct: int = None,
+) -> VectorParams:
+    """
+    Cấu hình một named vector; tham số không truyền lấy theo env (QDRANT_*).
+    """
+    return VectorParams(
+        size=size,
+        distance=Distance.COSINE,
+        on_disk=env.QDRANT_ON_DISK_VECTORS if on_disk is None else on_disk,
+        hnsw_config=HnswConfigDiff(
+            m=hnsw_m or env.QDRANT_HNSW_M,
+            ef_construct=hnsw_ef_construct or env.QDRANT_HNSW_EF_CONSTRUCT,
+        ),
+        quantization_config=quantization_config(quantization or env.QDRANT_QUANTIZATION),
+    )
+
+
+def mrl_vector_name(dim: int = None) -> str:
+    return f"mrl_{dim or env.QDRANT_MRL_DIM}"
+
+
+def truncate_vector(vector, dim: int) -> list:
+    """
+    Lấy tiền tố dim chiều của embedding Matryoshka và chuẩn hóa lại về độ dài 1.
+    """
+    prefix = np.asarray(vector[:dim], dtype=np.float32)
+    norm = np.linalg.norm(prefix)
+    return (prefix / norm if norm else prefix).tolist()
+
+
+def collection_vectors_config() -> dict:
+    """
+    Named vector "default" (đầy đủ) và, nếu QDRANT_MRL_DIM > 0, vector rút gọn để
+    tìm thô. Vector rút gọn luôn ở RAM; vector đầy đủ có thể để trên đĩa.
+    """
+    config = {"default": vector_params()}
+    if env.QDRANT_MRL_DIM:
+        config[mrl_vector_name()] = vector_params(size=env.QDRANT_MRL_DIM, quantization="none", on_disk=False)
+    return config
+
+
+def sparse_vectors_config() -> dict:
+    # Qdrant tự nhân IDF của từng token lúc truy vấn
+    return {SPARSE_VECTOR: SparseVectorParams(modifier=Modifier.IDF)} if env.QDRANT_SPARSE else None
+
+
+def point_vectors(embedding, lexical_text: str = None) -> dict:
+    vectors = {"default": embedding}
+    if env.QDRANT_MRL_DIM:
+        vectors[mrl_vector_name()] = truncate_vector(embedding, env.QDRANT_MRL_DIM)
+    if env.QDRANT_SPARSE and lexical_text:
+        vectors[SPARSE_VECTOR] = document_sparse_vector(lexical_text)
+    return vectors
+
+
+def _vector_names(info) -> FrozenSet[str]:
+    params = info.config.params
+    dense = params.vectors
+    names = set(dense) if isinstance(dense, dict) else {""}
+    names.update(params.sparse_vectors or {})
+    return frozenset(names)
+
+
+def collection_vectors(client: QdrantClient, collection_name: str) -> Optional[FrozenSet[str]]:
+    """
+    Các named vector collection đang có (cache COLLECTION_VECTORS_TTL giây). None nếu
+    không đọc được, khi đó truy vấn theo cấu hình env.
+    """
+    names = _collection_vectors.get(collection_name)
+    if names is None:
+        try:
+            names = _vector_names(client.get_collection(collection_name))
+        except Exception as e:
+            logger.warning(f"Không đọc được cấu hình vector của '{collection_name}': {e}")
+            return None
+        _collection_vectors.set(collection_name, names)
+    return names
+
+
+async def acollection_vectors(client: AsyncQdrantClient, collection_name: str) -> Optional[FrozenSet[str]]:
+    names = _collection_vectors.get(collection_name)
+    if names is None:
+        try:
+            names = _vector_names(await client.get_collection(collection_name))
+        except Exception as e:
+            logger.warning(f"Không đọc được cấu hình vector của '{collection_name}': {e}")
+            return None
+        _collection_vectors.set(collection_name, names)
+    return names
+
+
+def _has_vector(available: Optional[FrozenSet[str]], name: str) -> bool:
+    return available is None or name in available
+
+
+def query_kwargs(vector, limit: int, mode: str = None, query_filter=None, available: Optional[FrozenSet[str]] = None) -> dict:
+    """
+    Tham số query_points theo chế độ tìm kiếm. Chế độ cần vector rút gọn (hoặc
+    vector thưa) sẽ quay về "full" khi QDRANT_MRL_DIM (QDRANT_SPARSE) chưa bật hoặc
+    collection không có vector đó (available: kết quả collection_vectors).
+    """
+    mode = mode or env.SEARCH_MODE
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode '{mode}', expected one of {SEARCH_MODES}")
+    if mode == "hybrid":
+        # hybrid cần hai truy vấn (hybrid_requests); tới đây nghĩa là chưa bật QDRANT_SPARSE
+        mode = "full"
+    # Collection cũ chỉ có một vector không tên
+    full_using = "default" if _has_vector(available, "default") else None
+    if mode == "full" or not env.QDRANT_MRL_DIM or not _has_vector(available, mrl_vector_name()):
+        return {"query": vector, "using": full_using, "limit": limit, "search_params": search_params(), "query_filter": query_filter}
+
+    small = truncate_vector(vector, env.QDRANT_MRL_DIM)
+    if mode == "coarse":
+        return {"query": small, "using": mrl_vector_name(), "limit": limit, "search_params": search_params(), "query_filter": query_filter}
+    return {
+        "prefetch": Prefetch(
+            query=small,
+            using=mrl_vector_name(),
+            filter=query_filter,
+            limit=limit * env.QDRANT_MRL_CANDIDATES_FACTOR,
+            params=search_params(),
+        ),
+        "query": vector,
+        "using": full_using,
+        "limit": limit,
+        "query_filter": query_filter,
+    }
+
+
+def is_hybrid(mode: str = None, available: Optional[FrozenSet[str]] = None) -> bool:
+    return (mode or env.SEARCH_MODE) == "hybrid" and env.QDRANT_SPARSE and _has_vector(available, SPARSE_VECTOR)
+
+
+def hybrid_requests(vector, text: str, limit: int, query_filter=None, available: Optional[FrozenSet[str]] = None) -> list:
+    """
+    Hai truy vấn gửi chung một lần qua query_batch_points: dense (theo SEARCH_MODE,
+    hoặc full nếu SEARCH_MODE cũng là hybrid) và thưa BM25, mỗi bên lấy dư ứng viên
+    để RRF gộp.
+    """
+    candidates = limit * env.HYBRID_CANDIDATES_FACTOR
+    dense_mode = env.SEARCH_MODE if env.SEARCH_MODE != "hybrid" else "full"
+    dense = query_kwargs(vector, candidates, dense_mode, query_filter, available)
+    dense["params"] = dense.pop("search_params", None)
+    dense["filter"] = dense.pop("query_filter", None)
+    return [
+        QueryRequest(**dense, with_payload=False),
+        QueryRequest(
+            query=query_sparse_vector(text),
+            using=SPARSE_VECTOR,
+            filter=query_filter,
+            limit=candidates,
+            with_payload=False,
+        ),
+    ]
+
+
+def ensure_collection(client: QdrantClient, collection_name: str, vectors_config: dict = None) -> bool:
+    """
+    Tạo collection nếu chưa có. Trả về True nếu vừa tạo mới.
+    """
+    if client.collection_exists(collection_name):
+        print(f"ℹ️ Collection '{collection_name}' đã tồn tại.")
+        return False
+    client.create_collection(
+        collection_name=collection_name,
+        vectors_config=vectors_config or collection_vectors_config(),
+        sparse_vectors_config=sparse_vectors_config(),
+        on_disk_payload=False,
+    )
+    print(f"✅ Đã tạo collection '{collection_name}'.")
+    return True
+
+
+def ensure_payload_indexes(client: QdrantClient, collection_name: str, indexes: dict = None):
+    """
+    Tạo payload index (bỏ qua index đã có) để Qdrant lọc ngay trong lúc duyệt HNSW.
+    """
+    existing = client.get_collection(collection_name).payload_schema or {}
+    for field_name, schema in (indexes or PRODUCT_PAYLOAD_INDEXES).items():
+        if field_name not in existing:
+            client.create_payload_index(collection_name, field_name=field_name, field_schema=schema)
+            print(f"✅ Đã tạo payload index '{field_name}' cho '{collection_name}'.")
+
+
+def apply_vector_config(client: QdrantClient, collection_name: str, vector_name: str = "default"):
+    """
+    Áp dụng cấu hình hiện tại (env) cho collection đã tồn tại; Qdrant tự build lại
+    index/lượng tử hóa ở nền. Không thêm được named vector mới (vd: vector Matryoshka)
+    vào collection cũ, việc đó cần tạo lại collection và index lại.
+    """
+    params = vector_params()
+    client.update_collection(
+        collection_name=collection_name,
+        vectors_config={
+            vector_name: VectorParamsDiff(
+                on_disk=params.on_disk,
+                hnsw_config=params.hnsw_config,
+                quantization_config=params.quantization_config,
+            )
+        },
+    )
+    print(f"✅ Đã cập nhật cấu hình vector '{vector_name}' của '{collection_name}'.")
+
+
+def search_params(exact: bool = False) -> SearchParams:
+    """
+    Tham số truy vấn: với collection lượng tử hóa thì lấy dư (oversampling) ứng viên
+    bằng vector lượng tử rồi rescore bằng vector gốc.
+    """
+    return SearchParams(
+        hnsw_ef=env.QDRANT_HNSW_EF,
+        exact=exact,
+        quantization=QuantizationSearchParams(
+            ignore=False,
+            rescore=env.QDRANT_RESCORE,
+            oversampling=env.QDRANT_OVERSAMPLING,
+        ),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Áp dụng cấu hình lượng tử hóa/HNSW cho collection Qdrant")
+    parser.add_argument("collections", nargs="+")
+    args = parser.parse_args()
+
+    client = QdrantClient(f"http://localhost:{env.QD_PORT}")
+    for collection_name in args.collections:
+        apply_vector_config(client, collection_name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import hashlib
+import re
+import threading
+import time
+import unicodedata
+from typing import Optional
+
+import numpy as np
+from loguru import logger
+
+from cache import TTLCache
+from executor import run_blocking
+
+
+def normalize_query_text(text: str) -> str:
+    """
+    Khóa cache của câu truy vấn: NFC (giữ dấu), gom khoảng trắng, casefold.
+    """
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text or "")).strip().casefold()
+
+
+class QueryEmbeddingCache:
+    """
+    Cache embedding của câu truy vấn trên đường tìm kiếm: LRU+TTL trong process,
+    phía sau là backend dùng chung (Redis hoặc bản thay thế local) nếu có cấu hình.
+
+    Thống kê tỉ lệ hit và thời gian tiết kiệm được, ước lượng bằng độ trễ trung
+    bình (EWMA) của các lần phải gọi API.
+    """
+
+    def __init__(self, model: str, max_size: int = 5000, ttl: float = 86400, shared=None):
+        self.model = model
+        self.ttl = ttl
+        self._local = TTLCache(max_size=max_size, ttl=ttl)
+        self._shared = shared
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.shared_errors = 0
+        self.avg_miss_ms: Optional[float] = None
+        self.saved_ms = 0.0
+
+    def _key(self, task_type: str, text: str) -> str:
+        digest = hashlib.sha256(f"{self.model}\x00{task_type}\x00{normalize_query_text(text)}".encode("utf-8")).hexdigest()
+        return f"qemb:{digest}"
+
+    def _shared_get(self, key: str) -> Optional[list]:
+        try:
+            raw = self._shared.get(key)
+        except Exception as e:
+            # Backend chung lỗi thì coi như miss, không làm hỏng request tìm kiếm
+            logger.warning(f"Lỗi đọc cache embedding dùng chung: {e}")
+            with self._lock:
+                self.shared_errors += 1
+            return None
+        if raw is None:
+            return None
+        vector = np.frombuffer(raw, dtype=np.float32).tolist()
+        self._local.set(key, vector)
+        return vector
+
+    def _shared_set(self, key: str, values: np.ndarray):
+        try:
+            self._shared.set(key, values.tobytes(), ttl=self.ttl)
+        except Exception as e:
+            logger.warning(f"Lỗi ghi cache embedding dùng chung: {e}")
+            with self._lock:
+                self.shared_errors += 1
+
+    def get(self, task_type: str, text: str) -> Optional[list]:
+        start_time = time.perf_counter()
+        key = self._key(task_type, text)
+        vector = self._local.get(key)
+        source = "local"
+        if vector is None and self._shared is not None:
+            vector = self._shared_get(key)
+            source = "shared"
+        return self._record(vector, source, start_time)
+
+    async def aget(self, task_type: str, text: str) -> Optional[list]:
+        """
+        Bản async của get: hit trong RAM trả ngay trên event loop, chỉ backend dùng chung
+        (I/O mạng đồng bộ) mới chạy trong thread pool.
+        """
+        start_time = time.perf_counter()
+        key = self._key(task_type, text)
+        vector = self._local.get(key)
+        source = "local"
+        if vector is None and self._shared is not None:
+            vector = await run_blocking(self._shared_get, key)
+            source = "shared"
+        return self._record(vector, source, start_time)
+
+    def _record(self, vector: Optional[list], source: str, start_time: float) -> Optional[list]:
+        with self._lock:
+            if vector is None:
+                self.misses += 1
+                return None
+            if source == "local":
+                self.local_hits += 1
+            else:
+                self.shared_hits += 1
+            if self.avg_miss_ms is not None:
+                self.saved_ms += max(0.0, self.avg_miss_ms - (time.perf_counter() - start_time) * 1000)
+        return vector
+
+    def _put_local(self, task_type: str, text: str, vector, miss_latency_ms: Optional[float]):
+        """
+        Ghi vào RAM, trả về (key, vector float32) cần ghi xuống backend chung hoặc None.
+        """
+        if miss_latency_ms is not None:
+            with self._lock:
+                self.avg_miss_ms = miss_latency_ms if self.avg_miss_ms is None else 0.9 * self.avg_miss_ms + 0.1 * miss_latency_ms
+        values = np.asarray(vector, dtype=np.float32)
+        if not values.size or not values.any():
+            return None
+        key = self._key(task_type, text)
+        self._local.set(key, list(vector))
+        return (key, values) if self._shared is not None else None
+
+    def put(self, task_type: str, text: str, vector, miss_latency_ms: Optional[float] = None):
+        pending = self._put_local(task_type, text, vector, miss_latency_ms)
+        if pending is not None:
+            self._shared_set(*pending)
+
+    async def aput(self, task_type: str, text: str, vector, miss_latency_ms: Optional[float] = None):
+        pending = self._put_local(task_type, text, vector, miss_latency_ms)
+        if pending is not None:
+            await run_blocking(self._shared_set, *pending)
+
+    def clear(self):
+        self._local.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.local_hits + self.shared_hits
+            total = hits + self.misses
+            return {
+                "entries": len(self._local),
+                "local_hits": self.local_hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "hit_ratio": round(hits / total, 4) if total else 0.0,
+                "avg_miss_ms": round(self.avg_miss_ms, 1) if self.avg_miss_ms is not None else None,
+                "latency_saved_ms": round(self.saved_ms, 1),
+                "shared_backend": type(self._shared).__name__ if self._shared is not None else None,
+                "shared_errors": self.shared_errors,
+            }
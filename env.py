@@ -33,6 +33,47 @@ class Env(BaseModel):
     CHAT_FE_BASE_URL: str
     DOMAIN: str
     GROQ_API_KEY: str
+    SEMANTIC_CACHE_THRESHOLD: float = 0.92
+    SEMANTIC_CACHE_TTL: int = 3600
+    SEMANTIC_CACHE_MAX_SIZE: int = 1000
+    ROUTER_CONFIDENCE_THRESHOLD: float = 0.75
+    ROUTER_SHADOW_RATE: float = 0.05
+    EMBEDDING_RPM_PER_KEY: int = 60
+    EMBEDDING_CACHE_PATH: str = ""
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 200000
+    INDEX_OUTBOX_WORKER: bool = True
+    INDEX_OUTBOX_INTERVAL: float = 2.0
+    QDRANT_QUANTIZATION: str = "none"
+    QDRANT_ON_DISK_VECTORS: bool = False
+    QDRANT_HNSW_M: int = 16
+    QDRANT_HNSW_EF_CONSTRUCT: int = 100
+    QDRANT_HNSW_EF: int = 128
+    QDRANT_RESCORE: bool = True
+    QDRANT_OVERSAMPLING: float = 2.0
+    QDRANT_MRL_DIM: int = 0
+    QDRANT_MRL_CANDIDATES_FACTOR: int = 10
+    SEARCH_MODE: str = "full"
+    QDRANT_SPARSE: bool = False
+    HYBRID_CANDIDATES_FACTOR: int = 4
+    HYBRID_DENSE_WEIGHT: float = 1.0
+    HYBRID_SPARSE_WEIGHT: float = 1.0
+    QUERY_EMBEDDING_CACHE_SIZE: int = 5000
+    QUERY_EMBEDDING_CACHE_TTL: int = 86400
+    QUERY_EMBEDDING_CACHE_URL: str = ""
+    SEARCH_CURSOR_TTL: int = 900
+    SEARCH_CURSOR_URL: str = ""
+    SEARCH_RERANKER: str = "lightweight"
+    RERANK_CANDIDATES: int = 20
+    RERANK_LEXICAL_WEIGHT: float = 1.0
+    RERANK_POPULARITY_WEIGHT: float = 0.5
+    RERANK_VECTOR_WEIGHT: float = 1.0
+    PRODUCT_CACHE_SIZE: int = 10000
+    PRODUCT_CACHE_TTL: int = 300
+    PRODUCT_CACHE_URL: str = ""
+    # Bật sau khi đã chạy migration b5d2e8f4a913 (view home_feed)
+    HOME_FEED_MATERIALIZED: bool = False
+    HOME_FEED_REFRESH_INTERVAL: float = 300.0
+    HOME_TOTAL_TTL: int = 60
     class Config:
         env_file = ".env"
     
@@ -0,0 +1,14 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+# Thread pool giới hạn cho các lời gọi đồng bộ (autogen initiate_chat, SQLAlchemy sync, ...)
+# để không chặn event loop và không tạo thread vô hạn khi tải cao.
+BLOCKING_MAX_WORKERS = 16
+
+blocking_executor = ThreadPoolExecutor(max_workers=BLOCKING_MAX_WORKERS, thread_name_prefix="blocking")
+
+
+async def run_blocking(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(blocking_executor, functools.partial(func, *args, **kwargs))
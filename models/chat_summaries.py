@@ -0,0 +1,28 @@
+from datetime import datetime
+from sqlalchemy import TIMESTAMP, ForeignKey
+from sqlalchemy.orm import Mapped, mapped_column
+from pydantic import BaseModel
+import sqlalchemy as sa
+from models.base import Base
+from models.chat import Chat
+
+
+class ChatSummary(Base):
+    __tablename__ = "chat_summaries"
+
+    chat_id: Mapped[int] = mapped_column(ForeignKey(Chat.id, ondelete="CASCADE"), primary_key=True)
+    summary: Mapped[str] = mapped_column(sa.Text, nullable=False)
+    # ID tin nhắn cuối cùng đã được gộp vào bản tóm tắt
+    summarized_until_id: Mapped[int] = mapped_column(nullable=False)
+    token_estimate: Mapped[int] = mapped_column(nullable=False, default=0)
+    updated_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), server_default=sa.func.now(), onupdate=sa.func.now(), nullable=False)
+
+class ChatSummaryModel(BaseModel):
+    chat_id: int
+    summary: str
+    summarized_until_id: int
+    token_estimate: int
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,35 @@
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import TIMESTAMP
+from sqlalchemy.orm import Mapped, mapped_column
+from pydantic import BaseModel
+import sqlalchemy as sa
+from models.base import Base
+
+
+class IndexOutbox(Base):
+    __tablename__ = "index_outbox"
+    __table_args__ = (
+        sa.Index("ix_index_outbox_product_id", "product_id"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    # Không dùng khóa ngoại: job xóa vẫn phải tồn tại sau khi sản phẩm bị xóa
+    product_id: Mapped[int] = mapped_column(nullable=False)
+    # "upsert" hoặc "delete"
+    op: Mapped[str] = mapped_column(sa.String(16), nullable=False)
+    attempts: Mapped[int] = mapped_column(nullable=False, default=0)
+    created_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), server_default=sa.func.now(), nullable=False)
+    # Worker đã nhận job lúc nào (None: chưa ai nhận)
+    claimed_at: Mapped[Optional[datetime]] = mapped_column(TIMESTAMP(timezone=True), nullable=True)
+
+class IndexOutboxModel(BaseModel):
+    id: int
+    product_id: int
+    op: str
+    attempts: int
+    created_at: datetime
+    claimed_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -14,11 +14,16 @@ class Base(DeclarativeBase):
 
 class Message(Base):
     __tablename__ = "chat_message"
+    __table_args__ = (
+        sa.Index("ix_chat_message_chat_id_created_at", "chat_id", "created_at"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, nullable=False)
     chat_id: Mapped[int] = mapped_column( ForeignKey(Chat.id), nullable=False)
     content: Mapped[str] = mapped_column(sa.Text, nullable=False)
     role: Mapped[str] = mapped_column(sa.Text, nullable=False)
+    agent: Mapped[Optional[str]] = mapped_column(sa.Text, nullable=True)
+    agent_source: Mapped[Optional[str]] = mapped_column(sa.Text, nullable=True)
     created_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), server_default=sa.func.now(), nullable=False)
     updated_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), server_default=sa.func.now(), onupdate=sa.func.now(), nullable=False)
     
@@ -27,6 +32,8 @@ class CreateMessagePayload(BaseModel):
     chat_id: int
     content: str
     role: str
+    agent: Optional[str] = None
+    agent_source: Optional[str] = None
 
 # Model phản hồi trả về từ API
 class MessageModel(BaseModel):
@@ -34,6 +41,8 @@ class MessageModel(BaseModel):
     chat_id: int
     content: str
     role: str
+    agent: Optional[str] = None
+    agent_source: Optional[str] = None
     created_at: datetime
     updated_at: datetime
 
@@ -1,23 +1,27 @@
 from datetime import datetime
+from typing import List, Literal
 from sqlalchemy import ForeignKey, DECIMAL, TIMESTAMP
 from sqlalchemy.orm import Mapped, mapped_column
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from models.base import Base, TimestampMixin
 
+# Nhóm cột dài (HTML) của Product, mặc định không load; cần thì undefer_group(PRODUCT_DETAIL_GROUP)
+PRODUCT_DETAIL_GROUP = "details"
+
 
 class Product(Base, TimestampMixin):
     __tablename__ = "products"
     product_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
     name: Mapped[str] = mapped_column(nullable=True)
     product_short_url: Mapped[str] = mapped_column(nullable=True)
-    description: Mapped[str] = mapped_column(nullable=True)
-    short_description: Mapped[str] = mapped_column(nullable=True)
+    description: Mapped[str] = mapped_column(nullable=True, deferred=True, deferred_group=PRODUCT_DETAIL_GROUP)
+    short_description: Mapped[str] = mapped_column(nullable=True, deferred=True, deferred_group=PRODUCT_DETAIL_GROUP)
     price: Mapped[float] = mapped_column(DECIMAL, nullable=True)
     original_price: Mapped[float] = mapped_column(DECIMAL, nullable=True)
     discount: Mapped[float] = mapped_column(DECIMAL, nullable=True)
     discount_rate: Mapped[int] = mapped_column(nullable=True)
     sku: Mapped[str] = mapped_column(nullable=True)
-    review_text: Mapped[str] = mapped_column(nullable=True)
+    review_text: Mapped[str] = mapped_column(nullable=True, deferred=True, deferred_group=PRODUCT_DETAIL_GROUP)
     quantity_sold: Mapped[int] = mapped_column(nullable=True)
     rating_average: Mapped[float] = mapped_column(DECIMAL, nullable=True)
     review_count: Mapped[int] = mapped_column(nullable=True)
@@ -85,4 +89,43 @@ class ProductModel(BaseModel):
     class Config:
         from_attributes = True
         validate_by_name = True
-        use_enum_values = True
\ No newline at end of file
+        use_enum_values = True
+
+
+class ProductSummary(BaseModel):
+    """
+    Dạng rút gọn cho danh sách, kết quả tìm kiếm và chatbot: không có description,
+    short_description, review_text.
+    """
+    product_id: int
+    name: str
+    product_short_url: str
+    price: float
+    original_price: float
+    discount_rate: int
+    quantity_sold: int
+    rating_average: float
+    review_count: int
+    thumbnail_url: str
+    category_id: str
+    brand_id: int
+    seller_id: int
+    availability: int
+
+    class Config:
+        from_attributes = True
+        validate_by_name = True
+        use_enum_values = True
+
+
+# Số ID tối đa của một request POST /products/batch
+PRODUCT_BATCH_MAX_IDS = 500
+
+
+class ProductBatchRequest(BaseModel):
+    """
+    summary: các cột dùng cho danh sách/thẻ sản phẩm (không có mô tả HTML);
+    with_images: summary kèm ảnh; full: như get_info.
+    """
+    ids: List[int] = Field(min_length=1, max_length=PRODUCT_BATCH_MAX_IDS)
+    projection: Literal["summary", "full", "with_images"] = "summary"
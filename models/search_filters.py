@@ -0,0 +1,30 @@
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+
+class ProductSearchFilter(BaseModel):
+    """
+    Ràng buộc có cấu trúc cho tìm kiếm sản phẩm, được đẩy xuống payload index của
+    Qdrant để lọc ngay trong lúc tìm ANN.
+    """
+    min_price: Optional[float] = Field(default=None, ge=0)
+    max_price: Optional[float] = Field(default=None, ge=0)
+    brand_ids: List[int] = Field(default_factory=list)
+    # Tên thương hiệu/danh mục do agent trích ra, được đổi thành ID trước khi tìm
+    brand_name: Optional[str] = None
+    category_ids: List[str] = Field(default_factory=list)
+    category_name: Optional[str] = None
+    min_rating: Optional[float] = Field(default=None, ge=0, le=5)
+    availability: Optional[int] = None
+
+    def is_empty(self) -> bool:
+        return not any([
+            self.min_price is not None,
+            self.max_price is not None,
+            self.brand_ids,
+            self.brand_name,
+            self.category_ids,
+            self.category_name,
+            self.min_rating is not None,
+            self.availability is not None,
+        ])
@@ -1,6 +1,7 @@
 from db import Session
 from models.chat import Chat, ChatCreate, UpdateChatPayload, ChatModel
 from models.message import Message
+from models.chat_summaries import ChatSummary
 
 class ChatRepository:
     @staticmethod
@@ -38,6 +39,7 @@ class ChatRepository:
         with Session() as session:
             # Xóa tất cả message liên quan trước
             session.query(Message).filter(Message.chat_id == chat_id).delete()
+            session.query(ChatSummary).filter(ChatSummary.chat_id == chat_id).delete()
 
             # Sau đó xóa chat
             chat = session.get(Chat, chat_id)
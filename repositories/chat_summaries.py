@@ -0,0 +1,31 @@
+from typing import Optional
+from db import Session
+from models.chat_summaries import ChatSummary, ChatSummaryModel
+
+
+class ChatSummaryRepository:
+    @staticmethod
+    def get(chat_id: int) -> Optional[ChatSummaryModel]:
+        with Session() as session:
+            summary = session.get(ChatSummary, chat_id)
+            return ChatSummaryModel.model_validate(summary) if summary else None
+
+    @staticmethod
+    def upsert(chat_id: int, summary: str, summarized_until_id: int, token_estimate: int) -> ChatSummaryModel:
+        with Session() as session:
+            record = session.get(ChatSummary, chat_id)
+            if record is None:
+                record = ChatSummary(chat_id=chat_id)
+                session.add(record)
+            record.summary = summary
+            record.summarized_until_id = summarized_until_id
+            record.token_estimate = token_estimate
+            session.commit()
+            session.refresh(record)
+            return ChatSummaryModel.model_validate(record)
+
+    @staticmethod
+    def delete(chat_id: int):
+        with Session() as session:
+            session.query(ChatSummary).filter(ChatSummary.chat_id == chat_id).delete()
+            session.commit()
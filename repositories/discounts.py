@@ -1,5 +1,7 @@
 from models.discounts import Discount, DiscountCreate, DiscountModel
 from db import Session
+from models.product_discounts import ProductDiscount
+from services.product_cache import product_cache
 
 class DiscountRepositories:
     @staticmethod
@@ -17,6 +19,9 @@ class DiscountRepositories:
             discount = session.get(Discount, discount_id)
             if not discount:
                 return None
+            # Sản phẩm đang áp dụng khuyến mãi này có chi tiết (get_info) thay đổi
+            product_ids = [row[0] for row in session.query(ProductDiscount.product_id).filter(ProductDiscount.discount_id == discount_id).all()]
             session.delete(discount)
             session.commit()
+            product_cache.invalidate(product_ids)
             return DiscountModel.model_validate(discount)
\ No newline at end of file
@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func, or_, select, update
+from db import Session
+from models.index_outbox import IndexOutbox, IndexOutboxModel
+
+
+class IndexOutboxRepository:
+    @staticmethod
+    def enqueue(session, product_id: int, op: str, attempts: int = 0):
+        """
+        Thêm job index vào session của thao tác ghi sản phẩm, để job được commit
+        cùng transaction (không commit ở đây).
+        """
+        session.add(IndexOutbox(product_id=product_id, op=op, attempts=attempts))
+
+    @staticmethod
+    def claim(limit: int, lease_seconds: float) -> list[IndexOutboxModel]:
+        """
+        Nhận các job cũ nhất chưa ai nhận (hoặc nhận đã quá lease_seconds) trong một
+        transaction ngắn rồi commit ngay; SKIP LOCKED để nhiều worker chạy song song
+        không lấy trùng job. Việc embed chạy sau đó, ngoài transaction.
+        """
+        now = datetime.now(timezone.utc)
+        claimable = (
+            select(IndexOutbox.id)
+            .where(or_(IndexOutbox.claimed_at.is_(None), IndexOutbox.claimed_at < now - timedelta(seconds=lease_seconds)))
+            .order_by(IndexOutbox.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        with Session() as session:
+            rows = session.execute(
+                update(IndexOutbox)
+                .where(IndexOutbox.id.in_(claimable.scalar_subquery()))
+                .values(claimed_at=now)
+                .returning(IndexOutbox)
+            ).scalars().all()
+            jobs = sorted((IndexOutboxModel.model_validate(row) for row in rows), key=lambda job: job.id)
+            session.commit()
+        return jobs
+
+    @staticmethod
+    def complete(ids: list[int], retries: list[IndexOutboxModel]):
+        """
+        Ghi kết quả một lượt: xóa các job đã nhận, đưa job lỗi về cuối hàng đợi
+        (attempts + 1), trong một transaction.
+        """
+        with Session() as session:
+            IndexOutboxRepository.delete(session, ids)
+            for job in retries:
+                IndexOutboxRepository.enqueue(session, job.product_id, job.op, attempts=job.attempts + 1)
+            session.commit()
+
+    @staticmethod
+    def delete(session, ids: list[int]):
+        if ids:
+            session.query(IndexOutbox).filter(IndexOutbox.id.in_(ids)).delete(synchronize_session=False)
+
+    @staticmethod
+    def stats() -> dict:
+        with Session() as session:
+            depth, oldest = session.query(func.count(IndexOutbox.id), func.min(IndexOutbox.created_at)).one()
+        lag = (datetime.now(timezone.utc) - oldest).total_seconds() if oldest else 0.0
+        return {"queue_depth": depth, "lag_seconds": round(lag, 1)}
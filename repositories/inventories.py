@@ -1,6 +1,7 @@
 
 from models.inventories import Inventory, InventoryCreate
 from db import Session
+from services.product_cache import product_cache
 import numpy as np
 
 
@@ -11,6 +12,7 @@ class InventoryRepositories:
             new_inventory = Inventory(**payload.model_dump())
             session.add(new_inventory)
             session.commit()
+            product_cache.invalidate([new_inventory.product_id])
             session.refresh(new_inventory)
             
             return Inventory.validate(new_inventory)
\ No newline at end of file
@@ -1,4 +1,7 @@
-from db import Session
+from typing import Optional
+
+import sqlalchemy as sa
+from db import Session, AsyncSession
 from models.message import Message, CreateMessagePayload, UpdateMessagePayload, MessageModel
 
 
@@ -12,6 +15,15 @@ class MessageRepository:
             session.refresh(message)
             return MessageModel.model_validate(message)
 
+    @staticmethod
+    async def acreate(payload: CreateMessagePayload) -> MessageModel:
+        async with AsyncSession() as session:
+            message = Message(**payload.model_dump())
+            session.add(message)
+            await session.commit()
+            await session.refresh(message)
+            return MessageModel.model_validate(message)
+
     @staticmethod
     def get_one(message_id: int) -> MessageModel:
         with Session() as session:
@@ -46,11 +58,16 @@ class MessageRepository:
 
     
     @staticmethod
-    def get_recent_messages(chat_id: int, limit: int = 5):
+    def get_recent_messages(chat_id: int, limit: int = 5, before_id: Optional[int] = None):
+        """
+        Các tin nhắn mới nhất của chat (mới -> cũ); before_id: chỉ lấy tin nhắn có id nhỏ hơn.
+        """
         with Session() as session:
+            query = session.query(Message).filter(Message.chat_id == chat_id)
+            if before_id is not None:
+                query = query.filter(Message.id < before_id)
             return (
-                session.query(Message)
-                .filter(Message.chat_id == chat_id)
+                query
                 .order_by(Message.created_at.desc())
                 .limit(limit)
                 .all()
@@ -69,4 +86,46 @@ class MessageRepository:
             revert_rs = rs[::-1]
             return [MessageModel.model_validate(message) for message in revert_rs]
 
-    
+    @staticmethod
+    def get_labeled_queries(limit: int = 500, source: str = "llm") -> list[tuple[str, str]]:
+        """
+        Trả về các cặp (câu hỏi người dùng, agent đã trả lời) gần nhất có nhãn từ nguồn source.
+        Mặc định chỉ lấy nhãn do Manager (LLM) gán, tránh router tự học lại quyết định của chính nó.
+        """
+        with Session() as session:
+            window = dict(partition_by=Message.chat_id, order_by=Message.id)
+            subq = sa.select(
+                Message.id,
+                Message.role,
+                Message.agent,
+                Message.agent_source,
+                sa.func.lag(Message.content).over(**window).label("query"),
+                sa.func.lag(Message.role).over(**window).label("prev_role"),
+            ).subquery()
+            rows = session.execute(
+                sa.select(subq.c.query, subq.c.agent)
+                .where(
+                    subq.c.role == "assistant",
+                    subq.c.agent.isnot(None),
+                    subq.c.agent_source == source,
+                    subq.c.prev_role == "user",
+                )
+                .order_by(subq.c.id.desc())
+                .limit(limit)
+            ).all()
+            return [(row.query, row.agent) for row in rows]
+
+    @staticmethod
+    def get_messages_between(chat_id: int, after_id: int, before_id: int, limit: int = 50) -> list[MessageModel]:
+        """
+        Các tin nhắn có after_id < id < before_id, theo thứ tự thời gian.
+        """
+        with Session() as session:
+            messages = (
+                session.query(Message)
+                .filter(Message.chat_id == chat_id, Message.id > after_id, Message.id < before_id)
+                .order_by(Message.id.asc())
+                .limit(limit)
+                .all()
+            )
+            return [MessageModel.model_validate(message) for message in messages]
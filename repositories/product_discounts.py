@@ -1,5 +1,6 @@
 from models.product_discounts import ProductDiscount, ProductDiscountCreate, ProductDiscountModel
 from db import Session
+from services.product_cache import product_cache
 
 class ProductDiscountRepositories:
     @staticmethod
@@ -8,6 +9,7 @@ class ProductDiscountRepositories:
             new_product_discount = ProductDiscount(**payload.model_dump())
             session.add(new_product_discount)
             session.commit()
+            product_cache.invalidate([new_product_discount.product_id])
             session.refresh(new_product_discount)
             
             return ProductDiscountModel.model_validate(new_product_discount)
@@ -20,4 +22,5 @@ class ProductDiscountRepositories:
                 return None
             session.delete(product_discount)
             session.commit()
+            product_cache.invalidate([product_discount.product_id])
             return ProductDiscountModel.model_validate(product_discount)
\ No newline at end of file
@@ -1,13 +1,45 @@
+import base64
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional
+
+from pydantic import TypeAdapter
+from sqlalchemy import DateTime, Float, Numeric, column, func, select, table, text, tuple_
+from sqlalchemy.orm import load_only, undefer_group
+
+from cache import TTLCache
 from db import Session
+from env import env
 from models.categories import Category
 from models.discounts import Discount
 from models.inventories import Inventory
 from models.product_discounts import ProductDiscount
 from models.product_images import ProductImage
-from models.products import Product, ProductCreate, ProductModel  
+from models.products import PRODUCT_DETAIL_GROUP, Product, ProductCreate, ProductModel, ProductSummary
 from models.brands import Brand
 from models.sellers import Seller
 from models.warranties import Warranty
+from repositories.index_outbox import IndexOutboxRepository
+from services.product_cache import product_cache
+
+# View trang chủ (migration b5d2e8f4a913): thứ tự hiển thị + ảnh, khuyến mãi đầu tiên của mỗi sản phẩm
+HOME_FEED = table("home_feed", column("product_id"), column("created_at"), column("image_id"), column("discount_id"))
+# Parse timestamp của to_json: Postgres bỏ số 0 cuối phần giây lẻ (".1183"), fromisoformat
+# của Python 3.10 không đọc được
+_DATETIME = TypeAdapter(datetime)
+# Dưới ngưỡng này đếm chính xác, trên thì dùng ước lượng reltuples
+HOME_EXACT_COUNT_LIMIT = 100_000
+# Khóa advisory cho REFRESH home_feed: nhiều instance chỉ một instance refresh mỗi lượt
+HOME_FEED_REFRESH_LOCK = 0x686F6D65
+_home_total = TTLCache(max_size=1, ttl=env.HOME_TOTAL_TTL)
+# Cột của ProductSummary: bỏ description/short_description/review_text (HTML, dài)
+SUMMARY_COLUMNS = tuple(getattr(Product, field) for field in ProductSummary.model_fields)
+
+
+class ProductNotFound(ValueError):
+    """
+    Không có sản phẩm với ID này (controller trả 404).
+    """
 
 
 class ProductRepositories:
@@ -16,17 +48,64 @@ class ProductRepositories:
         with Session() as session:
             product = Product(**product.model_dump())
             session.add(product)
+            IndexOutboxRepository.enqueue(session, product.product_id, "upsert")
             session.commit()
             session.refresh(product)
             return ProductModel.model_validate(product)
     @staticmethod
     def get(product_id: int) -> ProductModel:
         with Session() as session:
-            product = session.get(Product, product_id)
+            product = session.get(Product, product_id, options=[undefer_group(PRODUCT_DETAIL_GROUP)])
             if not product:
                 raise ValueError(f"Product with ID {product_id} not found")
             return ProductModel.model_validate(product)
     @staticmethod
+    def get_many(product_ids: list[int]) -> list[ProductModel]:
+        """
+        Lấy nhiều sản phẩm trong một truy vấn, giữ nguyên thứ tự của product_ids
+        (vd: thứ hạng từ Qdrant) và bỏ qua các ID không tồn tại.
+        """
+        product_ids = list(dict.fromkeys(pid for pid in product_ids if pid))
+        if not product_ids:
+            return []
+        with Session() as session:
+            products = session.query(Product).options(undefer_group(PRODUCT_DETAIL_GROUP)).filter(Product.product_id.in_(product_ids)).all()
+            by_id = {p.product_id: p for p in products}
+            return [ProductModel.model_validate(by_id[pid]) for pid in product_ids if pid in by_id]
+    @staticmethod
+    def get_summaries(product_ids: list[int]) -> list[ProductSummary]:
+        """
+        Như get_many nhưng chỉ load các cột của ProductSummary (cho danh sách, tìm kiếm, chatbot).
+        """
+        product_ids = list(dict.fromkeys(pid for pid in product_ids if pid))
+        if not product_ids:
+            return []
+        with Session() as session:
+            products = session.query(Product).options(load_only(*SUMMARY_COLUMNS)).filter(Product.product_id.in_(product_ids)).all()
+            by_id = {p.product_id: p for p in products}
+            return [ProductSummary.model_validate(by_id[pid]) for pid in product_ids if pid in by_id]
+    @staticmethod
+    def get_rank_signals(product_ids: list[int]) -> dict[int, dict]:
+        """
+        Chỉ lấy các cột cần cho bước rerank (tên, lượt bán, đánh giá) của nhiều sản phẩm.
+        """
+        product_ids = list(dict.fromkeys(pid for pid in product_ids if pid))
+        if not product_ids:
+            return {}
+        with Session() as session:
+            rows = session.query(
+                Product.product_id, Product.name, Product.quantity_sold, Product.rating_average, Product.review_count
+            ).filter(Product.product_id.in_(product_ids)).all()
+            return {
+                row.product_id: {
+                    "name": row.name or "",
+                    "quantity_sold": row.quantity_sold or 0,
+                    "rating_average": float(row.rating_average or 0),
+                    "review_count": row.review_count or 0,
+                }
+                for row in rows
+            }
+    @staticmethod
     def update(product_id: int, data: ProductCreate) -> ProductModel:
         with Session() as session:
             product = session.get(Product, product_id)
@@ -36,7 +115,9 @@ class ProductRepositories:
             for field, value in data.model_dump(exclude_unset=True).items():
                 setattr(product, field, value)
 
+            IndexOutboxRepository.enqueue(session, product_id, "upsert")
             session.commit()
+            product_cache.invalidate([product_id])
             session.refresh(product)
             return ProductModel.model_validate(product)
     @staticmethod
@@ -47,11 +128,96 @@ class ProductRepositories:
                 raise ValueError(f"Product with ID {product_id} not found")
 
             session.delete(product)
-            session.commit()      
+            IndexOutboxRepository.enqueue(session, product_id, "delete")
+            session.commit()
+            product_cache.invalidate([product_id])      
+    @staticmethod
+    def _agg_rows(model, condition):
+        # json_agg(<cả dòng>) của bảng liên quan, [] nếu không có dòng nào
+        table = model.__table__
+        query = select(func.coalesce(func.json_agg(table.table_valued()), text("'[]'::json")))
+        return query.select_from(table).where(condition).scalar_subquery()
+
+    @staticmethod
+    def _from_json(model, data: dict):
+        """
+        Dựng lại instance ORM (transient) từ một dòng JSON, đổi timestamp/decimal về đúng
+        kiểu Python như khi load bằng session để caller truy cập thuộc tính như cũ.
+        """
+        values = {}
+        for column in model.__table__.columns:
+            value = data.get(column.name)
+            if value is not None:
+                if isinstance(column.type, DateTime):
+                    value = _DATETIME.validate_python(value)
+                elif isinstance(column.type, Numeric) and not isinstance(column.type, Float):
+                    value = Decimal(str(value))
+            values[column.key] = value
+        return model(**values)
+
+    @staticmethod
+    def get_info_row(id: int) -> dict:
+        """
+        Chi tiết sản phẩm cùng thương hiệu, danh mục, người bán, ảnh, bảo hành, tồn kho
+        và khuyến mãi trong một truy vấn (mỗi bảng liên quan gom thành mảng JSON).
+        Trả về dạng JSON thô (dict/list), dùng được để cache; xem info_from_row.
+        """
+        agg = ProductRepositories._agg_rows
+        query = select(
+            func.to_json(Product.__table__.table_valued()).label("product"),
+            agg(Brand, Brand.brand_id == Product.brand_id).label("brand"),
+            agg(Category, Category.category_id == Product.category_id).label("category"),
+            agg(Seller, Seller.seller_id == Product.seller_id).label("seller"),
+            agg(ProductImage, ProductImage.product_id == Product.product_id).label("product_image"),
+            agg(Warranty, Warranty.product_id == Product.product_id).label("warranty"),
+            agg(Inventory, Inventory.product_id == Product.product_id).label("inventory"),
+            agg(ProductDiscount, ProductDiscount.product_id == Product.product_id).label("product_discount"),
+            # IN thay vì join: khuyến mãi gắn hai lần vẫn chỉ trả một dòng như get_info_legacy
+            agg(
+                Discount,
+                Discount.discount_id.in_(
+                    select(ProductDiscount.discount_id)
+                    .where(ProductDiscount.product_id == Product.product_id)
+                    .correlate(Product.__table__)
+                ),
+            ).label("discount"),
+        ).select_from(Product.__table__).where(Product.product_id == id)
+
+        with Session() as session:
+            row = session.execute(query).mappings().first()
+        if row is None:
+            raise ProductNotFound(f"Product with ID {id} not found")
+        return dict(row)
+
+    @staticmethod
+    def info_from_row(row: dict) -> dict:
+        """
+        Dựng dict chi tiết sản phẩm (ProductModel + instance ORM) từ kết quả của get_info_row.
+        """
+        rows = ProductRepositories._from_json
+        return {
+            "product": ProductModel.model_validate(rows(Product, row["product"])),
+            "brand": [rows(Brand, r) for r in row["brand"]],
+            "category": [rows(Category, r) for r in row["category"]],
+            "seller": [rows(Seller, r) for r in row["seller"]],
+            "product_image": [rows(ProductImage, r) for r in row["product_image"]],
+            "warranty": [rows(Warranty, r) for r in row["warranty"]],
+            "inventory": [rows(Inventory, r) for r in row["inventory"]],
+            "product_discount": [rows(ProductDiscount, r) for r in row["product_discount"]],
+            "discount": [rows(Discount, r) for r in row["discount"]],
+        }
+
     @staticmethod
     def get_info(id: int):
+        return ProductRepositories.info_from_row(ProductRepositories.get_info_row(id))
+
+    @staticmethod
+    def get_info_legacy(id: int):
+        """
+        Bản cũ của get_info (mỗi bảng một truy vấn, join trong Python), giữ lại để benchmark.
+        """
         with Session() as session:
-            products = session.query(Product).filter(Product.product_id == id).all()
+            products = session.query(Product).options(undefer_group(PRODUCT_DETAIL_GROUP)).filter(Product.product_id == id).all()
             if not products:
                 raise ValueError(f"Product with ID {id} not found")
 
@@ -83,57 +249,223 @@ class ProductRepositories:
                 result.append(product_info)
             return result[0] if result else None
 
-
     @staticmethod
-    def get_home_products(offset: int = 0, limit: int = 10):
+    def get_info_many(product_ids: list[int]) -> list[dict]:
+        """
+        Bản hàng loạt của get_info cho các script index: mỗi bảng liên quan chỉ
+        truy vấn một lần cho cả trang sản phẩm. Giữ thứ tự product_ids.
+        """
+        product_ids = list(dict.fromkeys(product_ids))
+        if not product_ids:
+            return []
         with Session() as session:
-            # Lấy tổng số sản phẩm
-            total = session.query(Product).count()
-
-            # Lấy danh sách sản phẩm theo trang
-            products = (
-                session.query(Product)
-                .order_by(Product.created_at.desc())  # Hoặc product_id.desc()
-                .offset(offset)
-                .limit(limit)
-                .all()
+            products = session.query(Product).options(undefer_group(PRODUCT_DETAIL_GROUP)).filter(Product.product_id.in_(product_ids)).all()
+            by_id = {p.product_id: p for p in products}
+
+            def group(rows, key):
+                grouped = {}
+                for row in rows:
+                    grouped.setdefault(getattr(row, key), []).append(row)
+                return grouped
+
+            brands = group(session.query(Brand).filter(Brand.brand_id.in_({p.brand_id for p in products})).all(), "brand_id")
+            categories = group(session.query(Category).filter(Category.category_id.in_({p.category_id for p in products})).all(), "category_id")
+            sellers = group(session.query(Seller).filter(Seller.seller_id.in_({p.seller_id for p in products})).all(), "seller_id")
+            product_images = group(session.query(ProductImage).filter(ProductImage.product_id.in_(product_ids)).all(), "product_id")
+            warranties = group(session.query(Warranty).filter(Warranty.product_id.in_(product_ids)).all(), "product_id")
+            inventories = group(session.query(Inventory).filter(Inventory.product_id.in_(product_ids)).all(), "product_id")
+            product_discount_rows = session.query(ProductDiscount).filter(ProductDiscount.product_id.in_(product_ids)).all()
+            product_discounts = group(product_discount_rows, "product_id")
+            discounts = group(
+                session.query(Discount).filter(Discount.discount_id.in_({pd.discount_id for pd in product_discount_rows})).all(),
+                "discount_id",
             )
 
-            if not products:
-                return {"total": total, "products": []}
+            result = []
+            for product_id in product_ids:
+                product = by_id.get(product_id)
+                if product is None:
+                    continue
+                own_discounts = product_discounts.get(product_id, [])
+                result.append({
+                    "product": ProductModel.model_validate(product),
+                    "brand": brands.get(product.brand_id, []),
+                    "category": categories.get(product.category_id, []),
+                    "seller": sellers.get(product.seller_id, []),
+                    "product_image": product_images.get(product_id, []),
+                    "warranty": warranties.get(product_id, []),
+                    "inventory": inventories.get(product_id, []),
+                    "product_discount": own_discounts,
+                    "discount": [
+                        d for discount_id in dict.fromkeys(pd.discount_id for pd in own_discounts)
+                        for d in discounts.get(discount_id, [])
+                    ],
+                })
+            return result
+
+
+    @staticmethod
+    def encode_home_cursor(created_at: datetime, product_id: int) -> str:
+        return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{product_id}".encode()).decode().rstrip("=")
+
+    @staticmethod
+    def decode_home_cursor(cursor: str) -> tuple[datetime, int]:
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+            created_at, product_id = raw.rsplit("|", 1)
+            return datetime.fromisoformat(created_at), int(product_id)
+        except (ValueError, UnicodeDecodeError) as e:
+            raise ValueError("Invalid cursor") from e
 
-            product_ids = [p.product_id for p in products]
-            brand_ids = [p.brand_id for p in products]
-            category_ids = [p.category_id for p in products]
+    @staticmethod
+    def count_home_products(session) -> int:
+        """
+        Tổng số sản phẩm cho trang chủ, cache HOME_TOTAL_TTL giây. Bảng lớn thì dùng ước
+        lượng của planner (pg_class.reltuples) thay vì count(*) quét cả bảng.
+        """
+        total = _home_total.get("products")
+        if total is None:
+            estimate = session.execute(text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'products'::regclass")).scalar()
+            if estimate is not None and estimate >= HOME_EXACT_COUNT_LIMIT:
+                total = int(estimate)
+            else:
+                total = session.query(func.count(Product.product_id)).scalar()
+            _home_total.set("products", total)
+        return total
+
+    @staticmethod
+    def _home_page(session, after: Optional[tuple], offset: int, limit: int) -> list:
+        """
+        Một trang (product_id, created_at, image_id, discount_id) theo (created_at, product_id)
+        giảm dần, từ view home_feed hoặc trực tiếp từ bảng products.
+        """
+        if env.HOME_FEED_MATERIALIZED:
+            source = HOME_FEED
+            query = select(source.c.product_id, source.c.created_at, source.c.image_id, source.c.discount_id)
+        else:
+            source = Product.__table__
+            query = select(source.c.product_id, source.c.created_at)
+        query = query.order_by(source.c.created_at.desc(), source.c.product_id.desc()).limit(limit)
+        if after is not None:
+            query = query.where(tuple_(source.c.created_at, source.c.product_id) < after)
+        elif offset:
+            # Giữ cho client cũ còn phân trang bằng offset
+            query = query.offset(offset)
+        rows = session.execute(query).all()
+        if env.HOME_FEED_MATERIALIZED or not rows:
+            return [tuple(row) for row in rows]
+
+        # Không dùng view: ảnh/khuyến mãi đầu tiên của mỗi sản phẩm, như trong home_feed
+        product_ids = [row.product_id for row in rows]
+        image_ids, discount_ids = {}, {}
+        for image_id, product_id in session.query(ProductImage.id, ProductImage.product_id).filter(
+            ProductImage.product_id.in_(product_ids)
+        ).order_by(ProductImage.id):
+            image_ids.setdefault(product_id, image_id)
+        for product_id, discount_id in session.query(ProductDiscount.product_id, ProductDiscount.discount_id).filter(
+            ProductDiscount.product_id.in_(product_ids)
+        ).order_by(ProductDiscount.discount_id):
+            discount_ids.setdefault(product_id, discount_id)
+        return [(row.product_id, row.created_at, image_ids.get(row.product_id), discount_ids.get(row.product_id)) for row in rows]
 
-            brands = session.query(Brand).filter(Brand.brand_id.in_(brand_ids)).all()
-            categories = session.query(Category).filter(Category.category_id.in_(category_ids)).all()
-            images = session.query(ProductImage).filter(ProductImage.product_id.in_(product_ids)).all()
-            inventories = session.query(Inventory).filter(Inventory.product_id.in_(product_ids)).all()
-            product_discounts = session.query(ProductDiscount).filter(ProductDiscount.product_id.in_(product_ids)).all()
-            discount_ids = [pd.discount_id for pd in product_discounts]
-            discounts = session.query(Discount).filter(Discount.discount_id.in_(discount_ids)).all()
+    @staticmethod
+    def get_batch(product_ids: list[int], projection: str = "summary") -> list[dict]:
+        """
+        Nhiều sản phẩm theo projection ("summary" | "with_images" | "full") bằng một
+        nhóm truy vấn IN, giữ thứ tự product_ids và bỏ qua ID không tồn tại.
+        """
+        product_ids = list(dict.fromkeys(product_ids))
+        if projection == "full":
+            return ProductRepositories.get_info_many(product_ids)
+        if not product_ids:
+            return []
+        with Session() as session:
+            rows = {
+                row.product_id: ProductSummary.model_validate(row._mapping).model_dump()
+                for row in session.query(*SUMMARY_COLUMNS).filter(Product.product_id.in_(product_ids)).all()
+            }
+            if projection == "with_images":
+                images = {}
+                for image in session.query(ProductImage).filter(ProductImage.product_id.in_(list(rows))).order_by(ProductImage.id):
+                    images.setdefault(image.product_id, []).append(image)
+                for product_id, row in rows.items():
+                    row["images"] = images.get(product_id, [])
+        return [rows[product_id] for product_id in product_ids if product_id in rows]
+
+    @staticmethod
+    def get_home_products(offset: int = 0, limit: int = 10, cursor: Optional[str] = None):
+        """
+        Sản phẩm mới nhất cho trang chủ. Phân trang bằng cursor (keyset trên
+        (created_at, product_id)), next_cursor là cursor của trang kế tiếp;
+        offset chỉ dùng khi không có cursor. ValueError nếu cursor sai.
+        """
+        after = ProductRepositories.decode_home_cursor(cursor) if cursor else None
+        with Session() as session:
+            total = ProductRepositories.count_home_products(session)
+            page = ProductRepositories._home_page(session, after, offset, limit)
+            if not page:
+                return {"total": total, "products": [], "next_cursor": None}
+
+            product_ids = [product_id for product_id, _, _, _ in page]
+            products = {
+                p.product_id: p for p in
+                session.query(Product).options(load_only(*SUMMARY_COLUMNS)).filter(Product.product_id.in_(product_ids)).all()
+            }
+            brands = {
+                b.brand_id: b for b in
+                session.query(Brand).filter(Brand.brand_id.in_({p.brand_id for p in products.values()})).all()
+            }
+            categories = {
+                c.category_id: c for c in
+                session.query(Category).filter(Category.category_id.in_({p.category_id for p in products.values()})).all()
+            }
+            images = {
+                img.id: img for img in
+                session.query(ProductImage).filter(ProductImage.id.in_({row[2] for row in page if row[2] is not None})).all()
+            }
+            inventories = {
+                inv.product_id: inv for inv in
+                session.query(Inventory).filter(Inventory.product_id.in_(product_ids)).all()
+            }
+            discounts = {
+                d.discount_id: d for d in
+                session.query(Discount).filter(Discount.discount_id.in_({row[3] for row in page if row[3] is not None})).all()
+            }
 
             result = []
-            for product in products:
-                info = {
-                    "product": ProductModel.model_validate(product),
-                    "brand": next((b for b in brands if b.brand_id == product.brand_id), None),
-                    "category": next((c for c in categories if c.category_id == product.category_id), None),
-                    "image": next((img for img in images if img.product_id == product.product_id), None),
-                    "inventory": next((inv for inv in inventories if inv.product_id == product.product_id), None),
-                    "discount": next(
-                        (
-                            d for pd in product_discounts if pd.product_id == product.product_id
-                            for d in discounts if d.discount_id == pd.discount_id
-                        ),
-                        None
-                    ),
-                }
-                result.append(info)
+            for product_id, _, image_id, discount_id in page:
+                product = products.get(product_id)
+                if product is None:
+                    # Sản phẩm đã xóa nhưng view home_feed chưa được refresh
+                    continue
+                result.append({
+                    "product": ProductSummary.model_validate(product),
+                    "brand": brands.get(product.brand_id),
+                    "category": categories.get(product.category_id),
+                    "image": images.get(image_id),
+                    "inventory": inventories.get(product_id),
+                    "discount": discounts.get(discount_id),
+                })
 
+            last_id, last_created_at = page[-1][0], page[-1][1]
             return {
                 "total": total,
-                "products": result
+                "products": result,
+                "next_cursor": ProductRepositories.encode_home_cursor(last_created_at, last_id) if len(page) == limit else None,
             }
 
+    @staticmethod
+    def refresh_home_feed() -> bool:
+        """
+        Làm mới view home_feed mà không khóa các truy vấn đọc (cần unique index trên product_id).
+        Trả về False nếu instance khác đang refresh (khóa advisory tự nhả khi commit).
+        """
+        with Session() as session:
+            locked = session.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": HOME_FEED_REFRESH_LOCK}).scalar()
+            if not locked:
+                session.rollback()
+                return False
+            session.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY home_feed"))
+            session.commit()
+        _home_total.clear()
+        return True
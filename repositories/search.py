@@ -1,27 +1,97 @@
 from env import env
-from qdrant_client import QdrantClient
-from embedding.generate_embeddings import query_embedding, generate_embedding
+from typing import Optional
+from qdrant_client import QdrantClient, AsyncQdrantClient
+from qdrant_client.models import FieldCondition, Filter, MatchAny, MatchValue, Range
+from models.brands import Brand
+from models.categories import Category
+from models.search_filters import ProductSearchFilter
+from embedding.hybrid import reciprocal_rank_fusion
+from embedding.qdrant_config import acollection_vectors, collection_vectors, hybrid_requests, is_hybrid, query_kwargs
+from embedding.generate_embeddings import query_embedding, generate_embedding, aquery_embedding
 from models.products import Product, ProductModel, ProductCreate
 from db import Session
+from executor import run_blocking
 from services.products import ProductServices
 qdrant = QdrantClient("http://localhost:6333")
+aqdrant = AsyncQdrantClient("http://localhost:6333")
 class SearchRepository:
     @staticmethod
-    def semantic_search( payload, collection_name = "product_name_embeddings", limit=5):
+    def resolve_filter_names(filters: Optional[ProductSearchFilter]) -> Optional[ProductSearchFilter]:
+        """
+        Đổi brand_name/category_name (agent trích từ câu hỏi) thành ID. Tên không
+        khớp thương hiệu/danh mục nào thì bỏ ràng buộc đó thay vì trả về rỗng.
+        """
+        if filters is None or not (filters.brand_name or filters.category_name):
+            return filters
+        filters = filters.model_copy()
+        with Session() as session:
+            if filters.brand_name:
+                ids = [row[0] for row in session.query(Brand.brand_id).filter(Brand.brand_name.ilike(f"%{filters.brand_name.strip()}%")).all()]
+                filters.brand_ids = list(dict.fromkeys(filters.brand_ids + ids))
+            if filters.category_name:
+                ids = [row[0] for row in session.query(Category.category_id).filter(Category.name.ilike(f"%{filters.category_name.strip()}%")).all()]
+                filters.category_ids = list(dict.fromkeys(filters.category_ids + ids))
+        filters.brand_name = filters.category_name = None
+        return filters
+
+    @staticmethod
+    def to_qdrant_filter(filters: Optional[ProductSearchFilter]) -> Optional[Filter]:
+        if filters is None:
+            return None
+        must = []
+        if filters.min_price is not None or filters.max_price is not None:
+            must.append(FieldCondition(key="price", range=Range(gte=filters.min_price, lte=filters.max_price)))
+        if filters.brand_ids:
+            must.append(FieldCondition(key="brand_id", match=MatchAny(any=filters.brand_ids)))
+        if filters.category_ids:
+            must.append(FieldCondition(key="category_path", match=MatchAny(any=filters.category_ids)))
+        if filters.min_rating is not None:
+            must.append(FieldCondition(key="rating_average", range=Range(gte=filters.min_rating)))
+        if filters.availability is not None:
+            must.append(FieldCondition(key="availability", match=MatchValue(value=filters.availability)))
+        return Filter(must=must) if must else None
+
+    @staticmethod
+    def _fuse(dense, sparse, limit, with_scores=False):
+        # Gộp thứ hạng dense và BM25 bằng reciprocal-rank fusion
+        return reciprocal_rank_fusion(
+            [[p.id for p in dense.points], [p.id for p in sparse.points]],
+            weights=[env.HYBRID_DENSE_WEIGHT, env.HYBRID_SPARSE_WEIGHT],
+            limit=limit,
+            with_scores=with_scores,
+        )
+
+    @staticmethod
+    def _hits(search_result, with_scores=False):
+        if with_scores:
+            return [(item.id, item.score) for item in search_result.points]
+        return [item.id for item in search_result.points]
+
+    @staticmethod
+    def semantic_search( payload, collection_name = "product_name_embeddings", limit=5, mode=None, filters: Optional[ProductSearchFilter] = None, vector=None, with_scores=False):
         # Tìm kiếm ANN trong collection
+        # mode: "full" | "coarse" | "two_stage" | "hybrid" (xem embedding/qdrant_config.py), mặc định theo env SEARCH_MODE
+
 
+        # filters: lọc ngay trong lúc tìm ANN qua payload index, không lấy dư rồi bỏ
+        query_filter = SearchRepository.to_qdrant_filter(SearchRepository.resolve_filter_names(filters))
 
-        query_Vector = query_embedding(payload)  
+        # vector: embedding đã có (vd: lưu trong cursor phân trang) để bỏ qua bước embed
+        # with_scores: trả về [(id, score)] thay vì [id], cho bước rerank
+        query_Vector = vector if vector is not None else query_embedding(payload)  
+        # Mỗi collection có thể có bộ named vector khác nhau (vd: poli_embeddings không có BM25)
+        available = collection_vectors(qdrant, collection_name)
+        if is_hybrid(mode, available):
+            dense, sparse = qdrant.query_batch_points(collection_name, hybrid_requests(query_Vector, payload, limit, query_filter, available))
+            return SearchRepository._fuse(dense, sparse, limit, with_scores)
         search_result = qdrant.query_points(
             collection_name=collection_name,
-            query= query_Vector,
-            using="default",
-            limit=limit,    
+            **query_kwargs(query_Vector, limit, mode, query_filter, available),
             with_payload=False,
             with_vectors=False,
             )
         # lay du lieu tu id
-        ids = [item.id for item in search_result.points]
+        ids = SearchRepository._hits(search_result, with_scores)
         # products = []
         # for id in ids:
         #     product = ProductServices.get(id)
@@ -30,3 +100,24 @@ class SearchRepository:
 
         return ids
 
+    @staticmethod
+    async def asemantic_search(payload, collection_name = "product_name_embeddings", limit=5, vector=None, mode=None, filters: Optional[ProductSearchFilter] = None, with_scores=False):
+        # Bản async: embedding và truy vấn Qdrant không chặn event loop.
+        # vector: embedding đã tính sẵn (vd: embedding speculative) để bỏ qua bước embed
+        query_filter = None
+        if filters is not None and not filters.is_empty():
+            resolved = await run_blocking(SearchRepository.resolve_filter_names, filters)
+            query_filter = SearchRepository.to_qdrant_filter(resolved)
+        query_Vector = vector if vector is not None else await aquery_embedding(payload)
+        available = await acollection_vectors(aqdrant, collection_name)
+        if is_hybrid(mode, available):
+            dense, sparse = await aqdrant.query_batch_points(collection_name, hybrid_requests(query_Vector, payload, limit, query_filter, available))
+            return SearchRepository._fuse(dense, sparse, limit, with_scores)
+        search_result = await aqdrant.query_points(
+            collection_name=collection_name,
+            **query_kwargs(query_Vector, limit, mode, query_filter, available),
+            with_payload=False,
+            with_vectors=False,
+        )
+        return SearchRepository._hits(search_result, with_scores)
+
@@ -0,0 +1,89 @@
+"""
+Benchmark độ trễ lấy chi tiết sản phẩm: bản cũ (mỗi bảng một truy vấn) so với bản
+một truy vấn gom JSON của ProductRepositories.get_info.
+
+Mặc định gọi thẳng repository trên cùng các product_id, kiểm tra hai bản trả về cùng
+JSON và in p50/p95/mean. Thêm --url để đo thêm endpoint /api/products/get_info/{id}
+của server đang chạy (chạy một lần trước và một lần sau khi deploy để so sánh):
+
+    python -m scripts.bench_get_info --products 50 --rounds 5
+    python -m scripts.bench_get_info --products 50 --rounds 5 --url http://localhost:8000
+"""
+import argparse
+import random
+import statistics
+import time
+
+import httpx
+from fastapi.encoders import jsonable_encoder
+
+from db import Session
+from models.products import Product
+from repositories.products import ProductRepositories
+
+
+def sample_product_ids(count: int) -> list[int]:
+    with Session() as session:
+        ids = [row[0] for row in session.query(Product.product_id).all()]
+    return random.sample(ids, min(count, len(ids)))
+
+
+def summarize(label: str, latencies: list[float]):
+    latencies = sorted(latencies)
+    p95_index = max(0, int(len(latencies) * 0.95) - 1)
+    print(
+        f"{label:<12} n={len(latencies):<5} "
+        f"p50: {statistics.median(latencies) * 1000:7.2f} ms  "
+        f"p95: {latencies[p95_index] * 1000:7.2f} ms  "
+        f"mean: {statistics.fmean(latencies) * 1000:7.2f} ms"
+    )
+
+
+def timed(fn, product_ids: list[int], rounds: int) -> list[float]:
+    latencies = []
+    for _ in range(rounds):
+        for product_id in product_ids:
+            start_time = time.perf_counter()
+            fn(product_id)
+            latencies.append(time.perf_counter() - start_time)
+    return latencies
+
+
+def check_same_output(product_ids: list[int]) -> int:
+    mismatches = 0
+    for product_id in product_ids:
+        if jsonable_encoder(ProductRepositories.get_info_legacy(product_id)) != jsonable_encoder(ProductRepositories.get_info(product_id)):
+            print(f"⚠️ Khác kết quả ở sản phẩm ID {product_id}")
+            mismatches += 1
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark get_info trước/sau khi gom một truy vấn")
+    parser.add_argument("--products", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--url", default=None, help="Đo thêm endpoint HTTP, vd: http://localhost:8000")
+    args = parser.parse_args()
+
+    product_ids = sample_product_ids(args.products)
+    if not product_ids:
+        print("Không có sản phẩm nào để benchmark.")
+        return
+
+    mismatches = check_same_output(product_ids)
+    print(f"So khớp kết quả: {len(product_ids) - mismatches}/{len(product_ids)} giống nhau")
+
+    # Chạy mỗi bản một lượt làm nóng connection pool và plan cache
+    timed(ProductRepositories.get_info_legacy, product_ids[:5], 1)
+    timed(ProductRepositories.get_info, product_ids[:5], 1)
+    summarize("legacy", timed(ProductRepositories.get_info_legacy, product_ids, args.rounds))
+    summarize("single", timed(ProductRepositories.get_info, product_ids, args.rounds))
+
+    if args.url:
+        endpoint = f"{args.url.rstrip('/')}/api/products/get_info"
+        with httpx.Client(timeout=30.0) as client:
+            summarize("http", timed(lambda pid: client.get(f"{endpoint}/{pid}").raise_for_status(), product_ids, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
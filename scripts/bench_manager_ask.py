@@ -0,0 +1,77 @@
+"""
+Benchmark tải cho /api/manager/ask.
+
+Gửi N request với mức song song C và in throughput (req/s) cùng độ trễ p50/p95/max.
+Chạy một lần trên code cũ và một lần sau khi đổi để so sánh trước/sau:
+
+    python scripts/bench_manager_ask.py --url http://localhost:8000 --chat-id 1 -n 50 -c 10
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+
+import httpx
+
+DEFAULT_MESSAGES = [
+    "chính sách đổi trả của IUH-Ecommerce như thế nào?",
+    "tìm giúp tôi tai nghe bluetooth giá rẻ",
+    "xin chào, bạn là ai?",
+    "IUH-Ecommerce hoàn tiền trong bao lâu?",
+    "gợi ý sách kỹ năng sống bán chạy",
+]
+
+
+async def send_one(client: httpx.AsyncClient, url: str, chat_id: int, message: str):
+    start_time = time.perf_counter()
+    try:
+        response = await client.post(url, json={"chat_id": chat_id, "message": message})
+        ok = response.status_code == 200
+    except httpx.HTTPError as e:
+        print(f"❌ Lỗi request: {e}")
+        ok = False
+    return time.perf_counter() - start_time, ok
+
+
+async def run(base_url: str, chat_id: int, total: int, concurrency: int, timeout: float):
+    url = f"{base_url.rstrip('/')}/api/manager/ask"
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        async def worker(i: int):
+            async with semaphore:
+                return await send_one(client, url, chat_id, DEFAULT_MESSAGES[i % len(DEFAULT_MESSAGES)])
+
+        start_time = time.perf_counter()
+        results = await asyncio.gather(*(worker(i) for i in range(total)))
+        elapsed = time.perf_counter() - start_time
+
+    latencies = sorted(latency for latency, _ in results)
+    succeeded = sum(1 for _, ok in results if ok)
+    p95_index = max(0, int(len(latencies) * 0.95) - 1)
+
+    print(f"Requests: {total}, concurrency: {concurrency}, thành công: {succeeded}")
+    print(f"Tổng thời gian: {elapsed:.2f}s, throughput: {total / elapsed:.2f} req/s")
+    print(
+        f"Latency p50: {statistics.median(latencies) * 1000:.0f} ms, "
+        f"p95: {latencies[p95_index] * 1000:.0f} ms, "
+        f"max: {latencies[-1] * 1000:.0f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tải cho /api/manager/ask")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--chat-id", type=int, required=True)
+    parser.add_argument("-n", "--requests", type=int, default=50)
+    parser.add_argument("-c", "--concurrency", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.url, args.chat_id, args.requests, args.concurrency, args.timeout))
+    sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Benchmark recall@k và độ trễ của các cấu hình lượng tử hóa Qdrant so với collection đầy đủ.
+
+Sao chép point của collection gốc sang các collection tạm với từng cấu hình
+(mode[:disk], vd: scalar, binary:disk), lấy ngẫu nhiên các vector có sẵn làm truy vấn,
+so top-k với tìm kiếm chính xác (exact) trên collection gốc và in bảng recall, độ trễ
+p50/p95 cùng ước lượng RAM cho vector ở quy mô hiện tại và x100:
+
+    python -m scripts.bench_quantization --collection product_name_embeddings -k 5 --queries 200
+"""
+import argparse
+import random
+import statistics
+import time
+
+from qdrant_client import QdrantClient
+from qdrant_client.models import CollectionStatus, PointStruct, QuantizationSearchParams, SearchParams
+
+from embedding.qdrant_config import vector_params
+from env import env
+
+SCROLL_BATCH_SIZE = 256
+
+
+def parse_variant(spec: str):
+    mode, _, flag = spec.partition(":")
+    return mode, flag == "disk"
+
+
+def ram_bytes_per_vector(dim: int, mode: str, on_disk: bool) -> float:
+    quantized = {"none": 0, "scalar": dim, "binary": dim / 8}[mode]
+    original = 0 if on_disk else dim * 4
+    return quantized + original
+
+
+def copy_collection(client: QdrantClient, source: str, target: str, mode: str, on_disk: bool, dim: int, vector_name: str):
+    if client.collection_exists(target):
+        client.delete_collection(target)
+    client.create_collection(
+        collection_name=target,
+        vectors_config={vector_name: vector_params(size=dim, quantization=mode, on_disk=on_disk)},
+    )
+    offset = None
+    while True:
+        points, offset = client.scroll(source, limit=SCROLL_BATCH_SIZE, offset=offset, with_vectors=[vector_name])
+        if points:
+            client.upsert(
+                target,
+                points=[PointStruct(id=p.id, vector={vector_name: p.vector[vector_name]}) for p in points],
+                wait=False,
+            )
+        if offset is None:
+            break
+    # Chờ Qdrant build xong HNSW/lượng tử hóa trước khi đo
+    while client.get_collection(target).status != CollectionStatus.GREEN:
+        time.sleep(1)
+
+
+def top_ids(client: QdrantClient, collection: str, vector, vector_name: str, k: int, params: SearchParams, exclude):
+    result = client.query_points(
+        collection_name=collection,
+        query=vector,
+        using=vector_name,
+        limit=k + 1,
+        search_params=params,
+        with_payload=False,
+    )
+    return [p.id for p in result.points if p.id != exclude][:k]
+
+
+def measure(client, collection, queries, truth, vector_name, k, params):
+    latencies, recalls = [], []
+    for (point_id, vector), expected in zip(queries, truth):
+        start_time = time.perf_counter()
+        found = top_ids(client, collection, vector, vector_name, k, params, point_id)
+        latencies.append((time.perf_counter() - start_time) * 1000)
+        recalls.append(len(set(found) & set(expected)) / max(1, len(expected)))
+    latencies.sort()
+    return (
+        statistics.mean(recalls),
+        statistics.median(latencies),
+        latencies[max(0, int(len(latencies) * 0.95) - 1)],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark lượng tử hóa Qdrant")
+    parser.add_argument("--collection", default="product_name_embeddings")
+    parser.add_argument("--vector-name", default="default")
+    parser.add_argument("--variants", default="scalar,scalar:disk,binary,binary:disk")
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--oversampling", type=float, default=env.QDRANT_OVERSAMPLING)
+    parser.add_argument("--no-rescore", action="store_true")
+    parser.add_argument("--keep", action="store_true", help="Giữ lại các collection tạm sau khi đo")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    client = QdrantClient(f"http://localhost:{env.QD_PORT}")
+    info = client.get_collection(args.collection)
+    dim = info.config.params.vectors[args.vector_name].size
+    total = client.count(args.collection, exact=True).count
+
+    # Lấy mẫu truy vấn từ chính các vector trong collection (bỏ qua điểm trùng chính nó)
+    sample, offset = [], None
+    while True:
+        points, offset = client.scroll(args.collection, limit=SCROLL_BATCH_SIZE, offset=offset, with_vectors=[args.vector_name])
+        sample.extend((p.id, p.vector[args.vector_name]) for p in points)
+        if offset is None:
+            break
+    random.Random(args.seed).shuffle(sample)
+    queries = sample[:args.queries]
+
+    exact = SearchParams(exact=True)
+    truth = [top_ids(client, args.collection, vector, args.vector_name, args.k, exact, pid) for pid, vector in queries]
+
+    approx = SearchParams(
+        hnsw_ef=env.QDRANT_HNSW_EF,
+        quantization=QuantizationSearchParams(rescore=not args.no_rescore, oversampling=args.oversampling),
+    )
+    rows = [("full (gốc)", "none", False, *measure(client, args.collection, queries, truth, args.vector_name, args.k, approx))]
+
+    for spec in args.variants.split(","):
+        mode, on_disk = parse_variant(spec.strip())
+        target = f"{args.collection}__bench_{mode}{'_disk' if on_disk else ''}"
+        print(f"⏳ Đang tạo {target} ({total} point)...")
+        copy_collection(client, args.collection, target, mode, on_disk, dim, args.vector_name)
+        try:
+            rows.append((spec, mode, on_disk, *measure(client, target, queries, truth, args.vector_name, args.k, approx)))
+        finally:
+            if not args.keep:
+                client.delete_collection(target)
+
+    print(f"\n{total} point, {dim} chiều, {len(queries)} truy vấn, k={args.k}, "
+          f"rescore={not args.no_rescore}, oversampling={args.oversampling}")
+    print(f"{'cấu hình':<16}{'recall@k':>10}{'p50 ms':>10}{'p95 ms':>10}{'RAM hiện tại':>16}{'RAM x100':>14}")
+    for name, mode, on_disk, recall, p50, p95 in rows:
+        ram = ram_bytes_per_vector(dim, mode, on_disk) * total
+        print(f"{name:<16}{recall:>10.3f}{p50:>10.1f}{p95:>10.1f}{ram / 2**20:>13.1f} MB{ram * 100 / 2**30:>11.2f} GB")
+
+
+if __name__ == "__main__":
+    main()
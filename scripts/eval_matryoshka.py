@@ -0,0 +1,146 @@
+"""
+Đánh giá vector Matryoshka rút gọn so với vector đầy đủ 3072 chiều.
+
+Với mỗi số chiều (vd: 256, 768), sao chép collection gốc sang một collection tạm có
+thêm named vector rút gọn, rồi so top-k của chế độ coarse (chỉ vector rút gọn) và
+two_stage (lấy ứng viên bằng vector rút gọn, chấm lại bằng vector đầy đủ) với tìm
+kiếm chính xác trên vector đầy đủ. Truy vấn lấy từ file (mỗi dòng một câu, embed bằng
+RETRIEVAL_QUERY) hoặc lấy mẫu từ chính các vector trong collection:
+
+    python -m scripts.eval_matryoshka --collection product_name_embeddings --dims 256,768 -k 5
+    python -m scripts.eval_matryoshka --queries-file queries.txt
+"""
+import argparse
+import random
+import statistics
+import time
+
+from qdrant_client import QdrantClient
+from qdrant_client.models import CollectionStatus, PointStruct, Prefetch, SearchParams
+
+from embedding.generate_embeddings import query_embedding
+from embedding.qdrant_config import mrl_vector_name, truncate_vector, vector_params
+from env import env
+
+SCROLL_BATCH_SIZE = 256
+
+
+def copy_with_mrl(client: QdrantClient, source: str, target: str, dim: int, full_dim: int):
+    if client.collection_exists(target):
+        client.delete_collection(target)
+    client.create_collection(
+        collection_name=target,
+        vectors_config={
+            "default": vector_params(size=full_dim),
+            mrl_vector_name(dim): vector_params(size=dim, quantization="none", on_disk=False),
+        },
+    )
+    offset = None
+    while True:
+        points, offset = client.scroll(source, limit=SCROLL_BATCH_SIZE, offset=offset, with_vectors=["default"])
+        if points:
+            client.upsert(
+                target,
+                points=[
+                    PointStruct(id=p.id, vector={
+                        "default": p.vector["default"],
+                        mrl_vector_name(dim): truncate_vector(p.vector["default"], dim),
+                    })
+                    for p in points
+                ],
+                wait=False,
+            )
+        if offset is None:
+            break
+    while client.get_collection(target).status != CollectionStatus.GREEN:
+        time.sleep(1)
+
+
+def load_queries(client: QdrantClient, collection: str, queries_file: str, count: int, seed: int):
+    """
+    Trả về danh sách (id cần bỏ qua, vector truy vấn).
+    """
+    if queries_file:
+        with open(queries_file, "r", encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()][:count]
+        return [(None, query_embedding(text)) for text in texts]
+
+    sample, offset = [], None
+    while True:
+        points, offset = client.scroll(collection, limit=SCROLL_BATCH_SIZE, offset=offset, with_vectors=["default"])
+        sample.extend((p.id, p.vector["default"]) for p in points)
+        if offset is None:
+            break
+    random.Random(seed).shuffle(sample)
+    return sample[:count]
+
+
+def run_query(client: QdrantClient, collection: str, k: int, exclude, **kwargs):
+    start_time = time.perf_counter()
+    result = client.query_points(collection_name=collection, limit=k + 1, with_payload=False, **kwargs)
+    latency = (time.perf_counter() - start_time) * 1000
+    return [p.id for p in result.points if p.id != exclude][:k], latency
+
+
+def summarize(name: str, results, truth):
+    recalls = [len(set(found) & set(expected)) / max(1, len(expected)) for (found, _), expected in zip(results, truth)]
+    latencies = sorted(latency for _, latency in results)
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    print(f"{name:<22}{statistics.mean(recalls):>10.3f}{statistics.median(latencies):>10.1f}{p95:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Đánh giá two-stage retrieval với vector Matryoshka")
+    parser.add_argument("--collection", default="product_name_embeddings")
+    parser.add_argument("--dims", default="256,768")
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--queries-file", default=None)
+    parser.add_argument("--candidates-factor", type=int, default=env.QDRANT_MRL_CANDIDATES_FACTOR)
+    parser.add_argument("--keep", action="store_true", help="Giữ lại các collection tạm sau khi đo")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    client = QdrantClient(f"http://localhost:{env.QD_PORT}")
+    full_dim = client.get_collection(args.collection).config.params.vectors["default"].size
+    queries = load_queries(client, args.collection, args.queries_file, args.queries, args.seed)
+    k = args.k
+
+    truth = [
+        run_query(client, args.collection, k, pid, query=vector, using="default", search_params=SearchParams(exact=True))[0]
+        for pid, vector in queries
+    ]
+
+    print(f"{len(queries)} truy vấn, k={k}, candidates = {args.candidates_factor} x k")
+    print(f"{'chế độ':<22}{'recall@k':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    summarize(f"full {full_dim}", [
+        run_query(client, args.collection, k, pid, query=vector, using="default") for pid, vector in queries
+    ], truth)
+
+    for dim in (int(d) for d in args.dims.split(",")):
+        target = f"{args.collection}__mrl_{dim}"
+        print(f"⏳ Đang tạo {target}...")
+        copy_with_mrl(client, args.collection, target, dim, full_dim)
+        try:
+            name = mrl_vector_name(dim)
+            summarize(f"coarse {dim}", [
+                run_query(client, target, k, pid, query=truncate_vector(vector, dim), using=name)
+                for pid, vector in queries
+            ], truth)
+            summarize(f"two_stage {dim}", [
+                run_query(
+                    client, target, k, pid,
+                    prefetch=Prefetch(query=truncate_vector(vector, dim), using=name, limit=(k + 1) * args.candidates_factor),
+                    query=vector,
+                    using="default",
+                )
+                for pid, vector in queries
+            ], truth)
+            print(f"{'':<22}RAM vector rút gọn: {dim * 4} B/point (so với {full_dim * 4} B)")
+        finally:
+            if not args.keep:
+                client.delete_collection(target)
+
+
+if __name__ == "__main__":
+    main()
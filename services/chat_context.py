@@ -0,0 +1,143 @@
+import asyncio
+import math
+from typing import Optional
+
+from google import genai
+from loguru import logger
+
+from env import env
+from executor import run_blocking
+from repositories.chat_summaries import ChatSummaryRepository
+from repositories.message import MessageRepository
+
+# Số lượt (user + assistant) tối đa lấy ra cho cửa sổ hội thoại
+HISTORY_TURNS = 10
+# Ngân sách token cho phần lịch sử (tóm tắt + cửa sổ) đưa vào prompt
+HISTORY_TOKEN_BUDGET = 1500
+# Độ dài tối đa của bản tóm tắt cuộn
+SUMMARY_TOKEN_BUDGET = 400
+# Số tin nhắn tối đa gộp vào bản tóm tắt mỗi lần cập nhật
+SUMMARY_BATCH = 40
+
+client = genai.Client(api_key=env.GEMINI_API_KEY)
+
+_summarizing = set()
+_background_tasks = set()
+
+
+def estimate_tokens(text: str) -> int:
+    # Ước lượng thô ~4 ký tự / token, đủ để giới hạn kích thước prompt
+    return max(1, math.ceil(len(text or "") / 4))
+
+
+def _format_message(message) -> str:
+    return f"{message.role}: {message.content}"
+
+
+class ChatContextService:
+    @staticmethod
+    def get_window(chat_id: int, token_budget: int = HISTORY_TOKEN_BUDGET, before_id: Optional[int] = None) -> list:
+        """
+        Các tin nhắn gần nhất (cũ -> mới) vừa với ngân sách token, trước tin nhắn before_id nếu có.
+        """
+        messages = MessageRepository.get_recent_messages(chat_id, HISTORY_TURNS * 2, before_id)
+        window, used = [], 0
+        for message in messages:
+            cost = estimate_tokens(_format_message(message))
+            if used + cost > token_budget:
+                break
+            window.append(message)
+            used += cost
+        return window[::-1]
+
+    @staticmethod
+    def build(chat_id: int, token_budget: int = HISTORY_TOKEN_BUDGET, before_id: Optional[int] = None) -> str:
+        """
+        Ngữ cảnh hội thoại cho prompt: bản tóm tắt cuộn + các lượt gần nhất.
+        before_id: id tin nhắn hiện tại (đã lưu trước khi gọi agent), không đưa vào lịch sử.
+        """
+        summary = ChatSummaryRepository.get(chat_id)
+        summary_tokens = summary.token_estimate if summary else 0
+        window = ChatContextService.get_window(chat_id, max(0, token_budget - summary_tokens), before_id)
+        if summary:
+            # Tin nhắn đã nằm trong bản tóm tắt thì không lặp lại
+            window = [m for m in window if m.id > summary.summarized_until_id]
+
+        parts = []
+        if summary:
+            parts.append(f"Tóm tắt hội thoại trước đó: {summary.summary}")
+        parts.extend(_format_message(m) for m in window)
+        return "\n".join(parts)
+
+    @staticmethod
+    async def abuild(chat_id: int, token_budget: int = HISTORY_TOKEN_BUDGET, before_id: Optional[int] = None) -> str:
+        return await run_blocking(ChatContextService.build, chat_id, token_budget, before_id)
+
+    @staticmethod
+    def has_history(chat_id: int, before_id: Optional[int] = None) -> bool:
+        """
+        Chat đã có tin nhắn trước before_id (câu hỏi hiện tại có thể phụ thuộc ngữ cảnh).
+        """
+        return bool(MessageRepository.get_recent_messages(chat_id, 1, before_id))
+
+    @staticmethod
+    async def ahas_history(chat_id: int, before_id: Optional[int] = None) -> bool:
+        return await run_blocking(ChatContextService.has_history, chat_id, before_id)
+
+    @staticmethod
+    async def update_summary(chat_id: int):
+        """
+        Gộp các tin nhắn đã rơi khỏi cửa sổ vào bản tóm tắt cuộn của chat.
+        """
+        if chat_id in _summarizing:
+            return
+        _summarizing.add(chat_id)
+        try:
+            summary = await run_blocking(ChatSummaryRepository.get, chat_id)
+            summary_tokens = summary.token_estimate if summary else 0
+            window = await run_blocking(
+                ChatContextService.get_window, chat_id, max(0, HISTORY_TOKEN_BUDGET - summary_tokens)
+            )
+            if not window:
+                return
+            after_id = summary.summarized_until_id if summary else 0
+            pending = await run_blocking(
+                MessageRepository.get_messages_between, chat_id, after_id, window[0].id, SUMMARY_BATCH
+            )
+            if not pending:
+                return
+
+            prompt = f"""
+            Bạn tóm tắt hội thoại giữa người dùng và trợ lý của sàn thương mại điện tử IUH-Ecomerce.
+            Bản tóm tắt hiện tại: {summary.summary if summary else "Chưa có"}
+            Các tin nhắn mới cần gộp vào:
+            {chr(10).join(_format_message(m) for m in pending)}
+            Hãy viết lại bản tóm tắt ngắn gọn bằng tiếng Việt (tối đa {SUMMARY_TOKEN_BUDGET * 4} ký tự),
+            giữ lại nhu cầu, sản phẩm và thông tin quan trọng người dùng đã nêu.
+            """
+            response = await client.aio.models.generate_content(
+                model="gemini-2.5-flash-preview-04-17",
+                contents=prompt,
+            )
+            text = (response.text or "").strip()
+            if not text:
+                return
+            await run_blocking(
+                ChatSummaryRepository.upsert, chat_id, text, pending[-1].id, estimate_tokens(text)
+            )
+            logger.info(f"Đã cập nhật tóm tắt chat {chat_id} tới tin nhắn {pending[-1].id}")
+        except Exception as e:
+            logger.error(f"Lỗi cập nhật tóm tắt chat {chat_id}: {e}")
+        finally:
+            _summarizing.discard(chat_id)
+
+    @staticmethod
+    def schedule_summary_update(chat_id: Optional[int]):
+        """
+        Cập nhật tóm tắt ở nền, ngoài đường xử lý của request.
+        """
+        if chat_id is None:
+            return
+        task = asyncio.create_task(ChatContextService.update_summary(chat_id))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
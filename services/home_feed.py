@@ -0,0 +1,72 @@
+import asyncio
+import time
+from typing import Optional
+
+from loguru import logger
+
+from env import env
+from executor import run_blocking
+from repositories.products import ProductRepositories
+
+
+class HomeFeedRefresher:
+    """
+    Làm mới định kỳ view home_feed (REFRESH ... CONCURRENTLY) ở nền, để sản phẩm
+    mới/xóa xuất hiện trên trang chủ sau tối đa interval giây.
+    """
+
+    def __init__(self, interval: float = 300.0):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.refreshes = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_refresh_ms: Optional[float] = None
+        self.last_refresh_at: Optional[float] = None
+
+    def refresh(self):
+        start_time = time.perf_counter()
+        if not ProductRepositories.refresh_home_feed():
+            # Instance khác đang refresh
+            self.skipped += 1
+            return
+        self.last_refresh_ms = round((time.perf_counter() - start_time) * 1000, 1)
+        self.last_refresh_at = time.time()
+        self.refreshes += 1
+
+    async def run(self):
+        while True:
+            try:
+                await run_blocking(self.refresh)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"Lỗi refresh home_feed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run(), name="home-feed-refresher")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "last_refresh_ms": self.last_refresh_ms,
+            "last_refresh_at": self.last_refresh_at,
+        }
+
+
+home_feed_refresher = HomeFeedRefresher(interval=env.HOME_FEED_REFRESH_INTERVAL)
@@ -0,0 +1,139 @@
+import asyncio
+import threading
+import time
+from typing import Optional
+
+from loguru import logger
+
+from embedding.index_versions import bump_index_version
+from embedding.main import QD_COLLECTION, index_products, qdrant
+from env import env
+from executor import run_blocking
+from repositories.index_outbox import IndexOutboxRepository
+
+# Số job tối đa lấy mỗi lượt (sau khi gộp theo product_id thì còn ít hơn)
+OUTBOX_BATCH_SIZE = 200
+# Job lỗi quá số lần này thì bỏ (sản phẩm sẽ được bắt lại bởi embedding.main --sync)
+OUTBOX_MAX_ATTEMPTS = 5
+# Job đã nhận mà sau chừng này giây chưa ghi kết quả (worker chết) thì worker khác nhận lại
+OUTBOX_CLAIM_LEASE = 300
+
+
+class IndexOutboxWorker:
+    """
+    Worker xử lý bảng index_outbox: gộp các lần sửa liên tiếp của cùng một sản
+    phẩm thành thao tác cuối cùng, embed theo batch rồi upsert/xóa trong Qdrant.
+    """
+
+    def __init__(self, interval: float = 2.0, batch_size: int = OUTBOX_BATCH_SIZE):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.dropped = 0
+        self.last_batch_ms: Optional[float] = None
+        self.last_run_at: Optional[float] = None
+
+    def process_batch(self) -> int:
+        """
+        Xử lý một lượt job. Trả về số job đã lấy ra khỏi hàng đợi.
+
+        Nhận job và ghi kết quả là hai transaction ngắn riêng; embed/upsert Qdrant chạy
+        ở giữa, không giữ transaction hay khóa dòng nào trong Postgres.
+        """
+        start_time = time.perf_counter()
+        jobs = IndexOutboxRepository.claim(self.batch_size, OUTBOX_CLAIM_LEASE)
+        if not jobs:
+            return 0
+
+        # Job sau cùng của mỗi sản phẩm quyết định thao tác (id tăng dần)
+        latest = {}
+        for job in jobs:
+            latest[job.product_id] = job
+        upserts = [pid for pid, job in latest.items() if job.op == "upsert"]
+        deletes = [pid for pid, job in latest.items() if job.op == "delete"]
+
+        failed = []
+        if upserts:
+            try:
+                failed = index_products(upserts)
+            except Exception as e:
+                logger.error(f"Lỗi index {len(upserts)} sản phẩm từ outbox: {e}")
+                failed = upserts
+        if deletes:
+            try:
+                qdrant.delete(collection_name=QD_COLLECTION, points_selector=deletes, wait=False)
+            except Exception as e:
+                logger.error(f"Lỗi xóa {len(deletes)} point từ outbox: {e}")
+                failed = failed + deletes
+
+        # Đưa job lỗi về cuối hàng đợi để không chặn các job khác
+        retries = []
+        for pid in failed:
+            job = latest[pid]
+            if job.attempts + 1 >= OUTBOX_MAX_ATTEMPTS:
+                logger.warning(f"Bỏ job index sản phẩm {pid} sau {job.attempts + 1} lần lỗi")
+                continue
+            retries.append(job)
+        dropped = len(failed) - len(retries)
+        IndexOutboxRepository.complete([job.id for job in jobs], retries)
+
+        if len(failed) < len(latest):
+            bump_index_version(QD_COLLECTION)
+        with self._lock:
+            self.processed += len(latest) - len(failed)
+            self.coalesced += len(jobs) - len(latest)
+            self.failed += len(failed)
+            self.dropped += dropped
+            self.last_batch_ms = round((time.perf_counter() - start_time) * 1000, 1)
+            self.last_run_at = time.time()
+        logger.info(
+            f"[outbox] {len(jobs)} job → {len(upserts)} upsert, {len(deletes)} delete, "
+            f"{len(failed)} lỗi trong {self.last_batch_ms} ms"
+        )
+        return len(jobs)
+
+    async def run(self):
+        while True:
+            try:
+                # Còn job đầy batch thì xử lý tiếp ngay, hết thì chờ interval
+                if await run_blocking(self.process_batch) >= self.batch_size:
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Lỗi worker index outbox: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run(), name="index-outbox-worker")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {
+                "running": self._task is not None and not self._task.done(),
+                "processed": self.processed,
+                "coalesced": self.coalesced,
+                "failed": self.failed,
+                "dropped": self.dropped,
+                "last_batch_ms": self.last_batch_ms,
+                "last_run_at": self.last_run_at,
+            }
+        stats.update(IndexOutboxRepository.stats())
+        return stats
+
+
+index_outbox_worker = IndexOutboxWorker(interval=env.INDEX_OUTBOX_INTERVAL)
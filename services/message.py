@@ -7,6 +7,10 @@ class MessageService:
     def create_message(payload: CreateMessagePayload) -> MessageModel:
         return MessageRepository.create(payload)
 
+    @staticmethod
+    async def acreate_message(payload: CreateMessagePayload) -> MessageModel:
+        return await MessageRepository.acreate(payload)
+
     @staticmethod
     def get_message(message_id: int) -> MessageModel:
         return MessageRepository.get_one(message_id)
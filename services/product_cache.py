@@ -0,0 +1,193 @@
+import json
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+
+from loguru import logger
+
+from cache import SingleFlight, TTLCache, make_shared_backend
+from env import env
+
+
+class ProductCache:
+    """
+    Cache read-through cho dữ liệu sản phẩm theo product_id: LRU+TTL trong process,
+    phía sau là backend dùng chung nếu có cấu hình. Giá trị lưu dạng JSON thô (dict),
+    bên gọi tự dựng lại model nên không chia sẻ object có thể bị sửa giữa các request.
+
+    Miss trên cùng một key được gộp (single-flight) để một sản phẩm hot hết hạn không
+    kéo theo hàng loạt truy vấn giống nhau xuống Postgres. Các thao tác ghi sản phẩm,
+    khuyến mãi, tồn kho gọi invalidate; instance khác dùng chung backend sẽ thấy dữ
+    liệu mới sau tối đa ttl giây (hết hạn bản trong RAM của chúng).
+    """
+
+    # Mỗi namespace là một dạng dữ liệu được cache cho cùng product_id
+    NAMESPACES = ("product", "product_summary", "product_info")
+
+    def __init__(self, max_size: int = 10000, ttl: float = 300, shared=None):
+        self.ttl = ttl
+        self._local = TTLCache(max_size=max_size, ttl=ttl)
+        self._shared = shared
+        self._flight = SingleFlight()
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+        self.shared_errors = 0
+        # Tăng mỗi lần invalidate: kết quả nạp từ DB trước đó có thể đã cũ, không ghi vào cache
+        self._generation = 0
+
+    @staticmethod
+    def _key(namespace: str, product_id) -> str:
+        return f"{namespace}:{product_id}"
+
+    def _count(self, field: str, amount: int = 1):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + amount)
+
+    def _shared_get(self, key: str) -> Optional[dict]:
+        if self._shared is None:
+            return None
+        try:
+            raw = self._shared.get(key)
+        except Exception as e:
+            # Backend chung lỗi thì coi như miss, vẫn đọc được từ DB
+            logger.warning(f"Lỗi đọc cache sản phẩm dùng chung: {e}")
+            self._count("shared_errors")
+            return None
+        return json.loads(raw) if raw is not None else None
+
+    def _store(self, key: str, value: dict):
+        self._local.set(key, value)
+        if self._shared is not None:
+            try:
+                self._shared.set(key, json.dumps(value, default=str).encode(), ttl=self.ttl)
+            except Exception as e:
+                logger.warning(f"Lỗi ghi cache sản phẩm dùng chung: {e}")
+                self._count("shared_errors")
+
+    def _lookup(self, key: str) -> Optional[dict]:
+        value = self._local.get(key)
+        if value is not None:
+            self._count("local_hits")
+            return value
+        value = self._shared_get(key)
+        if value is not None:
+            self._local.set(key, value)
+            self._count("shared_hits")
+        return value
+
+    def get_or_load(self, namespace: str, product_id, loader: Callable[[], dict]) -> dict:
+        key = self._key(namespace, product_id)
+        value = self._lookup(key)
+        if value is not None:
+            return value
+
+        def load():
+            # Thread khác có thể vừa nạp xong trong lúc chờ vào single-flight
+            cached = self._local.get(key)
+            if cached is not None:
+                return cached
+            self._count("misses")
+            generation = self._generation
+            # loader báo không tồn tại bằng exception (hoặc None): không ghi gì vào cache
+            loaded = loader()
+            if loaded is not None and generation == self._generation:
+                self._store(key, loaded)
+            return loaded
+
+        value, shared = self._flight.do(key, load)
+        if shared:
+            self._count("coalesced")
+        return value
+
+    def get_or_load_many(self, namespace: str, product_ids: Iterable, loader: Callable[[List], Dict]) -> Dict:
+        """
+        Bản hàng loạt: lấy phần có trong cache, phần còn lại nạp bằng một lần gọi loader
+        (trả về {product_id: value}, ID không tồn tại thì bỏ qua). ID đang được request
+        khác nạp thì chờ kết quả đó thay vì đưa vào loader lần nữa.
+        """
+        found, missing = {}, {}
+        for product_id in product_ids:
+            key = self._key(namespace, product_id)
+            value = self._lookup(key)
+            if value is None:
+                missing[key] = product_id
+            else:
+                found[product_id] = value
+        if not missing:
+            return found
+
+        def load(keys: List[str]) -> Dict[str, dict]:
+            loaded, pending = {}, []
+            for key in keys:
+                # Thread khác có thể vừa nạp xong trong lúc chờ vào single-flight
+                cached = self._local.get(key)
+                if cached is not None:
+                    loaded[key] = cached
+                else:
+                    pending.append(key)
+            if not pending:
+                return loaded
+            self._count("misses", len(pending))
+            generation = self._generation
+            values = loader([missing[key] for key in pending])
+            for key in pending:
+                value = values.get(missing[key])
+                if value is None:
+                    continue
+                if generation == self._generation:
+                    self._store(key, value)
+                loaded[key] = value
+            return loaded
+
+        values, shared = self._flight.do_many(missing, load)
+        if shared:
+            self._count("coalesced", len(shared))
+        for key, value in values.items():
+            if value is not None:
+                found[missing[key]] = value
+        return found
+
+    def invalidate(self, product_ids: Iterable):
+        keys = [self._key(namespace, pid) for pid in set(product_ids) if pid is not None for namespace in self.NAMESPACES]
+        if not keys:
+            return
+        with self._lock:
+            self._generation += 1
+        for key in keys:
+            self._local.delete(key)
+        if self._shared is not None:
+            try:
+                self._shared.delete(*keys)
+            except Exception as e:
+                logger.warning(f"Lỗi xóa cache sản phẩm dùng chung: {e}")
+                self._count("shared_errors")
+        self._count("invalidations", len(keys) // len(self.NAMESPACES))
+
+    def clear(self):
+        self._local.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.local_hits + self.shared_hits
+            total = hits + self.misses
+            return {
+                "entries": len(self._local),
+                "local_hits": self.local_hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "hit_ratio": round(hits / total, 4) if total else 0.0,
+                "coalesced": self.coalesced,
+                "invalidations": self.invalidations,
+                "shared_backend": type(self._shared).__name__ if self._shared is not None else None,
+                "shared_errors": self.shared_errors,
+            }
+
+
+product_cache = ProductCache(
+    max_size=env.PRODUCT_CACHE_SIZE,
+    ttl=env.PRODUCT_CACHE_TTL,
+    shared=make_shared_backend(env.PRODUCT_CACHE_URL),
+)
@@ -1,5 +1,6 @@
-from models.products import Product, ProductCreate, ProductModel
+from models.products import Product, ProductCreate, ProductModel, ProductSummary
 from repositories.products import ProductRepositories
+from services.product_cache import product_cache
 
 class ProductServices:
     @staticmethod
@@ -7,7 +8,30 @@ class ProductServices:
         return ProductRepositories.create(payload)
     @staticmethod
     def get(product_id: int) -> ProductModel:
-        return ProductRepositories.get(product_id)
+        data = product_cache.get_or_load("product", product_id, lambda: ProductRepositories.get(product_id).model_dump(mode="json"))
+        return ProductModel.model_validate(data)
+    @staticmethod
+    def get_many(product_ids: list[int]) -> list[ProductModel]:
+        """
+        Như ProductRepositories.get_many (giữ thứ tự, bỏ ID không tồn tại), đi qua cache.
+        """
+        product_ids = list(dict.fromkeys(pid for pid in product_ids if pid))
+        found = product_cache.get_or_load_many(
+            "product", product_ids,
+            lambda missing: {p.product_id: p.model_dump(mode="json") for p in ProductRepositories.get_many(missing)},
+        )
+        return [ProductModel.model_validate(found[pid]) for pid in product_ids if pid in found]
+    @staticmethod
+    def get_summaries(product_ids: list[int]) -> list[ProductSummary]:
+        """
+        Dạng rút gọn (không có mô tả HTML) cho danh sách, kết quả tìm kiếm và chatbot.
+        """
+        product_ids = list(dict.fromkeys(pid for pid in product_ids if pid))
+        found = product_cache.get_or_load_many(
+            "product_summary", product_ids,
+            lambda missing: {p.product_id: p.model_dump(mode="json") for p in ProductRepositories.get_summaries(missing)},
+        )
+        return [ProductSummary.model_validate(found[pid]) for pid in product_ids if pid in found]
     @staticmethod
     def update(product_id: int, data: ProductCreate) -> ProductModel:
         return ProductRepositories.update(product_id, data)
@@ -16,7 +40,11 @@ class ProductServices:
         return ProductRepositories.delete(product_id)
     @staticmethod
     def get_info(id: int):
-        return ProductRepositories.get_info(id)
+        row = product_cache.get_or_load("product_info", id, lambda: ProductRepositories.get_info_row(id))
+        return ProductRepositories.info_from_row(row)
+    @staticmethod
+    def get_batch(product_ids: list[int], projection: str = "summary") -> list[dict]:
+        return ProductRepositories.get_batch(product_ids, projection)
     @staticmethod
-    def get_home_products(offset = 0, limit = 10):
-        return ProductRepositories.get_home_products(offset, limit)
\ No newline at end of file
+    def get_home_products(offset = 0, limit = 10, cursor = None):
+        return ProductRepositories.get_home_products(offset, limit, cursor)
\ No newline at end of file
@@ -0,0 +1,106 @@
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from embedding.hybrid import tokenize
+from env import env
+from repositories.products import ProductRepositories
+
+# Rating trung bình giả định và số review "ảo" để làm mượt rating của sản phẩm ít review
+RATING_PRIOR = 4.0
+RATING_PRIOR_WEIGHT = 10
+
+
+def lexical_overlap(query_tokens: set, name: str) -> float:
+    """
+    Tỉ lệ token của câu truy vấn xuất hiện trong tên sản phẩm (có dấu/không dấu đều khớp).
+    """
+    if not query_tokens:
+        return 0.0
+    return len(query_tokens & set(tokenize(name))) / len(query_tokens)
+
+
+def popularity(signals: dict, max_sold: int, max_reviews: int) -> float:
+    """
+    Độ phổ biến trong [0, 1]: lượt bán và số review theo thang log (so với ứng viên
+    lớn nhất), rating làm mượt Bayes để sản phẩm 1 review 5 sao không đứng đầu.
+    """
+    sold = math.log1p(signals["quantity_sold"]) / math.log1p(max_sold) if max_sold else 0.0
+    reviews = math.log1p(signals["review_count"]) / math.log1p(max_reviews) if max_reviews else 0.0
+    rating = (signals["rating_average"] * signals["review_count"] + RATING_PRIOR * RATING_PRIOR_WEIGHT) / (
+        signals["review_count"] + RATING_PRIOR_WEIGHT
+    )
+    return 0.5 * sold + 0.3 * rating / 5 + 0.2 * reviews
+
+
+def _normalize(scores: Sequence[float]) -> List[float]:
+    # Chia cho điểm cao nhất thay vì min-max: cosine của top ứng viên thường sát nhau,
+    # min-max sẽ phóng đại chênh lệch 0.01 thành cả khoảng [0, 1]
+    high = max(scores)
+    if high <= 0:
+        return [0.0] * len(scores)
+    return [max(0.0, s / high) for s in scores]
+
+
+class LightweightReranker:
+    """
+    Rerank chạy trên CPU, không gọi model: tổng có trọng số của độ khớp từ khóa với
+    tên, độ phổ biến và điểm vector (tương đối so với ứng viên đầu).
+    """
+
+    name = "lightweight"
+
+    def __init__(self, lexical_weight: float = 1.0, popularity_weight: float = 0.5, vector_weight: float = 1.0):
+        self.lexical_weight = lexical_weight
+        self.popularity_weight = popularity_weight
+        self.vector_weight = vector_weight
+
+    def score(self, query: str, candidates: List[Tuple[int, float]], signals: Dict[int, dict]) -> List[Tuple[int, float]]:
+        candidates = [(pid, score) for pid, score in candidates if pid in signals]
+        if not candidates:
+            return []
+        query_tokens = set(tokenize(query))
+        max_sold = max(signals[pid]["quantity_sold"] for pid, _ in candidates)
+        max_reviews = max(signals[pid]["review_count"] for pid, _ in candidates)
+        vector_scores = _normalize([score for _, score in candidates])
+
+        scored = []
+        for (pid, _), vector_score in zip(candidates, vector_scores):
+            info = signals[pid]
+            total = (
+                self.lexical_weight * lexical_overlap(query_tokens, info["name"])
+                + self.popularity_weight * popularity(info, max_sold, max_reviews)
+                + self.vector_weight * vector_score
+            )
+            scored.append((pid, total))
+        # sort ổn định: điểm bằng nhau giữ thứ hạng ANN
+        return sorted(scored, key=lambda item: item[1], reverse=True)
+
+    def rerank(self, query: str, candidates: List[Tuple[int, float]], top_k: Optional[int] = None) -> List[int]:
+        signals = ProductRepositories.get_rank_signals([pid for pid, _ in candidates])
+        ranked = [pid for pid, _ in self.score(query, candidates, signals)]
+        # ID không còn trong DB giữ ở cuối, để bên gọi vẫn biết Qdrant trả về bao nhiêu
+        ranked += [pid for pid, _ in candidates if pid not in signals]
+        return ranked[:top_k] if top_k is not None else ranked
+
+
+RERANKERS = {
+    "lightweight": lambda: LightweightReranker(
+        lexical_weight=env.RERANK_LEXICAL_WEIGHT,
+        popularity_weight=env.RERANK_POPULARITY_WEIGHT,
+        vector_weight=env.RERANK_VECTOR_WEIGHT,
+    ),
+}
+
+
+def make_reranker(name: str):
+    """
+    "" hoặc "none" -> không rerank (giữ thứ hạng ANN); tên khác tra trong RERANKERS.
+    """
+    if not name or name == "none":
+        return None
+    if name not in RERANKERS:
+        raise ValueError(f"Unknown reranker '{name}', expected one of {sorted(RERANKERS)} or 'none'")
+    return RERANKERS[name]()
+
+
+reranker = make_reranker(env.SEARCH_RERANKER)
@@ -1,12 +1,152 @@
 from db import Session
+from env import env
+from executor import run_blocking
+from models.products import ProductSummary
+from models.search_filters import ProductSearchFilter
+from embedding.generate_embeddings import aquery_embedding, query_embedding
 from repositories.search import SearchRepository
+from services.products import ProductServices
+from services.rerank import reranker
+from services.search_cursor import CURSOR_FETCH_SIZE, search_cursors
 
 class SearchServices:
     @staticmethod
-    def search(payload: str, collection_name = "product_name_embeddings", limit: int = 5):
+    def search(payload: str, collection_name = "product_name_embeddings", limit: int = 5, mode=None, filters: ProductSearchFilter = None):
         """
         Tìm kiếm sản phẩm trong cơ sở dữ liệu.
         """
         # Tìm kiếm ANN trong collection
-        search_result = SearchRepository.semantic_search(payload, collection_name=collection_name, limit=limit)
-        return search_result
\ No newline at end of file
+        search_result = SearchRepository.semantic_search(payload, collection_name=collection_name, limit=limit, mode=mode, filters=filters)
+        return search_result
+
+    @staticmethod
+    async def asearch(payload: str, collection_name = "product_name_embeddings", limit: int = 5, vector=None, mode=None, filters: ProductSearchFilter = None):
+        """
+        Tìm kiếm sản phẩm (async, dùng cho chatbot).
+        """
+        return await SearchRepository.asemantic_search(payload, collection_name=collection_name, limit=limit, vector=vector, mode=mode, filters=filters)
+
+    @staticmethod
+    def rerank(query: str, hits: list, top_k: int = None) -> list[int]:
+        """
+        Xếp hạng lại [(id, score)] từ Qdrant bằng reranker cấu hình (env SEARCH_RERANKER),
+        chỉ rerank RERANK_CANDIDATES ứng viên đầu, phần còn lại giữ thứ hạng ANN.
+        """
+        ids = [pid for pid, _ in hits]
+        if reranker is not None and hits:
+            head = reranker.rerank(query, hits[:env.RERANK_CANDIDATES])
+            ids = head + ids[env.RERANK_CANDIDATES:]
+        return ids[:top_k] if top_k is not None else ids
+
+    @staticmethod
+    def _candidate_count(limit: int) -> int:
+        # Có rerank thì lấy dư ứng viên để reranker có cái mà chọn
+        return max(limit, env.RERANK_CANDIDATES) if reranker is not None else limit
+
+    @staticmethod
+    def search_products(query: str, limit: int = 5, collection_name = "product_name_embeddings", filters: ProductSearchFilter = None) -> list[ProductSummary]:
+        """
+        Tìm kiếm và trả về luôn thông tin sản phẩm theo thứ hạng tìm kiếm (sau rerank).
+        """
+        hits = SearchRepository.semantic_search(query, collection_name=collection_name, limit=SearchServices._candidate_count(limit),
+                                                filters=filters, with_scores=True)
+        return ProductServices.get_summaries(SearchServices.rerank(query, hits, top_k=limit))
+
+    @staticmethod
+    async def asearch_products(query: str, limit: int = 5, collection_name = "product_name_embeddings", filters: ProductSearchFilter = None) -> list[ProductSummary]:
+        hits = await SearchRepository.asemantic_search(query, collection_name=collection_name, limit=SearchServices._candidate_count(limit),
+                                                       filters=filters, with_scores=True)
+        ids = await run_blocking(SearchServices.rerank, query, hits, limit)
+        return await run_blocking(ProductServices.get_summaries, ids)
+
+    @staticmethod
+    def _open_cursor(query, vector, ids, fetch, collection_name, mode, filters):
+        session_id, state = search_cursors.create(
+            query, vector, ids, collection_name, mode,
+            filters.model_dump() if filters else None,
+            exhausted=len(ids) < fetch,
+        )
+        return session_id, 0, state
+
+    @staticmethod
+    async def _aopen_cursor(query, vector, ids, fetch, collection_name, mode, filters):
+        session_id, state = await search_cursors.acreate(
+            query, vector, ids, collection_name, mode,
+            filters.model_dump() if filters else None,
+            exhausted=len(ids) < fetch,
+        )
+        return session_id, 0, state
+
+    @staticmethod
+    def _refill_size(state: dict, offset: int, limit: int) -> int:
+        # Hết ứng viên đã lưu thì tìm lại bằng vector đã lưu với limit lớn hơn
+        if offset + limit <= len(state["ids"]) or state["exhausted"]:
+            return 0
+        return len(state["ids"]) + max(CURSOR_FETCH_SIZE, limit)
+
+    @staticmethod
+    def _new_hits(state: dict, hits: list) -> list:
+        # Lần tìm lại trả về cả các ứng viên đã lưu; chỉ phần mới được rerank và nối vào
+        # cuối, các trang đã trả về giữ nguyên thứ tự
+        seen = set(state["ids"])
+        return [hit for hit in hits if hit[0] not in seen]
+
+    @staticmethod
+    def _cursor_page(session_id: str, offset: int, state: dict, limit: int) -> dict:
+        ids = state["ids"][offset:offset + limit]
+        next_offset = offset + len(ids)
+        has_more = next_offset < len(state["ids"]) or not state["exhausted"]
+        return {
+            "ids": ids,
+            "next_cursor": search_cursors.encode(session_id, next_offset) if has_more and ids else None,
+        }
+
+    @staticmethod
+    def search_page(query: str = None, limit: int = 5, cursor: str = None, collection_name = "product_name_embeddings",
+                    mode=None, filters: ProductSearchFilter = None) -> dict:
+        """
+        Tìm kiếm có phân trang bằng cursor. Lần đầu (không có cursor) embed câu truy vấn,
+        rerank và lưu danh sách ứng viên; các trang sau lấy từ danh sách đó, không embed lại.
+        ValueError nếu cursor sai hoặc đã hết hạn.
+        """
+        if cursor is None:
+            vector = query_embedding(query)
+            fetch = max(CURSOR_FETCH_SIZE, limit)
+            hits = SearchRepository.semantic_search(query, collection_name, fetch, mode, filters, vector=vector, with_scores=True)
+            ids = SearchServices.rerank(query, hits)
+            session_id, offset, state = SearchServices._open_cursor(query, vector, ids, fetch, collection_name, mode, filters)
+        else:
+            session_id, offset, state = search_cursors.get(cursor)
+
+        fetch = SearchServices._refill_size(state, offset, limit)
+        if fetch:
+            stored_filters = ProductSearchFilter(**state["filters"]) if state["filters"] else None
+            hits = SearchRepository.semantic_search(
+                state["query"], state["collection_name"], fetch, state["mode"], stored_filters, vector=state["vector"], with_scores=True
+            )
+            ids = SearchServices.rerank(state["query"], SearchServices._new_hits(state, hits))
+            search_cursors.extend(session_id, state, ids, exhausted=len(hits) < fetch)
+        return SearchServices._cursor_page(session_id, offset, state, limit)
+
+    @staticmethod
+    async def asearch_page(query: str = None, limit: int = 5, cursor: str = None, collection_name = "product_name_embeddings",
+                           mode=None, filters: ProductSearchFilter = None, vector=None) -> dict:
+        if cursor is None:
+            vector = vector if vector is not None else await aquery_embedding(query)
+            fetch = max(CURSOR_FETCH_SIZE, limit)
+            hits = await SearchRepository.asemantic_search(query, collection_name, fetch, vector=vector, mode=mode, filters=filters, with_scores=True)
+            ids = await run_blocking(SearchServices.rerank, query, hits)
+            session_id, offset, state = await SearchServices._aopen_cursor(query, vector, ids, fetch, collection_name, mode, filters)
+        else:
+            session_id, offset, state = await search_cursors.aget(cursor)
+
+        fetch = SearchServices._refill_size(state, offset, limit)
+        if fetch:
+            stored_filters = ProductSearchFilter(**state["filters"]) if state["filters"] else None
+            hits = await SearchRepository.asemantic_search(
+                state["query"], state["collection_name"], fetch, vector=state["vector"], mode=state["mode"], filters=stored_filters,
+                with_scores=True
+            )
+            ids = await run_blocking(SearchServices.rerank, state["query"], SearchServices._new_hits(state, hits))
+            await search_cursors.aextend(session_id, state, ids, exhausted=len(hits) < fetch)
+        return SearchServices._cursor_page(session_id, offset, state, limit)
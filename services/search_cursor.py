@@ -0,0 +1,160 @@
+import base64
+import json
+import secrets
+from typing import List, Optional, Tuple
+
+from loguru import logger
+
+from cache import TTLCache, make_shared_backend
+from env import env
+from executor import run_blocking
+
+# Số ứng viên lấy từ Qdrant mỗi lần (lần đầu và mỗi lần hết danh sách đã lưu)
+CURSOR_FETCH_SIZE = 50
+
+
+class SearchCursorStore:
+    """
+    Lưu vector truy vấn và danh sách ứng viên của một lượt tìm kiếm dưới một cursor
+    mờ (opaque) có TTL, để các trang sau lấy tiếp mà không embed lại câu truy vấn.
+
+    Cursor mã hóa (session, vị trí), nên trang nào cũng có thể yêu cầu lại. Trạng
+    thái nằm trong RAM của process, hoặc ở backend dùng chung nếu có cấu hình để
+    chạy nhiều instance.
+    """
+
+    def __init__(self, ttl: int = 900, max_size: int = 2000, shared=None):
+        self.ttl = ttl
+        self._local = TTLCache(max_size=max_size, ttl=ttl)
+        self._shared = shared
+        # chat_id -> cursor trang kế tiếp, cho yêu cầu "xem thêm" của product agent
+        self._chat_cursors = TTLCache(max_size=max_size, ttl=ttl)
+
+    @staticmethod
+    def encode(session_id: str, offset: int) -> str:
+        return base64.urlsafe_b64encode(f"{session_id}:{offset}".encode()).decode().rstrip("=")
+
+    @staticmethod
+    def decode(cursor: str) -> Tuple[str, int]:
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+            session_id, offset = raw.rsplit(":", 1)
+            return session_id, int(offset)
+        except (ValueError, UnicodeDecodeError) as e:
+            raise ValueError("Invalid cursor") from e
+
+    def _shared_load(self, session_id: str) -> Optional[dict]:
+        try:
+            raw = self._shared.get(f"search_cursor:{session_id}")
+        except Exception as e:
+            logger.warning(f"Lỗi đọc cursor tìm kiếm dùng chung: {e}")
+            return None
+        if raw is None:
+            return None
+        state = json.loads(raw)
+        self._local.set(session_id, state)
+        return state
+
+    def _shared_save(self, session_id: str, state: dict):
+        try:
+            self._shared.set(f"search_cursor:{session_id}", json.dumps(state).encode(), ttl=self.ttl)
+        except Exception as e:
+            logger.warning(f"Lỗi ghi cursor tìm kiếm dùng chung: {e}")
+
+    def _load(self, session_id: str) -> Optional[dict]:
+        state = self._local.get(session_id)
+        if state is None and self._shared is not None:
+            state = self._shared_load(session_id)
+        return state
+
+    def _save(self, session_id: str, state: dict):
+        self._local.set(session_id, state)
+        if self._shared is not None:
+            self._shared_save(session_id, state)
+
+    # Bản async: backend dùng chung là I/O mạng đồng bộ (state có cả vector ~60 KB JSON)
+    # nên chạy trong thread pool, bản trong RAM vẫn đọc/ghi ngay trên event loop
+    async def _aload(self, session_id: str) -> Optional[dict]:
+        state = self._local.get(session_id)
+        if state is None and self._shared is not None:
+            state = await run_blocking(self._shared_load, session_id)
+        return state
+
+    async def _asave(self, session_id: str, state: dict):
+        self._local.set(session_id, state)
+        if self._shared is not None:
+            await run_blocking(self._shared_save, session_id, state)
+
+    @staticmethod
+    def _new_state(query: str, vector, ids: List[int], collection_name: str, mode: Optional[str],
+                   filters: Optional[dict], exhausted: bool) -> Tuple[str, dict]:
+        session_id = secrets.token_urlsafe(12)
+        return session_id, {
+            "query": query,
+            "vector": list(vector),
+            "ids": list(ids),
+            "collection_name": collection_name,
+            "mode": mode,
+            "filters": filters,
+            "exhausted": exhausted,
+        }
+
+    def create(self, query: str, vector, ids: List[int], collection_name: str, mode: Optional[str],
+               filters: Optional[dict], exhausted: bool) -> Tuple[str, dict]:
+        session_id, state = self._new_state(query, vector, ids, collection_name, mode, filters, exhausted)
+        self._save(session_id, state)
+        return session_id, state
+
+    async def acreate(self, query: str, vector, ids: List[int], collection_name: str, mode: Optional[str],
+                      filters: Optional[dict], exhausted: bool) -> Tuple[str, dict]:
+        session_id, state = self._new_state(query, vector, ids, collection_name, mode, filters, exhausted)
+        await self._asave(session_id, state)
+        return session_id, state
+
+    def get(self, cursor: str) -> Tuple[str, int, dict]:
+        """
+        Trả về (session_id, offset, state); ValueError nếu cursor sai hoặc đã hết hạn.
+        """
+        session_id, offset = self.decode(cursor)
+        state = self._load(session_id)
+        if state is None:
+            raise ValueError("Cursor expired")
+        return session_id, offset, state
+
+    async def aget(self, cursor: str) -> Tuple[str, int, dict]:
+        session_id, offset = self.decode(cursor)
+        state = await self._aload(session_id)
+        if state is None:
+            raise ValueError("Cursor expired")
+        return session_id, offset, state
+
+    @staticmethod
+    def _append(state: dict, new_ids: List[int], exhausted: bool):
+        seen = set(state["ids"])
+        state["ids"].extend(pid for pid in new_ids if pid not in seen)
+        state["exhausted"] = exhausted
+
+    def extend(self, session_id: str, state: dict, new_ids: List[int], exhausted: bool):
+        self._append(state, new_ids, exhausted)
+        self._save(session_id, state)
+
+    async def aextend(self, session_id: str, state: dict, new_ids: List[int], exhausted: bool):
+        self._append(state, new_ids, exhausted)
+        await self._asave(session_id, state)
+
+    def remember_chat(self, chat_id: Optional[int], cursor: Optional[str]):
+        if chat_id is None:
+            return
+        if cursor is None:
+            self._chat_cursors.delete(chat_id)
+        else:
+            self._chat_cursors.set(chat_id, cursor)
+
+    def chat_cursor(self, chat_id: Optional[int]) -> Optional[str]:
+        return self._chat_cursors.get(chat_id) if chat_id is not None else None
+
+
+search_cursors = SearchCursorStore(
+    ttl=env.SEARCH_CURSOR_TTL,
+    shared=make_shared_backend(env.SEARCH_CURSOR_URL),
+)
@@ -0,0 +1,188 @@
+import itertools
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from agent.intent_router import normalize_query
+from embedding.index_versions import get_index_versions
+from env import env
+
+# Collection Qdrant mà câu trả lời của từng agent phụ thuộc vào
+AGENT_COLLECTIONS: Dict[str, Tuple[str, ...]] = {
+    "ProductAgent": ("product_name_embeddings", "product_des_embeddings"),
+    "PoliciAgent": ("poli_embeddings",),
+}
+
+# Số kèm đơn vị (giá, dung lượng, kích thước...) trong câu hỏi đã bỏ dấu. Hai câu hỏi
+# gần nhau về embedding nhưng khác các ràng buộc này ("dưới 5 triệu" / "dưới 10 triệu")
+# không được dùng chung câu trả lời.
+CONSTRAINT_PATTERN = re.compile(
+    r"\d+(?:[.,]\d+)*\s*(?:trieu|tr|nghin|ngan|k|vnd|dong|d|gb|tb|mb|mah|inch|cm|mm|kg|g|ml|l|w|hz|%)?\b"
+)
+
+
+def constraint_key(text: Optional[str]) -> Tuple[str, ...]:
+    """
+    Các ràng buộc số trong câu hỏi (đã chuẩn hóa, bỏ khoảng trắng), sắp xếp để so khớp.
+    """
+    return tuple(sorted(re.sub(r"\s+", "", token) for token in CONSTRAINT_PATTERN.findall(normalize_query(text))))
+
+
+@dataclass
+class CacheEntry:
+    query: str
+    answer: str
+    agent: str
+    vector: np.ndarray
+    created_at: float
+    index_versions: Dict[str, float] = field(default_factory=dict)
+    constraints: Tuple[str, ...] = ()
+    # chat_id nếu câu trả lời dựa trên lịch sử hội thoại của chat đó, None nếu dùng chung
+    scope: Optional[int] = None
+    score: float = 0.0
+
+
+class SemanticCache:
+    """
+    Cache câu trả lời của chatbot theo độ tương đồng embedding của câu hỏi.
+
+    Index nằm trong process (ma trận numpy đã chuẩn hóa), có TTL, giới hạn kích
+    thước theo LRU và tự loại bỏ các entry khi collection liên quan được index lại.
+    """
+
+    def __init__(self, threshold: float = 0.92, ttl: int = 3600, max_size: int = 1000):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[int, CacheEntry]" = OrderedDict()
+        self._ids = itertools.count()
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: list = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(vector) -> Optional[np.ndarray]:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return None
+        return vector / norm
+
+    @staticmethod
+    def _collection_versions(agent: str, versions: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+        versions = get_index_versions() if versions is None else versions
+        return {name: versions.get(name) for name in AGENT_COLLECTIONS.get(agent, ())}
+
+    def _is_stale(self, entry: CacheEntry, now: float, versions: Dict[str, float]) -> bool:
+        if now - entry.created_at > self.ttl:
+            return True
+        return entry.index_versions != self._collection_versions(entry.agent, versions)
+
+    def _rebuild_matrix(self):
+        self._matrix_keys = list(self._entries.keys())
+        if self._matrix_keys:
+            self._matrix = np.stack([self._entries[key].vector for key in self._matrix_keys])
+        else:
+            self._matrix = None
+
+    def _remove(self, key: int):
+        self._entries.pop(key, None)
+        self._matrix = None
+
+    def lookup(self, vector, message: Optional[str] = None, agent: Optional[str] = None, scope: Optional[int] = None) -> Optional[CacheEntry]:
+        """
+        Entry gần nhất vượt ngưỡng, cùng ràng buộc số với message, cùng scope và cùng
+        agent nếu có chỉ định. Chat đã có lịch sử (scope=chat_id) chỉ thấy entry của chính
+        nó, chat mới (scope=None) chỉ thấy entry dùng chung.
+        """
+        query = self._normalize(vector)
+        if query is None:
+            return None
+        constraints = constraint_key(message)
+        now = time.time()
+        # Đọc version một lần cho cả lượt lookup
+        versions = get_index_versions()
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if self._is_stale(e, now, versions)]:
+                self._remove(key)
+            if self._matrix is None:
+                self._rebuild_matrix()
+            if self._matrix is None:
+                self.misses += 1
+                return None
+
+            scores = self._matrix @ query
+            for index in np.argsort(-scores):
+                score = float(scores[index])
+                if score < self.threshold:
+                    break
+                key = self._matrix_keys[index]
+                entry = self._entries[key]
+                if (agent is None or entry.agent == agent) and entry.constraints == constraints and entry.scope == scope:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    entry.score = score
+                    return entry
+            self.misses += 1
+            return None
+
+    def store(self, vector, query: str, answer: str, agent: str, scope: Optional[int] = None):
+        normalized = self._normalize(vector)
+        if normalized is None or not isinstance(answer, str) or not answer:
+            return
+        entry = CacheEntry(
+            query=query,
+            answer=answer,
+            agent=agent,
+            vector=normalized,
+            created_at=time.time(),
+            index_versions=self._collection_versions(agent),
+            constraints=constraint_key(query),
+            scope=scope,
+        )
+        with self._lock:
+            self._entries[next(self._ids)] = entry
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def invalidate(self, agent: Optional[str] = None):
+        with self._lock:
+            if agent is None:
+                self._entries.clear()
+            else:
+                for key in [k for k, e in self._entries.items() if e.agent == agent]:
+                    self._entries.pop(key)
+            self._matrix = None
+
+    def invalidate_collection(self, collection_name: str):
+        for agent, collections in AGENT_COLLECTIONS.items():
+            if collection_name in collections:
+                self.invalidate(agent)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "threshold": self.threshold,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+semantic_cache = SemanticCache(
+    threshold=env.SEMANTIC_CACHE_THRESHOLD,
+    ttl=env.SEMANTIC_CACHE_TTL,
+    max_size=env.SEMANTIC_CACHE_MAX_SIZE,
+)
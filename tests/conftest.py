@@ -0,0 +1,26 @@
+import os
+
+# env.Env bắt buộc các biến này khi import; test không gọi DB/Qdrant/API thật nên giá trị giả là đủ
+TEST_ENV = {
+    "APP_ENV": "test",
+    "DB_NAME": "test",
+    "DB_USER": "test",
+    "DB_PASSWORD": "test",
+    "DB_HOST": "localhost",
+    "DB_PORT": "5432",
+    "QD_PORT": "6333",
+    "DEBUG": "false",
+    "OPENAI_API_KEY": "test",
+    "GEMINI_API_KEY": "test",
+    "GEMINI_API_KEY_1": "test",
+    "GEMINI_API_KEY_2": "test",
+    "GEMINI_API_KEY_3": "test",
+    "GEMINI_API_KEY_4": "test",
+    "GEMINI_API_KEY_5": "test",
+    "CHAT_FE_BASE_URL": "http://localhost",
+    "DOMAIN": "localhost",
+    "GROQ_API_KEY": "test",
+}
+
+for name, value in TEST_ENV.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,196 @@
+import threading
+import time
+
+import pytest
+
+from cache import LocalSharedBackend, SingleFlight
+from services.product_cache import ProductCache
+
+
+def run_threads(count, target):
+    results, errors = [None] * count, [None] * count
+
+    def worker(i):
+        try:
+            results[i] = target(i)
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def join(threads):
+    for thread in threads:
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+
+
+def wait_for_waiters():
+    # Cho các thread kịp vào hàng chờ của single-flight trước khi leader trả kết quả
+    time.sleep(0.1)
+
+
+def test_do_coalesces_concurrent_callers():
+    flight, release, calls = SingleFlight(), threading.Event(), []
+
+    def loader():
+        calls.append(1)
+        release.wait(5)
+        return "value"
+
+    threads, results, errors = run_threads(5, lambda i: flight.do("key", loader))
+    wait_for_waiters()
+    release.set()
+    join(threads)
+
+    assert len(calls) == 1
+    assert errors == [None] * 5
+    assert [value for value, _ in results] == ["value"] * 5
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+
+
+def test_do_propagates_error_to_waiters_and_forgets_key():
+    flight, release = SingleFlight(), threading.Event()
+
+    def loader():
+        release.wait(5)
+        raise RuntimeError("db down")
+
+    threads, _, errors = run_threads(3, lambda i: flight.do("key", loader))
+    wait_for_waiters()
+    release.set()
+    join(threads)
+
+    assert all(isinstance(error, RuntimeError) for error in errors)
+    # Lỗi không bị giữ lại: lần gọi sau load lại
+    assert flight.do("key", lambda: "ok") == ("ok", False)
+
+
+def test_do_many_loads_each_key_once_and_fills_missing_with_none():
+    flight, release, calls = SingleFlight(), threading.Event(), []
+
+    def loader(keys):
+        calls.append(sorted(keys))
+        release.wait(5)
+        return {key: key * 10 for key in keys if key != 3}
+
+    first = threading.Thread(target=lambda: flight.do_many([1, 2, 3], loader))
+    first.start()
+    wait_for_waiters()
+    threads, results, errors = run_threads(1, lambda i: flight.do_many([2, 3, 4], loader))
+    wait_for_waiters()
+    release.set()
+    join([first] + threads)
+
+    assert errors == [None]
+    values, shared = results[0]
+    assert values == {2: 20, 3: None, 4: 40}
+    assert shared == {2, 3}
+    assert calls == [[1, 2, 3], [4]]
+
+
+def test_do_many_propagates_error_to_waiters():
+    flight, release = SingleFlight(), threading.Event()
+
+    def failing(keys):
+        release.wait(5)
+        raise RuntimeError("db down")
+
+    leader = run_threads(1, lambda i: flight.do_many(["a"], failing))
+    wait_for_waiters()
+    waiter = run_threads(1, lambda i: flight.do("a", lambda: "unused"))
+    wait_for_waiters()
+    release.set()
+    join(leader[0] + waiter[0])
+
+    assert isinstance(leader[2][0], RuntimeError)
+    assert isinstance(waiter[2][0], RuntimeError)
+
+
+def test_get_or_load_coalesces_concurrent_misses():
+    cache, release, calls = ProductCache(), threading.Event(), []
+
+    def loader():
+        calls.append(1)
+        release.wait(5)
+        return {"product_id": 1}
+
+    threads, results, _ = run_threads(4, lambda i: cache.get_or_load("product", 1, loader))
+    wait_for_waiters()
+    release.set()
+    join(threads)
+
+    assert len(calls) == 1
+    assert results == [{"product_id": 1}] * 4
+    assert cache.stats()["coalesced"] == 3
+    assert cache.get_or_load("product", 1, lambda: pytest.fail("should be cached")) == {"product_id": 1}
+
+
+def test_load_racing_invalidate_is_not_stored():
+    cache = ProductCache(shared=LocalSharedBackend())
+
+    def stale_loader():
+        # Sản phẩm bị sửa trong lúc đang đọc DB
+        cache.invalidate([1])
+        return {"product_id": 1, "price": 100}
+
+    assert cache.get_or_load("product", 1, stale_loader) == {"product_id": 1, "price": 100}
+    assert cache.get_or_load("product", 1, lambda: {"product_id": 1, "price": 90}) == {"product_id": 1, "price": 90}
+
+    def stale_many(ids):
+        cache.invalidate(ids)
+        return {pid: {"product_id": pid, "price": 100} for pid in ids}
+
+    cache.get_or_load_many("product", [2, 3], stale_many)
+    fresh = cache.get_or_load_many("product", [2, 3], lambda ids: {pid: {"product_id": pid, "price": 90} for pid in ids})
+    assert fresh == {2: {"product_id": 2, "price": 90}, 3: {"product_id": 3, "price": 90}}
+
+
+def test_unknown_product_is_not_cached():
+    cache, calls = ProductCache(), []
+
+    def loader():
+        calls.append(1)
+        return None
+
+    assert cache.get_or_load("product_info", 404, loader) is None
+    assert cache.get_or_load("product_info", 404, loader) is None
+    assert len(calls) == 2
+
+
+def test_get_or_load_many_skips_missing_ids_and_loads_only_misses():
+    cache, calls = ProductCache(), []
+    cache.get_or_load("product", 1, lambda: {"product_id": 1})
+
+    def loader(ids):
+        calls.append(list(ids))
+        return {pid: {"product_id": pid} for pid in ids if pid != 99}
+
+    assert cache.get_or_load_many("product", [1, 2, 99], loader) == {1: {"product_id": 1}, 2: {"product_id": 2}}
+    assert calls == [[2, 99]]
+    # ID không tồn tại không bị cache thành None: lần sau vẫn hỏi lại loader
+    cache.get_or_load_many("product", [1, 2, 99], loader)
+    assert calls == [[2, 99], [99]]
+
+
+def test_get_or_load_many_coalesces_with_concurrent_batches():
+    cache, release, calls = ProductCache(), threading.Event(), []
+
+    def loader(ids):
+        calls.append(sorted(ids))
+        release.wait(5)
+        return {pid: {"product_id": pid} for pid in ids}
+
+    first = run_threads(1, lambda i: cache.get_or_load_many("product", [1, 2], loader))
+    wait_for_waiters()
+    second = run_threads(1, lambda i: cache.get_or_load_many("product", [2, 3], loader))
+    wait_for_waiters()
+    release.set()
+    join(first[0] + second[0])
+
+    assert calls == [[1, 2], [3]]
+    assert second[1][0] == {2: {"product_id": 2}, 3: {"product_id": 3}}
+    assert cache.stats()["coalesced"] == 1
@@ -0,0 +1,60 @@
+import pytest
+
+from embedding.hybrid import RRF_K, reciprocal_rank_fusion, tokenize
+
+
+def test_rrf_orders_by_summed_reciprocal_rank():
+    # 2: 1/(k+2) + 1/(k+1) > 1: 1/(k+1) > 3: 1/(k+3)
+    assert reciprocal_rank_fusion([[1, 2, 3], [2]]) == [2, 1, 3]
+
+
+def test_rrf_with_scores_returns_fused_scores():
+    fused = reciprocal_rank_fusion([[1, 2], [2, 1]], with_scores=True)
+    assert [item for item, _ in fused] == [1, 2]
+    assert fused[0][1] == pytest.approx(1 / (RRF_K + 1) + 1 / (RRF_K + 2))
+    assert fused[1][1] == pytest.approx(fused[0][1])
+
+
+def test_rrf_weights_change_order():
+    ranked_lists = [[1, 2], [2, 1]]
+    assert reciprocal_rank_fusion(ranked_lists, weights=[1.0, 2.0]) == [2, 1]
+    assert reciprocal_rank_fusion(ranked_lists, weights=[2.0, 1.0]) == [1, 2]
+
+
+def test_rrf_weights_must_match_lists():
+    with pytest.raises(ValueError):
+        reciprocal_rank_fusion([[1], [2]], weights=[1.0])
+
+
+def test_rrf_duplicates_in_one_list_count_once():
+    # 1 lặp lại trong danh sách đầu chỉ tính ở vị trí đầu tiên, 2 vẫn ở hạng 2
+    fused = reciprocal_rank_fusion([[1, 1, 2]], with_scores=True)
+    assert fused == [(1, pytest.approx(1 / (RRF_K + 1))), (2, pytest.approx(1 / (RRF_K + 2)))]
+
+
+def test_rrf_ties_keep_first_seen_order():
+    assert reciprocal_rank_fusion([[1, 2], [2, 1]]) == [1, 2]
+    assert reciprocal_rank_fusion([[3], [4]]) == [3, 4]
+
+
+def test_rrf_limit():
+    assert reciprocal_rank_fusion([[1, 2, 3, 4]], limit=2) == [1, 2]
+    assert reciprocal_rank_fusion([[1, 2]], limit=5) == [1, 2]
+    assert reciprocal_rank_fusion([[1, 2, 3]], limit=1, with_scores=True) == [(1, pytest.approx(1 / (RRF_K + 1)))]
+
+
+def test_tokenize_adds_plain_variant_for_diacritics():
+    assert tokenize("Điện Thoại") == ["điện", "dien", "thoại", "thoai"]
+
+
+def test_tokenize_plain_text_has_no_duplicates():
+    assert tokenize("dien thoai") == ["dien", "thoai"]
+
+
+def test_tokenize_splits_letters_and_digits():
+    assert tokenize("iPhone 256GB") == ["iphone", "256gb", "256", "gb"]
+
+
+def test_tokenize_empty():
+    assert tokenize("") == []
+    assert tokenize(None) == []
@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+import services.search as search_module
+from services.search import SearchServices
+from services.search_cursor import SearchCursorStore
+
+CATALOG = list(range(1, 13))
+
+
+class FakeSearchRepository:
+    """
+    Thay SearchRepository: trả về CATALOG theo thứ hạng cố định, ghi lại limit của mỗi lần tìm.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.limits = []
+
+    def semantic_search(self, payload, collection_name="product_name_embeddings", limit=5, mode=None, filters=None,
+                        vector=None, with_scores=False):
+        self.limits.append(limit)
+        return [(pid, 1.0 / rank) for rank, pid in enumerate(self.catalog[:limit], start=1)]
+
+    async def asemantic_search(self, payload, collection_name="product_name_embeddings", limit=5, vector=None, mode=None,
+                               filters=None, with_scores=False):
+        return self.semantic_search(payload, collection_name, limit, mode, filters, vector=vector, with_scores=with_scores)
+
+
+class ReverseReranker:
+    def rerank(self, query, hits):
+        return [pid for pid, _ in reversed(hits)]
+
+
+@pytest.fixture
+def repo(monkeypatch):
+    fake = FakeSearchRepository(CATALOG)
+    monkeypatch.setattr(search_module, "SearchRepository", fake)
+    monkeypatch.setattr(search_module, "search_cursors", SearchCursorStore(ttl=60))
+    monkeypatch.setattr(search_module, "CURSOR_FETCH_SIZE", 4)
+    monkeypatch.setattr(search_module, "reranker", None)
+    monkeypatch.setattr(search_module, "query_embedding", lambda text: [0.1, 0.2])
+    return fake
+
+
+def all_pages(limit, **kwargs):
+    pages = [SearchServices.search_page("tai nghe", limit=limit, **kwargs)]
+    while pages[-1]["next_cursor"]:
+        pages.append(SearchServices.search_page(limit=limit, cursor=pages[-1]["next_cursor"]))
+    return pages
+
+
+def test_pages_cover_results_without_gaps_or_duplicates(repo):
+    pages = all_pages(limit=5)
+    assert [page["ids"] for page in pages] == [[1, 2, 3, 4, 5], [6, 7, 8, 9, 10], [11, 12]]
+    assert pages[-1]["next_cursor"] is None
+
+
+def test_exact_page_boundary_ends_with_empty_page(repo):
+    repo.catalog = CATALOG[:8]
+    pages = all_pages(limit=4)
+    # Trang 2 vừa hết danh sách nhưng chưa biết Qdrant còn kết quả hay không
+    assert [page["ids"] for page in pages] == [[1, 2, 3, 4], [5, 6, 7, 8], []]
+    assert pages[-1]["next_cursor"] is None
+
+
+def test_exhausted_first_fetch_has_no_next_cursor(repo):
+    repo.catalog = [7, 8, 9]
+    page = SearchServices.search_page("tai nghe", limit=5)
+    assert page == {"ids": [7, 8, 9], "next_cursor": None}
+    assert repo.limits == [5]
+
+
+def test_refill_skips_served_ids_and_keeps_earlier_pages(repo, monkeypatch):
+    monkeypatch.setattr(search_module, "reranker", ReverseReranker())
+    first = SearchServices.search_page("tai nghe", limit=3)
+    # Lần đầu lấy max(CURSOR_FETCH_SIZE, limit)=4 ứng viên, rerank đảo thứ tự
+    assert first["ids"] == [4, 3, 2]
+    second = SearchServices.search_page(limit=3, cursor=first["next_cursor"])
+    # Còn 1 ứng viên đã lưu -> tìm lại 4 + 4, chỉ phần mới (5..8) được rerank và nối vào cuối
+    assert repo.limits == [4, 8]
+    assert second["ids"] == [1, 8, 7]
+    third = SearchServices.search_page(limit=3, cursor=second["next_cursor"])
+    assert repo.limits == [4, 8, 12]
+    assert third["ids"] == [6, 5, 12]
+    served = first["ids"] + second["ids"] + third["ids"]
+    assert len(served) == len(set(served))
+
+
+def test_cursor_can_be_replayed(repo):
+    first = SearchServices.search_page("tai nghe", limit=5)
+    again = SearchServices.search_page(limit=5, cursor=first["next_cursor"])
+    assert SearchServices.search_page(limit=5, cursor=first["next_cursor"]) == again
+
+
+@pytest.mark.parametrize("cursor", ["!!!", "bm9jb2xvbg", SearchCursorStore.encode("session", 0)[:-2]])
+def test_invalid_cursor_raises_value_error(repo, cursor):
+    with pytest.raises(ValueError):
+        SearchServices.search_page(limit=5, cursor=cursor)
+
+
+def test_expired_cursor_raises_value_error(repo):
+    with pytest.raises(ValueError, match="expired"):
+        SearchServices.search_page(limit=5, cursor=SearchCursorStore.encode("unknown-session", 5))
+
+
+def test_encode_decode_round_trip():
+    cursor = SearchCursorStore.encode("a:b_c-d", 42)
+    assert "=" not in cursor
+    assert SearchCursorStore.decode(cursor) == ("a:b_c-d", 42)
+
+
+def test_async_pages_match_sync(repo):
+    async def pages(limit):
+        result = [await SearchServices.asearch_page("tai nghe", limit=limit, vector=[0.1, 0.2])]
+        while result[-1]["next_cursor"]:
+            result.append(await SearchServices.asearch_page(limit=limit, cursor=result[-1]["next_cursor"]))
+        return result
+
+    assert [page["ids"] for page in asyncio.run(pages(5))] == [[1, 2, 3, 4, 5], [6, 7, 8, 9, 10], [11, 12]]
@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+import services.semantic_cache as semantic_cache_module
+from services.semantic_cache import SemanticCache, constraint_key
+
+VECTOR = [1.0, 0.0, 0.0]
+# cos ≈ 0.995 so với VECTOR, trên ngưỡng 0.92
+NEAR = [1.0, 0.1, 0.0]
+# Câu hỏi khác hẳn (trực giao với VECTOR)
+OTHER = [0.0, 0.0, 1.0]
+
+
+@pytest.fixture
+def versions(monkeypatch):
+    current = {"product_name_embeddings": 1.0, "product_des_embeddings": 1.0, "poli_embeddings": 1.0}
+    monkeypatch.setattr(semantic_cache_module, "get_index_versions", lambda: current)
+    return current
+
+
+@pytest.fixture
+def cache(versions):
+    return SemanticCache(threshold=0.92, ttl=3600, max_size=10)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Điện thoại dưới 5 triệu", ("5trieu",)),
+    ("điện thoại dưới 10 triệu", ("10trieu",)),
+    ("ĐIỆN THOẠI DƯỚI 5  TRIỆU", ("5trieu",)),
+    ("iPhone 256GB dưới 5tr", ("256gb", "5tr")),
+    ("pin 5.000 mAh màn 6,5 inch", ("5.000mah", "6,5inch")),
+    ("laptop văn phòng", ()),
+    (None, ()),
+])
+def test_constraint_key(text, expected):
+    assert constraint_key(text) == expected
+
+
+def test_constraint_key_ignores_order():
+    assert constraint_key("256GB dưới 5 triệu") == constraint_key("dưới 5 triệu, 256 GB")
+
+
+def test_different_price_limits_do_not_share_answer(cache):
+    cache.store(VECTOR, "điện thoại dưới 5 triệu", "answer 5", "ProductAgent")
+    assert cache.lookup(NEAR, "điện thoại dưới 10 triệu") is None
+    assert cache.lookup(NEAR, "điện thoại dưới 5 triệu").answer == "answer 5"
+    # Câu hỏi không có ràng buộc cũng không dùng câu trả lời có ràng buộc
+    assert cache.lookup(NEAR, "điện thoại") is None
+
+
+def test_below_threshold_is_a_miss(cache):
+    cache.store(VECTOR, "tai nghe", "answer", "ProductAgent")
+    assert cache.lookup([0.0, 1.0, 0.0], "tai nghe") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_agent_hint_filters_entries(cache):
+    cache.store(VECTOR, "đổi trả", "policy answer", "PoliciAgent")
+    assert cache.lookup(NEAR, "đổi trả", agent="ProductAgent") is None
+    assert cache.lookup(NEAR, "đổi trả", agent="PoliciAgent").answer == "policy answer"
+    assert cache.lookup(NEAR, "đổi trả").answer == "policy answer"
+
+
+def test_lookup_prefers_matching_entry_over_closer_one(cache):
+    cache.store(NEAR, "tai nghe", "product answer", "ProductAgent")
+    cache.store(VECTOR, "tai nghe", "policy answer", "PoliciAgent")
+    assert cache.lookup(NEAR, "tai nghe", agent="PoliciAgent").answer == "policy answer"
+
+
+def test_scope_separates_chats_and_shared_entries(cache):
+    cache.store(VECTOR, "cái thứ hai giá bao nhiêu", "chat 1 answer", "ProductAgent", scope=1)
+    assert cache.lookup(NEAR, "cái thứ hai giá bao nhiêu") is None
+    assert cache.lookup(NEAR, "cái thứ hai giá bao nhiêu", scope=2) is None
+    assert cache.lookup(NEAR, "cái thứ hai giá bao nhiêu", scope=1).answer == "chat 1 answer"
+
+    cache.store(OTHER, "tai nghe", "shared answer", "ProductAgent")
+    # Chat có lịch sử không dùng entry chung (câu trả lời có thể phụ thuộc ngữ cảnh)
+    assert cache.lookup(OTHER, "tai nghe", scope=1) is None
+    assert cache.lookup(OTHER, "tai nghe").answer == "shared answer"
+
+
+def test_reindexed_collection_makes_entry_stale(cache, versions):
+    cache.store(VECTOR, "tai nghe", "product answer", "ProductAgent")
+    cache.store(OTHER, "đổi trả", "policy answer", "PoliciAgent")
+    versions["product_des_embeddings"] = 2.0
+    assert cache.lookup(NEAR, "tai nghe") is None
+    # Entry của agent khác không phụ thuộc collection đó
+    assert cache.lookup(OTHER, "đổi trả").answer == "policy answer"
+    assert cache.stats()["size"] == 1
+
+
+def test_expired_entry_is_dropped(cache, monkeypatch):
+    cache.store(VECTOR, "tai nghe", "answer", "ProductAgent")
+    now = semantic_cache_module.time.time()
+    monkeypatch.setattr(semantic_cache_module.time, "time", lambda: now + cache.ttl + 1)
+    assert cache.lookup(NEAR, "tai nghe") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_store_ignores_empty_answers_and_zero_vectors(cache):
+    cache.store(VECTOR, "tai nghe", "", "ProductAgent")
+    cache.store(VECTOR, "tai nghe", None, "ProductAgent")
+    cache.store(np.zeros(3), "tai nghe", "answer", "ProductAgent")
+    assert cache.stats()["size"] == 0